@@ -0,0 +1,279 @@
+"""Throughput and memory benchmarks with a regression gate.
+
+Generates a synthetic HAR capture (see :mod:`goblean.synth`) and its canonical
+JSONL, then runs each benchmark in a fresh interpreter so its peak RSS is its
+own.  Results are events per second (best of ``--repeat`` runs) and peak RSS,
+compared against ``benchmarks/baseline.json``::
+
+    python benchmarks/bench.py                     # run and gate
+    python benchmarks/bench.py --update-baseline   # record a new baseline
+
+A benchmark fails the gate when its throughput drops below the baseline by
+more than ``--tolerance`` or its peak RSS grows by more than
+``--rss-tolerance``.  Baselines are only compared at the scale they were
+recorded with.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+DEFAULT_SCALE = {"sessions": 50, "events_per_session": 200, "cadence": 10.0, "body_bytes": 512}
+
+
+def _peak_rss() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _load_har(data: Path) -> Dict[str, Any]:
+    from goblean.ingest.har_ingest import read_har
+
+    return read_har(data / "bench.har")
+
+
+def _load_envelopes(data: Path) -> List[Dict[str, Any]]:
+    from goblean.aggregate import iter_canonical
+
+    return list(iter_canonical(data / "bench.jsonl"))
+
+
+# Each setup returns the measured callable; the callable returns its event count.
+def _bench_read_har(data: Path) -> Callable[[], int]:
+    from goblean.ingest.har_ingest import read_har
+
+    return lambda: len(read_har(data / "bench.har")["log"]["entries"])
+
+
+def _bench_canonical_envelope(data: Path) -> Callable[[], int]:
+    from goblean.normalize.envelope import canonical_envelope
+
+    entries = _load_har(data)["log"]["entries"]
+
+    def run() -> int:
+        for entry in entries:
+            canonical_envelope(entry)
+        return len(entries)
+
+    return run
+
+
+def _bench_fingerprint(data: Path) -> Callable[[], int]:
+    from goblean.fingerprint import fingerprint
+
+    envelopes = _load_envelopes(data)
+
+    def run() -> int:
+        for env in envelopes:
+            fingerprint(env)
+        return len(envelopes)
+
+    return run
+
+
+def _bench_update_dictionary(data: Path) -> Callable[[], int]:
+    from goblean.dictionary import new_dictionary, update_dictionary
+
+    envelopes = _load_envelopes(data)
+
+    def run() -> int:
+        dictionary = new_dictionary()
+        for env in envelopes:
+            update_dictionary(dictionary, env["params"])
+        return len(envelopes)
+
+    return run
+
+
+def _bench_validate_file(data: Path) -> Callable[[], int]:
+    from goblean.schema_check import validate_file
+
+    return lambda: validate_file(data / "bench.jsonl")
+
+
+def _bench_metrics_from_canonical(data: Path) -> Callable[[], int]:
+    from goblean.report import metrics_from_canonical
+
+    return lambda: metrics_from_canonical(data / "bench.jsonl")["count"]
+
+
+BENCHMARKS: Dict[str, Callable[[Path], Callable[[], int]]] = {
+    "read_har": _bench_read_har,
+    "canonical_envelope": _bench_canonical_envelope,
+    "fingerprint": _bench_fingerprint,
+    "update_dictionary": _bench_update_dictionary,
+    "validate_file": _bench_validate_file,
+    "metrics_from_canonical": _bench_metrics_from_canonical,
+}
+
+
+def prepare(data: Path, scale: Dict[str, Any]) -> int:
+    """Write ``bench.har`` and ``bench.jsonl`` under *data*; return the events."""
+
+    from goblean.normalize.envelope import canonical_envelope
+    from goblean.synth import synthetic_har
+
+    har = synthetic_har(**scale)
+    with (data / "bench.har").open("w", encoding="utf-8") as f:
+        json.dump(har, f)
+    with (data / "bench.jsonl").open("w", encoding="utf-8") as f:
+        for entry in har["log"]["entries"]:
+            f.write(json.dumps(canonical_envelope(entry)) + "\n")
+    return len(har["log"]["entries"])
+
+
+def measure(name: str, data: Path, repeat: int) -> Dict[str, Any]:
+    """Run benchmark *name* in this process and return its result."""
+
+    run = BENCHMARKS[name](data)
+    best = float("inf")
+    events = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = run()
+        best = min(best, time.perf_counter() - start)
+    return {
+        "events": events,
+        "seconds": best,
+        "events_per_sec": events / best if best else 0.0,
+        "peak_rss_bytes": _peak_rss(),
+    }
+
+
+def run_isolated(name: str, data: Path, repeat: int) -> Dict[str, Any]:
+    """Run benchmark *name* in a fresh interpreter."""
+
+    out = subprocess.run(
+        [sys.executable, __file__, "--worker", name, "--data", str(data), "--repeat", str(repeat)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out)
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+    rss_tolerance: float,
+) -> List[str]:
+    """Return a message for every result that regressed against *baseline*."""
+
+    failures = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        floor = base["events_per_sec"] * (1 - tolerance)
+        if result["events_per_sec"] < floor:
+            failures.append(
+                f"{name}: {result['events_per_sec']:.0f} events/s is below "
+                f"{floor:.0f} (baseline {base['events_per_sec']:.0f}, -{tolerance:.0%})"
+            )
+        ceiling = base["peak_rss_bytes"] * (1 + rss_tolerance)
+        if result["peak_rss_bytes"] > ceiling:
+            failures.append(
+                f"{name}: peak RSS {result['peak_rss_bytes'] >> 20} MiB is above "
+                f"{int(ceiling) >> 20} MiB (baseline {base['peak_rss_bytes'] >> 20} MiB, "
+                f"+{rss_tolerance:.0%})"
+            )
+    return failures
+
+
+def _load_baseline(path: Path) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}, {}
+    return data.get("scale", {}), data.get("results", {})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run goblean benchmarks")
+    parser.add_argument(
+        "names", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})"
+    )
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SCALE["sessions"])
+    parser.add_argument("--events", type=int, default=DEFAULT_SCALE["events_per_session"])
+    parser.add_argument("--cadence", type=float, default=DEFAULT_SCALE["cadence"])
+    parser.add_argument("--body-bytes", type=int, default=DEFAULT_SCALE["body_bytes"])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; best counts")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--tolerance", type=float, default=0.3, help="Allowed throughput drop (fraction)"
+    )
+    parser.add_argument(
+        "--rss-tolerance", type=float, default=0.25, help="Allowed peak RSS growth (fraction)"
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Record results as the new baseline"
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--data", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.data, args.repeat)))
+        return
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    scale = {
+        "sessions": args.sessions,
+        "events_per_session": args.events,
+        "cadence": args.cadence,
+        "body_bytes": args.body_bytes,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        data = Path(tmp)
+        events = prepare(data, scale)
+        print(f"{events} synthetic events, {(data / 'bench.har').stat().st_size >> 10} KiB HAR")
+        results = {}
+        for name in names:
+            results[name] = result = run_isolated(name, data, args.repeat)
+            print(
+                f"{name:24} {result['events_per_sec']:>12.0f} events/s "
+                f"{result['peak_rss_bytes'] >> 20:>6} MiB peak RSS"
+            )
+
+    base_scale, baseline = _load_baseline(args.baseline)
+    if args.update_baseline:
+        if base_scale == scale:
+            baseline.update(results)
+        else:
+            baseline = results
+        with args.baseline.open("w", encoding="utf-8") as f:
+            json.dump({"scale": scale, "results": baseline}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated {args.baseline}")
+        return
+    if base_scale != scale:
+        print(f"No baseline recorded at this scale in {args.baseline}; not gating")
+        return
+    failures = compare(results, baseline, args.tolerance, args.rss_tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,12 @@
 This package provides modules for ingesting HAR logs,
 normalizing telemetry, inferring platform/SDK versions,
 and validating events against evolving specs.
+
+Subpackages are imported on first attribute access (PEP 562), so importing
+``goblean`` or running a small CLI does not pay for modules it never uses.
 """
 
-from . import ingest, normalize, fingerprint, validator, dictionary
+from ._lazy import attach
 
 __all__ = [
     "ingest",
@@ -14,3 +17,5 @@ __all__ = [
     "validator",
     "dictionary",
 ]
+
+__getattr__, __dir__ = attach(__name__, submodules=__all__)
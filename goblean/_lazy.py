@@ -0,0 +1,44 @@
+"""Lazy attributes for package ``__init__`` modules (PEP 562).
+
+A package lists what it exports and where each name lives; the defining
+submodule is imported on first access, so importing the package does not pay
+for submodules a caller never uses::
+
+    __getattr__, __dir__ = attach(__name__, {"fingerprint": ".platform_version"})
+"""
+from __future__ import annotations
+
+import importlib
+import sys
+from typing import Any, Callable, Iterable, List, Mapping, Tuple
+
+
+def attach(
+    package: str,
+    attributes: Mapping[str, str] | None = None,
+    submodules: Iterable[str] = (),
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """Return ``__getattr__`` and ``__dir__`` functions for *package*.
+
+    *attributes* maps public names to the relative submodule defining them;
+    *submodules* names submodules exposed as attributes themselves.  Resolved
+    attributes are stored in the package namespace, so each is looked up once.
+    """
+
+    attributes = dict(attributes or {})
+    submodules = set(submodules)
+    names = set(attributes) | submodules
+
+    def __getattr__(name: str) -> Any:
+        if name in submodules:
+            return importlib.import_module(f".{name}", package)
+        if name in attributes:
+            value = getattr(importlib.import_module(attributes[name], package), name)
+            setattr(sys.modules[package], name, value)
+            return value
+        raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+    def __dir__() -> List[str]:
+        return sorted(set(vars(sys.modules[package])) | names)
+
+    return __getattr__, __dir__
@@ -0,0 +1,233 @@
+"""Local on-disk cache of computed results.
+
+Results are stored as JSON under a key derived from the content of the input
+files, the code that computes them and any extra parameters (such as the rule
+specs), so an unchanged evaluation is answered without reading its input
+again.  File digests are remembered by path, modification time and size, so
+unchanged inputs are not re-hashed either.
+
+The cache is bounded in bytes, results and remembered digests alike; when it
+grows past the bound the least recently used entries are removed until it is
+back under :data:`EVICT_TO` of it.  Entries are touched on every hit, so the
+file modification time doubles as the recency stamp.  Each cache object keeps
+a running total of the bytes it wrote, so the directory is only scanned when
+that total crosses the bound (or on the first write).
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import time
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, Sequence, Tuple
+
+from . import instrument
+
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Share of max_bytes an eviction shrinks the cache to, so the writes right
+# after one do not trigger another scan.
+EVICT_TO = 0.9
+
+# Same "racily clean" window as goblean.rules: files modified this recently may
+# change again without their mtime moving, so their digest is not remembered.
+_RACY_NS = 2_000_000_000
+
+_module_digests: Dict[str, str] = {}
+
+
+def default_cache_dir() -> Path:
+    """Return ``$GOBLEAN_CACHE_DIR`` or ``.goblean_cache``."""
+
+    return Path(os.environ.get("GOBLEAN_CACHE_DIR", ".goblean_cache"))
+
+
+def code_version(modules: Iterable[ModuleType]) -> str:
+    """Return a digest of the source of *modules*."""
+
+    h = hashlib.sha256()
+    for module in modules:
+        digest = _module_digests.get(module.__name__)
+        if digest is None:
+            source = inspect.getsourcefile(module)
+            data = Path(source).read_bytes() if source else module.__name__.encode()
+            digest = _module_digests[module.__name__] = hashlib.sha256(data).hexdigest()
+        h.update(f"{module.__name__}:{digest}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _write_json(path: Path, value: Any) -> int:
+    """Atomically write *value* to *path* and return the bytes written."""
+
+    data = json.dumps(value).encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return len(data)
+
+
+class ResultCache:
+    """JSON results under *root*, evicted least recently used past *max_bytes*."""
+
+    def __init__(self, root: Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        # Bytes under root as of the last scan plus those written since;
+        # None until the first scan.
+        self._size: int | None = None
+
+    def file_digest(self, path: Path) -> str:
+        """Return the SHA-256 of *path*, reusing it while the file is unchanged."""
+
+        st = path.stat()
+        stamp = [st.st_mtime_ns, st.st_size]
+        name = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()
+        memo = self.root / "digests" / f"{name}.json"
+        try:
+            with memo.open("r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved["stamp"] == stamp:
+                os.utime(memo)
+                return saved["digest"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+        digest = h.hexdigest()
+        if time.time_ns() - st.st_mtime_ns > _RACY_NS:
+            self._write(memo, {"stamp": stamp, "digest": digest})
+        return digest
+
+    def _write(self, path: Path, value: Any) -> None:
+        """Write an entry and evict if the running total crosses the bound."""
+
+        try:
+            old = path.stat().st_size
+        except FileNotFoundError:
+            old = 0
+        written = _write_json(path, value)
+        if self._size is not None:
+            self._size += written - old
+        if self._size is None or self._size > self.max_bytes:
+            self.evict()
+
+    def key(
+        self,
+        name: str,
+        inputs: Sequence[Path] = (),
+        code: Iterable[ModuleType] = (),
+        params: Any = None,
+    ) -> str:
+        """Return the cache key for computing *name* over *inputs*.
+
+        *code* lists the modules whose source determines the result and
+        *params* is any further JSON-serializable input.
+        """
+
+        h = hashlib.sha256()
+        h.update(name.encode("utf-8"))
+        for path in inputs:
+            h.update(b"\0" + self.file_digest(path).encode("ascii"))
+        h.update(b"\0" + code_version(code).encode("ascii"))
+        h.update(b"\0" + json.dumps(params, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / "results" / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return ``(True, value)`` for a cached *key*, else ``(False, None)``."""
+
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, ValueError):
+            instrument.count("cache_misses")
+            return False, None
+        instrument.count("cache_hits")
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted meanwhile
+            pass
+        return True, value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store *value* under *key* and evict entries past the size bound."""
+
+        self._write(self._path(key), value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value of *key*, computing and storing it on a miss.
+
+        Values that cannot be stored as JSON are returned without caching.
+        """
+
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = compute()
+        try:
+            self.put(key, value)
+        except (TypeError, ValueError):
+            pass
+        return value
+
+    def evict(self) -> None:
+        """Scan the cache and remove least recently used entries past the bound.
+
+        Results and digests are removed oldest first until the cache is within
+        ``max_bytes``, or within :data:`EVICT_TO` of it once anything had to
+        go.  The scan also resets the running total, picking up entries other
+        processes wrote.
+        """
+
+        entries = []
+        total = 0
+        paths = [
+            *(self.root / "results").glob("*/*.json"),
+            *(self.root / "digests").glob("*.json"),
+        ]
+        for path in paths:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        if total > self.max_bytes:
+            target = int(self.max_bytes * EVICT_TO)
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+        self._size = total
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the ``--cache-dir`` and ``--no-cache`` options to a CLI."""
+
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Result cache directory (default: $GOBLEAN_CACHE_DIR or .goblean_cache)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Recompute instead of using cached results"
+    )
+
+
+def cache_from_args(args: argparse.Namespace) -> ResultCache | None:
+    """Return the cache selected by :func:`add_cache_arguments` options."""
+
+    return None if args.no_cache else ResultCache(args.cache_dir)
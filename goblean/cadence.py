@@ -0,0 +1,394 @@
+"""Heartbeat cadence shapes and nearest-neighbour search under DTW.
+
+Each session's ``ts``/``playhead`` samples are collected online by
+:class:`CadenceSeries` and turned into a fixed-length shape: the per-beat
+series of a channel (``interval``: seconds between beats, ``playhead``:
+playhead advance per beat) is z-normalized and reduced to
+:data:`DEFAULT_LENGTH` points by piecewise aggregate approximation (PAA).
+
+:class:`CadenceIndex` answers k-nearest-shape queries under DTW with a
+Sakoe-Chiba window through a cascade of lower bounds.  Candidates are ordered
+by LB_Kim, which only compares the first and last points that DTW always
+aligns, so ranking all *n* of them reads two columns rather than whole shapes.
+The closest block by LB_Kim is checked first with LB_Keogh and DTW, which
+seeds the k-th best distance.  Of the rest, only those whose LB_Kim is below
+that distance get LB_Keogh, and DTW runs in order of the bounds while they
+stay below the current k-th best distance, so most candidates never pay for
+LB_Keogh and most pairs never for DTW.
+
+A query costs O(n log n) for the LB_Kim ranking plus O(L) per LB_Keogh and
+O(L * radius) per DTW for the candidates the cascade reaches, with *L* the
+shape length.  Scoring every session against all others (:func:`cadence_rows`)
+is thus O(n^2 log n) in cheap comparisons, but in the worst case, when all
+shapes are alike, still O(n^2 * L) in bounds.  *max_candidates* caps the
+candidates a query may examine at the best ones by LB_Kim, making the search
+approximate but bounding it at O(n + max_candidates * L * radius) per query.
+
+numpy and tslearn are imported only when shapes are built or searched.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import heapq
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Sequence, Tuple
+
+from . import instrument
+from .aggregate import Aggregator, as_float, feed, iter_canonical
+from .profiling import add_profile_arguments, profile_from_args
+from .sessions import session_id
+
+if TYPE_CHECKING:  # pragma: no cover - typing only
+    import numpy as np
+
+CHANNELS = ("interval", "playhead")
+
+DEFAULT_LENGTH = 32
+DEFAULT_RADIUS = 3
+DEFAULT_K = 5
+MIN_BEATS = 4
+
+# Candidates closest by LB_Kim that seed the k-th best distance.
+BLOCK = 64
+
+# Samples kept per session before the series is thinned to every other one.
+MAX_POINTS = 2048
+
+# Per-beat values vary by less than this share of their mean on a steady
+# cadence; z-normalizing such jitter would blow it up into a shape.
+FLAT_SHARE = 0.01
+
+CADENCE_HEADER = ["session_id", "beats", "nearest_sessions", "nearest_distance", "knn_distance"]
+
+
+class CadenceSeries(Aggregator):
+    """Collect ``(ts, playhead)`` samples per session.
+
+    Envelopes without a session id belong to the session named by
+    :attr:`source`.  Long sessions are thinned by halving, so each keeps at
+    most *max_points* evenly spaced samples.
+    """
+
+    def __init__(self, source: str = "", max_points: int = MAX_POINTS):
+        self.source = source
+        self.max_points = max_points
+        # session id -> [samples, stride, seen]
+        self.sessions: Dict[str, List[Any]] = {}
+
+    def update(self, env: Dict[str, Any]) -> None:
+        params = env.get("params", {})
+        ts = as_float(params.get("ts"))
+        if ts is None:
+            return
+        sid = session_id(env, self.source)
+        state = self.sessions.get(sid)
+        if state is None:
+            state = self.sessions[sid] = [[], 1, 0]
+        samples, stride, seen = state
+        if seen % stride == 0:
+            samples.append((ts, as_float(params.get("playhead"))))
+            if len(samples) >= self.max_points:
+                del samples[1::2]
+                state[1] = stride * 2
+        state[2] = seen + 1
+
+    def series(self) -> Dict[str, List[Tuple[float, float | None]]]:
+        """Return the samples of every session, ordered by ``ts``."""
+
+        return {sid: sorted(state[0], key=lambda s: s[0]) for sid, state in self.sessions.items()}
+
+    def result(self) -> Dict[str, Any]:
+        return {"sessions": len(self.sessions)}
+
+
+def beats(samples: Sequence[Tuple[float, float | None]], channel: str = "interval") -> List[float]:
+    """Return the per-beat values of *channel* for time-ordered *samples*."""
+
+    if channel == "interval":
+        return [b[0] - a[0] for a, b in zip(samples, samples[1:])]
+    if channel == "playhead":
+        return [
+            b[1] - a[1]
+            for a, b in zip(samples, samples[1:])
+            if a[1] is not None and b[1] is not None
+        ]
+    raise ValueError(f"unknown channel {channel!r}; expected one of {', '.join(CHANNELS)}")
+
+
+def shape(values: Sequence[float], length: int = DEFAULT_LENGTH) -> "np.ndarray":
+    """Z-normalize *values* and reduce them to *length* points with PAA.
+
+    Series shorter than *length* are linearly resampled up to it.  A series
+    whose spread is below :data:`FLAT_SHARE` of its mean is flat (all zeros).
+    """
+
+    import numpy as np
+
+    x = np.asarray(values, dtype=float)
+    if x.size == 0:
+        return np.zeros(length)
+    std = x.std()
+    if std <= FLAT_SHARE * abs(x.mean()) or std == 0:
+        return np.zeros(length)
+    x = (x - x.mean()) / std
+    if x.size < length:
+        return np.interp(np.linspace(0, x.size - 1, length), np.arange(x.size), x)
+    # Segment i averages x[i*n/length : (i+1)*n/length], splitting samples
+    # that straddle a boundary between both segments.
+    edges = np.linspace(0, x.size, length + 1)
+    cumulative = np.concatenate(([0.0], np.cumsum(x)))
+    positions = np.arange(x.size + 1)
+    sums = np.interp(edges, positions, cumulative)
+    return np.diff(sums) / np.diff(edges)
+
+
+def envelopes(shapes: "np.ndarray", radius: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Return the upper and lower LB_Keogh envelopes of each row of *shapes*."""
+
+    import numpy as np
+
+    upper = shapes.copy()
+    lower = shapes.copy()
+    for offset in range(1, radius + 1):
+        upper[:, offset:] = np.maximum(upper[:, offset:], shapes[:, :-offset])
+        upper[:, :-offset] = np.maximum(upper[:, :-offset], shapes[:, offset:])
+        lower[:, offset:] = np.minimum(lower[:, offset:], shapes[:, :-offset])
+        lower[:, :-offset] = np.minimum(lower[:, :-offset], shapes[:, offset:])
+    return upper, lower
+
+
+def lb_kim(query: "np.ndarray", shapes: "np.ndarray") -> "np.ndarray":
+    """Return the LB_Kim bound of *query* against every row of *shapes*.
+
+    Every DTW path matches the first points and the last points of both
+    series, so their squared differences bound the distance from below.
+    """
+
+    import numpy as np
+
+    bound = (shapes[:, 0] - query[0]) ** 2
+    if query.size > 1:
+        bound += (shapes[:, -1] - query[-1]) ** 2
+    return np.sqrt(bound)
+
+
+def lb_keogh(query: "np.ndarray", upper: "np.ndarray", lower: "np.ndarray") -> "np.ndarray":
+    """Return the LB_Keogh bound of *query* against every envelope row."""
+
+    import numpy as np
+
+    above = np.clip(query - upper, 0.0, None)
+    below = np.clip(lower - query, 0.0, None)
+    return np.sqrt((above**2 + below**2).sum(axis=1))
+
+
+class CadenceIndex:
+    """Exact k-nearest-neighbour search over cadence shapes under DTW.
+
+    *shapes* is a sequence of equal-length shapes (see :func:`shape`) and
+    *keys* names them.  DTW is constrained to a Sakoe-Chiba band of *radius*
+    points, the same window the LB_Keogh envelopes use.  With
+    *max_candidates*, each query only examines that many shapes, the closest
+    by LB_Kim, and the search is no longer exact.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        shapes: Sequence[Any],
+        radius: int = DEFAULT_RADIUS,
+        max_candidates: int | None = None,
+    ):
+        import numpy as np
+
+        self.keys = list(keys)
+        self.shapes = np.asarray(shapes, dtype=float).reshape(len(self.keys), -1)
+        self.radius = radius
+        self.max_candidates = max_candidates
+        self.upper, self.lower = envelopes(self.shapes, radius)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def nearest(
+        self, query: Any, k: int = DEFAULT_K, exclude: str | None = None
+    ) -> List[Tuple[float, str]]:
+        """Return up to *k* ``(distance, key)`` pairs closest to *query*.
+
+        The shape named *exclude* is skipped, so an indexed shape can be
+        queried for its neighbours other than itself.
+        """
+
+        import numpy as np
+        from tslearn.metrics import dtw
+
+        query = np.asarray(query, dtype=float)
+        kim = lb_kim(query, self.shapes)
+        limit = self.max_candidates
+        if limit is not None and limit < len(kim):
+            order = np.argpartition(kim, limit - 1)[:limit]
+            order = order[np.argsort(kim[order], kind="stable")]
+        else:
+            order = np.argsort(kim, kind="stable")
+        best: List[Tuple[float, int]] = []  # max-heap of (-distance, -row)
+        computed = bounded = 0
+
+        def visit(rows: "np.ndarray") -> None:
+            # DTW for *rows* in order of their bounds, while they can still
+            # beat the k-th best distance.
+            nonlocal computed, bounded
+            bounds = np.maximum(lb_keogh(query, self.upper[rows], self.lower[rows]), kim[rows])
+            bounded += len(rows)
+            for i in np.argsort(bounds, kind="stable"):
+                if len(best) == k and bounds[i] >= -best[0][0]:
+                    break
+                row = int(rows[i])
+                if self.keys[row] == exclude:
+                    continue
+                distance = float(dtw(query, self.shapes[row], sakoe_chiba_radius=self.radius))
+                computed += 1
+                item = (-distance, -row)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+
+        # The closest block by LB_Kim seeds the k-th best distance; only the
+        # rest whose LB_Kim is below it need LB_Keogh.
+        visit(order[:BLOCK])
+        rest = order[BLOCK:]
+        if len(best) == k:
+            rest = rest[: np.searchsorted(kim[rest], -best[0][0], side="left")]
+        if len(rest):
+            visit(rest)
+        instrument.count("lb_keogh_computed", bounded)
+        instrument.count("dtw_computed", computed)
+        instrument.count("dtw_pruned", len(self.keys) - computed)
+        return [(-d, self.keys[-row]) for d, row in sorted(best, reverse=True)]
+
+    def assign(self, queries: Iterable[Any], labels: Sequence[Any]) -> List[Any]:
+        """Return the label of the nearest indexed shape of every query.
+
+        *labels* holds one label per indexed shape, such as the cluster ids of
+        a reference day.
+        """
+
+        position = {key: i for i, key in enumerate(self.keys)}
+        assigned = []
+        for query in queries:
+            found = self.nearest(query, k=1)
+            assigned.append(labels[position[found[0][1]]] if found else None)
+        return assigned
+
+
+def session_shapes(
+    series: Dict[str, Sequence[Tuple[float, float | None]]],
+    channel: str = "interval",
+    length: int = DEFAULT_LENGTH,
+) -> Dict[str, Tuple[int, "np.ndarray"]]:
+    """Return ``(beats, shape)`` of every session with at least :data:`MIN_BEATS`."""
+
+    shapes = {}
+    for sid, samples in series.items():
+        values = beats(samples, channel)
+        if len(values) >= MIN_BEATS:
+            shapes[sid] = (len(values), shape(values, length))
+    return shapes
+
+
+def cadence_rows(
+    shapes: Dict[str, Tuple[int, Any]],
+    k: int = DEFAULT_K,
+    radius: int = DEFAULT_RADIUS,
+    max_candidates: int | None = None,
+) -> List[List[Any]]:
+    """Return ``cadence.csv`` rows, most anomalous sessions first.
+
+    A session's anomaly score is its mean DTW distance to its *k* nearest
+    other sessions.  Every session is queried against all others, so this is
+    quadratic in sessions; *max_candidates* bounds the DTW and LB_Keogh work
+    per session (see :class:`CadenceIndex`).
+    """
+
+    keys = sorted(shapes)
+    index = CadenceIndex(keys, [shapes[key][1] for key in keys], radius, max_candidates)
+    rows = []
+    with instrument.stage("cadence_knn"):
+        for key in keys:
+            neighbours = index.nearest(shapes[key][1], k, exclude=key)
+            distances = [d for d, _ in neighbours]
+            rows.append(
+                [
+                    key,
+                    shapes[key][0],
+                    "|".join(n for _, n in neighbours),
+                    round(distances[0], 4) if distances else "",
+                    round(sum(distances) / len(distances), 4) if distances else "",
+                ]
+            )
+    rows.sort(key=lambda r: (-(r[4] or 0.0), r[0]))
+    return rows
+
+
+def write_cadence(
+    series: Dict[str, Sequence[Tuple[float, float | None]]],
+    out_dir: Path,
+    channel: str = "interval",
+    k: int = DEFAULT_K,
+    radius: int = DEFAULT_RADIUS,
+    length: int = DEFAULT_LENGTH,
+    max_candidates: int | None = None,
+) -> List[List[Any]]:
+    """Write ``out_dir/cadence.csv`` for the sessions in *series*."""
+
+    rows = cadence_rows(session_shapes(series, channel, length), k, radius, max_candidates)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with (out_dir / "cadence.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CADENCE_HEADER)
+        writer.writerows(rows)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rank sessions by how unusual their heartbeat cadence is"
+    )
+    parser.add_argument("canonical", type=Path, nargs="+", help="Input canonical jsonl")
+    parser.add_argument("--out", type=Path, default=Path("out"), help="Output directory")
+    parser.add_argument("--channel", choices=CHANNELS, default="interval")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Neighbours per session")
+    parser.add_argument(
+        "--radius", type=int, default=DEFAULT_RADIUS, help="Sakoe-Chiba window in PAA points"
+    )
+    parser.add_argument(
+        "--length", type=int, default=DEFAULT_LENGTH, help="PAA points per shape"
+    )
+    parser.add_argument(
+        "--max-candidates",
+        type=int,
+        default=None,
+        help="Approximate search: shapes examined per session (default: exact)",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profile_from_args(args, "cadence"):
+        collector = CadenceSeries()
+        for path in args.canonical:
+            collector.source = path.name
+            feed(iter_canonical(path), [collector])
+        rows = write_cadence(
+            collector.series(),
+            args.out,
+            args.channel,
+            args.k,
+            args.radius,
+            args.length,
+            args.max_candidates,
+        )
+    print(f"Wrote {len(rows)} sessions to {args.out / 'cadence.csv'}")
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
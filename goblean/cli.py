@@ -1,18 +1,40 @@
-"""Command line interface for GobLean."""
+"""Command line interface for GobLean.
+
+``python -m goblean.cli <folder>`` counts the HAR files in a folder;
+``python -m goblean.cli run <paths>`` streams them through the whole pipeline
+(see :mod:`goblean.pipeline`).
+"""
 from __future__ import annotations
 import argparse
+import sys
 from pathlib import Path
+from typing import Sequence
 from .ingest import ingest_folder
+from .profiling import add_profile_arguments, profile_from_args
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] == "run":
+        from . import pipeline
 
+        parser = argparse.ArgumentParser(
+            prog="goblean run",
+            description="Stream HAR files through normalize, validation and reports",
+        )
+        pipeline.add_run_arguments(parser)
+        pipeline.run_from_args(parser, parser.parse_args(argv[1:]))
+        return
 
-def main() -> None:
     parser = argparse.ArgumentParser(description="Ingest HAR logs")
     parser.add_argument("path", type=Path, help="Folder of .har files")
-    args = parser.parse_args()
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
 
     count = 0
-    for _ in ingest_folder(args.path):
-        count += 1
+    with profile_from_args(args, "ingest"):
+        for _ in ingest_folder(args.path):
+            count += 1
     print(f"Ingested {count} HAR files")
 
 
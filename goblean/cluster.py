@@ -0,0 +1,540 @@
+"""Session clustering for ``clusters.csv``.
+
+Sessions are summarized online by :class:`SessionProfiles` (parameter names,
+fingerprint, event count and cadence).  When a session closes its features are
+hashed into a fixed-width sparse vector and the profile is dropped; closed
+sessions are spooled to a temporary file and streamed from there through
+:class:`~sklearn.decomposition.IncrementalPCA` in mini-batches and into a
+bounded reservoir sample, on which HDBSCAN is fitted.  Every session is then
+assigned with ``approximate_predict`` and folded into a
+:class:`ClusterSummary` per cluster.  Memory holds the open sessions (at most
+``max_open``), one batch, the reservoir and the cluster summaries; the novelty
+index keeps one score per session of the batch.
+
+The fitted :class:`ClusterModel` is pickled next to the report.  Later runs
+assign new sessions to the existing clusters without refitting; sessions that
+fit no cluster are labelled ``-1``.  Loading a model unpickles it, which can
+run arbitrary code, so the model path must be as trusted as the code itself.
+
+``novelty_score`` comes from the persistent MinHash/LSH index of session
+shapes in :mod:`goblean.lsh`: a session whose shape was seen in an earlier
+batch scores ``0``, one unlike anything indexed scores ``1``.  Per-session
+scores and nearest earlier sessions go to ``session_novelty.csv``.
+
+scikit-learn and hdbscan are imported only when a model is fitted or used.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import pickle
+import random
+import tempfile
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+from .aggregate import Aggregator, as_float, feed, iter_canonical
+from .fingerprint import fingerprint
+from .lsh import DEFAULT_INDEX_FILE, ShapeIndex
+from .profiling import add_profile_arguments, profile_from_args
+from .sessions import session_id
+
+CLUSTERS_HEADER = [
+    "cluster_id",
+    "platform_guess",
+    "sdk_guess",
+    "signature",
+    "representative_sessions",
+    "n",
+    "novelty_score",
+]
+
+NOVELTY_HEADER = ["session_id", "cluster_id", "novelty_score", "nearest_session", "similarity"]
+
+MODEL_FILE = "clusters.model.pkl"
+# 2: features are hashed with blake2b instead of FeatureHasher.
+MODEL_VERSION = 2
+
+DEFAULT_FEATURES = 1 << 10
+DEFAULT_COMPONENTS = 16
+DEFAULT_BATCH_SIZE = 2048
+DEFAULT_MAX_FIT = 20_000
+DEFAULT_MIN_CLUSTER_SIZE = 5
+DEFAULT_MAX_OPEN = 100_000
+
+# Scale of the deterministic noise added to reduced points.  Sessions with the
+# same features map to the same point, and HDBSCAN cannot score exact
+# duplicates (their density is infinite).
+JITTER = 1e-3
+
+# Share of a cluster's sessions that must carry a parameter for it to appear in
+# the cluster signature, and the most parameters listed.
+SIGNATURE_SHARE = 0.5
+SIGNATURE_PARAMS = 20
+REPRESENTATIVES = 3
+
+
+def _feature_index(token: str, n_features: int) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % n_features
+
+
+class SessionProfile:
+    """Running summary of one open session.
+
+    The parameter and shape sets grow with the session's distinct parameters;
+    the profile is dropped once the session closes.
+    """
+
+    __slots__ = (
+        "platform",
+        "sdk",
+        "version",
+        "params",
+        "shape",
+        "count",
+        "ts_count",
+        "first_ts",
+        "last_ts",
+    )
+
+    def __init__(self, platform: str, sdk: str, version: Tuple[int, ...]):
+        self.platform = platform
+        self.sdk = sdk
+        self.version = version
+        self.params: set[str] = set()
+        # "<endpoint> <param>" pairs, the session's telemetry shape.
+        self.shape: set[str] = set()
+        self.count = 0
+        self.ts_count = 0
+        self.first_ts: float | None = None
+        self.last_ts: float | None = None
+
+    @property
+    def cadence(self) -> float:
+        if self.ts_count < 2:
+            return 0.0
+        return (self.last_ts - self.first_ts) / (self.ts_count - 1)
+
+    def tokens(self) -> List[str]:
+        """Return the hashed feature tokens of the session."""
+
+        cadence = self.cadence
+        tokens = [
+            f"platform:{self.platform}",
+            f"sdk:{self.sdk}",
+            f"version:{'.'.join(map(str, self.version[:2]))}",
+            f"cadence:{round(math.log2(cadence)) if cadence > 0 else 'none'}",
+            f"events:{round(math.log2(self.count)) if self.count else 0}",
+        ]
+        tokens.extend(f"param:{name}" for name in sorted(self.params))
+        return tokens
+
+    def features(self, n_features: int) -> List[List[int]]:
+        """Return the tokens hashed into ``[index, count]`` pairs below *n_features*."""
+
+        counts = Counter(_feature_index(t, n_features) for t in self.tokens())
+        return [[index, n] for index, n in sorted(counts.items())]
+
+
+class ClosedSession:
+    """A finished session: its hashed features and what the reports need."""
+
+    __slots__ = ("session_id", "platform", "sdk", "params", "shape", "features")
+
+    def __init__(
+        self,
+        session_id: str,
+        platform: str,
+        sdk: str,
+        params: List[str],
+        shape: List[str],
+        features: List[List[int]],
+    ):
+        self.session_id = session_id
+        self.platform = platform
+        self.sdk = sdk
+        self.params = params
+        self.shape = shape
+        self.features = features
+
+
+class SessionProfiles(Aggregator):
+    """Group envelopes into :class:`SessionProfile` objects by session id.
+
+    Envelopes without a session id belong to the session named by
+    :attr:`source`.  At most *max_open* sessions are kept open; beyond that the
+    least recently updated one is closed, and a closed session that shows up
+    again starts over as a new session with the same id.  Closed sessions are
+    spooled to a temporary file as :class:`ClosedSession` records with
+    features hashed into *n_features* columns.
+    """
+
+    def __init__(
+        self,
+        source: str = "",
+        max_open: int = DEFAULT_MAX_OPEN,
+        n_features: int = DEFAULT_FEATURES,
+    ):
+        self.source = source
+        self.max_open = max_open
+        self.n_features = n_features
+        self.open: OrderedDict[str, SessionProfile] = OrderedDict()
+        self.closed_count = 0
+        self._spool: IO[str] | None = None
+
+    def __len__(self) -> int:
+        return self.closed_count + len(self.open)
+
+    def update(self, env: Dict[str, Any]) -> None:
+        sid = session_id(env, self.source)
+        profile = self.open.get(sid)
+        if profile is None:
+            profile = self.open[sid] = SessionProfile(*fingerprint(env))
+            if len(self.open) > self.max_open:
+                self._close(*self.open.popitem(last=False))
+        else:
+            self.open.move_to_end(sid)
+        params = env.get("params", {})
+        profile.params.update(params)
+        endpoint = (env.get("url") or "").split("?", 1)[0]
+        profile.shape.update(f"{endpoint} {name}" for name in params)
+        profile.count += 1
+        ts = as_float(params.get("ts"))
+        if ts is not None:
+            if profile.first_ts is None:
+                profile.first_ts = ts
+            profile.last_ts = ts
+            profile.ts_count += 1
+
+    def _close(self, sid: str, profile: SessionProfile) -> None:
+        if self._spool is None:
+            self._spool = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._spool.seek(0, 2)
+        record = [
+            sid,
+            profile.platform,
+            profile.sdk,
+            sorted(profile.params),
+            sorted(profile.shape),
+            profile.features(self.n_features),
+        ]
+        self._spool.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.closed_count += 1
+
+    def closed(self) -> Iterator[ClosedSession]:
+        """Close every open session and yield all closed sessions in order."""
+
+        while self.open:
+            self._close(*self.open.popitem(last=False))
+        if self._spool is None:
+            return
+        self._spool.seek(0)
+        for line in self._spool:
+            yield ClosedSession(*json.loads(line))
+
+    def result(self) -> Dict[str, Any]:
+        return {"sessions": len(self)}
+
+
+def _batches(items: Iterable[Any], size: int, minimum: int) -> Iterator[List[Any]]:
+    """Yield lists of about *size* of *items*, none smaller than *minimum*.
+
+    A short last batch is merged into the one before it.
+    """
+
+    pending: List[Any] | None = None
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            if pending is not None:
+                yield pending
+            pending, batch = batch, []
+    if pending is not None and len(batch) < minimum:
+        pending.extend(batch)
+        batch = []
+    if pending:
+        yield pending
+    if batch:
+        yield batch
+
+
+class ClusterModel:
+    """Feature hashing, incremental PCA and an HDBSCAN clusterer."""
+
+    def __init__(
+        self,
+        n_features: int = DEFAULT_FEATURES,
+        n_components: int = DEFAULT_COMPONENTS,
+        min_cluster_size: int = DEFAULT_MIN_CLUSTER_SIZE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_fit: int = DEFAULT_MAX_FIT,
+        seed: int = 0,
+    ):
+        self.n_features = n_features
+        self.n_components = n_components
+        self.min_cluster_size = min_cluster_size
+        self.batch_size = batch_size
+        self.max_fit = max_fit
+        self.seed = seed
+        self.pca: Any = None
+        self.clusterer: Any = None
+
+    def _vectors(self, sessions: Sequence[ClosedSession]) -> Any:
+        """Return the L2-normalized feature vectors of *sessions* as rows."""
+
+        import numpy as np
+
+        matrix = np.zeros((len(sessions), self.n_features))
+        for row, session in zip(matrix, sessions):
+            for index, count in session.features:
+                row[index] = count
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def _points(
+        self, sessions: Iterable[ClosedSession]
+    ) -> Iterator[Tuple[List[ClosedSession], Any]]:
+        """Yield batches of *sessions* with their reduced, jittered points."""
+
+        import numpy as np
+
+        rng = np.random.default_rng(self.seed)
+        for batch in _batches(sessions, self.batch_size, 1):
+            points = self.pca.transform(self._vectors(batch))
+            yield batch, points + rng.normal(0.0, JITTER, points.shape)
+
+    def fit(self, profiles: SessionProfiles) -> ClusterModel:
+        """Fit the reduction and the clusterer on the sessions of *profiles*.
+
+        The closed sessions are streamed twice: through
+        :class:`IncrementalPCA` in mini-batches, then reduced into a reservoir
+        sample of at most ``max_fit`` points that HDBSCAN is fitted on.
+        """
+
+        import numpy as np
+        from hdbscan import HDBSCAN
+        from sklearn.decomposition import IncrementalPCA
+
+        n_components = min(self.n_components, len(profiles), self.n_features)
+        self.pca = IncrementalPCA(n_components=n_components)
+        for batch in _batches(profiles.closed(), self.batch_size, n_components):
+            self.pca.partial_fit(self._vectors(batch))
+
+        rng = random.Random(self.seed)
+        sample: List[Any] = []
+        seen = 0
+        for _, points in self._points(profiles.closed()):
+            for point in points:
+                seen += 1
+                if len(sample) < self.max_fit:
+                    sample.append(point)
+                else:
+                    j = rng.randrange(seen)
+                    if j < self.max_fit:
+                        sample[j] = point
+        self.clusterer = HDBSCAN(
+            min_cluster_size=self.min_cluster_size, prediction_data=True
+        ).fit(np.asarray(sample))
+        return self
+
+    def assign(
+        self, sessions: Iterable[ClosedSession]
+    ) -> Iterator[Tuple[ClosedSession, int]]:
+        """Yield each session with its cluster label, ``-1`` for noise."""
+
+        from hdbscan import approximate_predict
+
+        for batch, points in self._points(sessions):
+            labels, _ = approximate_predict(self.clusterer, points)
+            yield from zip(batch, (int(label) for label in labels))
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump({"version": MODEL_VERSION, "model": self}, f)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> ClusterModel | None:
+        """Return the model saved at *path*, or ``None`` if there is none.
+
+        The model is unpickled: only load files this module wrote to a
+        directory no one else can write to.
+        """
+
+        try:
+            with path.open("rb") as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if data.get("version") != MODEL_VERSION:
+            return None
+        return data["model"]
+
+
+class ClusterSummary:
+    """Running totals of the sessions assigned to one cluster."""
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.novelty = 0.0
+        self.platforms: Counter[str] = Counter()
+        self.sdks: Counter[str] = Counter()
+        self.params: Counter[str] = Counter()
+        # The most typical sessions: lowest novelty, then session id.
+        self.representatives: List[Tuple[float, str]] = []
+
+    def add(self, session: ClosedSession, novelty: float) -> None:
+        self.n += 1
+        self.novelty += novelty
+        self.platforms[session.platform] += 1
+        self.sdks[session.sdk] += 1
+        self.params.update(session.params)
+        self.representatives.append((novelty, session.session_id))
+        self.representatives.sort()
+        del self.representatives[REPRESENTATIVES:]
+
+    def row(self, label: int) -> List[Any]:
+        """Return the ``clusters.csv`` row of the cluster with *label*."""
+
+        signature = sorted(
+            name for name, n in self.params.items() if n >= SIGNATURE_SHARE * self.n
+        )[:SIGNATURE_PARAMS]
+        return [
+            label,
+            self.platforms.most_common(1)[0][0],
+            self.sdks.most_common(1)[0][0],
+            "|".join(signature),
+            "|".join(sid for _, sid in self.representatives),
+            self.n,
+            round(self.novelty / self.n, 4),
+        ]
+
+
+def cluster_rows(summaries: Mapping[int, ClusterSummary]) -> List[List[Any]]:
+    """Return ``clusters.csv`` rows for the cluster *summaries*.
+
+    Each cluster lists its most common platform and SDK, the parameters most of
+    its sessions carry, its most typical sessions and the mean novelty of its
+    sessions.
+    """
+
+    return [summaries[label].row(label) for label in sorted(summaries)]
+
+
+def write_clusters(
+    profiles: SessionProfiles,
+    out_dir: Path,
+    model_path: Path | None = None,
+    refit: bool = False,
+    min_cluster_size: int = DEFAULT_MIN_CLUSTER_SIZE,
+    index_path: Path | None = None,
+) -> List[List[Any]]:
+    """Cluster the sessions of *profiles* into ``clusters.csv`` and ``session_novelty.csv``.
+
+    The model at *model_path* (default ``out_dir/clusters.model.pkl``) assigns
+    the sessions without refitting; it is fitted and saved when missing, when
+    it hashes features into another width or with *refit*.  Too few sessions
+    to fit leaves them all unclustered.
+
+    Novelty comes from the :class:`~goblean.lsh.ShapeIndex` at *index_path*
+    (default ``out_dir/lsh_index.sqlite``): each session is matched to the
+    most similar shape of earlier batches and then added to the index.
+    """
+
+    model_path = model_path or out_dir / MODEL_FILE
+    index = ShapeIndex(index_path or out_dir / DEFAULT_INDEX_FILE)
+    matches = index.score_and_add((s.session_id, s.shape) for s in profiles.closed())
+    model = None if refit else ClusterModel.load(model_path)
+    if model is not None and model.n_features != profiles.n_features:
+        model = None
+    if model is None and len(profiles) >= 2 * min_cluster_size:
+        model = ClusterModel(
+            n_features=profiles.n_features, min_cluster_size=min_cluster_size
+        ).fit(profiles)
+        model.save(model_path)
+    if model is not None:
+        assigned = model.assign(profiles.closed())
+    else:
+        assigned = ((session, -1) for session in profiles.closed())
+
+    summaries: Dict[int, ClusterSummary] = {}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with (out_dir / "session_novelty.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(NOVELTY_HEADER)
+        for session, label in assigned:
+            match = matches[session.session_id]
+            summaries.setdefault(label, ClusterSummary()).add(session, match.novelty)
+            writer.writerow(
+                [
+                    session.session_id,
+                    label,
+                    match.novelty,
+                    match.session_id or "",
+                    match.similarity,
+                ]
+            )
+    rows = cluster_rows(summaries)
+    with (out_dir / "clusters.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CLUSTERS_HEADER)
+        writer.writerows(rows)
+    return rows
+
+
+def profile_canonical(canonicals: Iterable[Path]) -> SessionProfiles:
+    """Return the session profiles of canonical JSONL files."""
+
+    profiles = SessionProfiles()
+    for path in canonicals:
+        profiles.source = path.name
+        feed(iter_canonical(path), [profiles])
+    return profiles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cluster sessions into clusters.csv")
+    parser.add_argument("canonical", type=Path, nargs="+", help="Input canonical jsonl")
+    parser.add_argument("--out", type=Path, default=Path("out"), help="Output directory")
+    parser.add_argument(
+        "--model",
+        type=Path,
+        default=None,
+        help=f"Trusted model path, unpickled when present (default: OUT/{MODEL_FILE})",
+    )
+    parser.add_argument(
+        "--refit", action="store_true", help="Fit a new model instead of assigning"
+    )
+    parser.add_argument(
+        "--min-cluster-size", type=int, default=DEFAULT_MIN_CLUSTER_SIZE
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        default=None,
+        help=f"Shape index path (default: OUT/{DEFAULT_INDEX_FILE})",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profile_from_args(args, "cluster"):
+        rows = write_clusters(
+            profile_canonical(args.canonical),
+            args.out,
+            args.model,
+            args.refit,
+            args.min_cluster_size,
+            args.index,
+        )
+    print(f"Wrote {len(rows)} clusters to {args.out / 'clusters.csv'}")
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
@@ -0,0 +1,237 @@
+"""Dependency-aware executor for report steps.
+
+Each :class:`Step` names the artifacts (file names under the output directory)
+it reads and writes.  Values a step returns are handed to later steps in
+memory; artifacts that were not produced in this run are read from disk.
+
+A cacheable step is skipped when the digest of its inputs matches the previous
+run and its outputs are still the files it wrote, as recorded in
+``.pipeline_state.json``.  Steps whose dependencies are satisfied run
+concurrently.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+    Set,
+)
+
+from . import instrument
+
+STATE_FILE = ".pipeline_state.json"
+
+
+class Step:
+    """A unit of work reading *inputs* and writing *outputs*.
+
+    *func* is called as ``func(out_dir, inputs)`` where *inputs* maps each input
+    name to its value, or ``None`` if the artifact does not exist; values are
+    loaded when first accessed.  It returns a mapping of output names to the
+    values it wrote; outputs it left untouched may be omitted or ``None``.  An
+    artifact name without a file on disk, such as a report model, only passes
+    values in memory.  Steps with side effects beyond their outputs, such as
+    appending to a history file, must not be *cacheable*.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Path, Mapping[str, Any]], Dict[str, Any] | None],
+        inputs: Sequence[str] = (),
+        outputs: Sequence[str] = (),
+        cacheable: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cacheable = cacheable
+
+
+def read_artifact(path: Path) -> Any:
+    """Return CSV rows or text for the artifact at *path*, ``None`` if absent."""
+
+    try:
+        with path.open("r", encoding="utf-8", newline="") as f:
+            if path.suffix == ".csv":
+                return list(csv.reader(f))
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def digest(values: Iterable[Any]) -> str:
+    """Return a content hash of *values*."""
+
+    h = hashlib.sha256()
+    for value in values:
+        h.update(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _stamp(path: Path) -> List[int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class _Inputs(Mapping):
+    """Step inputs, each loaded on first access.
+
+    Steps that keep their own position in a log never pay for reading it.
+    """
+
+    def __init__(self, names: Sequence[str], load: Callable[[str], Any]):
+        self._names = list(names)
+        self._load = load
+        self._values: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._names:
+            raise KeyError(name)
+        if name not in self._values:
+            self._values[name] = self._load(name)
+        return self._values[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+def dependencies(steps: Sequence[Step]) -> Dict[str, Set[str]]:
+    """Return the names of the steps each step must wait for.
+
+    Steps are listed in an order that is valid when run sequentially.  An input
+    depends on the latest earlier step writing it; an output additionally waits
+    for earlier writers and readers of the same artifact so rewrites keep their
+    sequential order.
+    """
+
+    writer: Dict[str, str] = {}
+    readers: Dict[str, List[str]] = {}
+    deps: Dict[str, Set[str]] = {}
+    for step in steps:
+        needs: Set[str] = set()
+        for name in step.inputs:
+            if name in writer:
+                needs.add(writer[name])
+        for name in step.outputs:
+            if name in writer:
+                needs.add(writer[name])
+            needs.update(readers.get(name, []))
+        needs.discard(step.name)
+        deps[step.name] = needs
+        for name in step.inputs:
+            readers.setdefault(name, []).append(step.name)
+        for name in step.outputs:
+            writer[name] = step.name
+            readers[name] = []
+    return deps
+
+
+def run_steps(
+    steps: Sequence[Step], out_dir: Path, max_workers: int = 4
+) -> Dict[str, str]:
+    """Run *steps* against *out_dir* and return each step's status.
+
+    The status is ``"ran"`` or ``"skipped"``.  Exceptions raised by a step
+    propagate once the steps already running have finished; the state of steps
+    that completed is still recorded.
+    """
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    state_path = out_dir / STATE_FILE
+    try:
+        with state_path.open("r", encoding="utf-8") as f:
+            state: Dict[str, Any] = json.load(f)
+    except (FileNotFoundError, ValueError):
+        state = {}
+
+    deps = dependencies(steps)
+    by_name = {step.name: step for step in steps}
+    data: Dict[str, Any] = {}
+    lock = threading.Lock()
+    status: Dict[str, str] = {}
+
+    def value(name: str) -> Any:
+        with lock:
+            if name in data:
+                return data[name]
+        return read_artifact(out_dir / name)
+
+    def run(step: Step) -> str:
+        inputs = _Inputs(step.inputs, value)
+        # Only cacheable steps need a digest; other steps may exchange objects
+        # that have no JSON form, such as a report model.
+        key = None
+        if step.cacheable:
+            key = digest([step.name, *(inputs[name] for name in step.inputs)])
+        previous = state.get(step.name, {})
+        if (
+            key is not None
+            and previous.get("inputs") == key
+            and all(
+                previous.get("outputs", {}).get(name) == _stamp(out_dir / name)
+                for name in step.outputs
+            )
+        ):
+            instrument.count("steps_skipped")
+            return "skipped"
+        with instrument.stage(f"step.{step.name}"):
+            produced = step.func(out_dir, inputs) or {}
+        instrument.count("steps_ran")
+        with lock:
+            for name, result in produced.items():
+                if result is not None:
+                    data[name] = result
+            state[step.name] = {
+                "inputs": key,
+                "outputs": {name: _stamp(out_dir / name) for name in step.outputs},
+            }
+        return "ran"
+
+    pending = [step.name for step in steps]
+    running: Dict[Any, str] = {}
+    error: BaseException | None = None
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        while pending or running:
+            if error is None:
+                for name in [n for n in pending if deps[n] <= status.keys()]:
+                    pending.remove(name)
+                    running[pool.submit(run, by_name[name])] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    status[name] = future.result()
+                except BaseException as exc:  # re-raised after state is saved
+                    error = error or exc
+
+    tmp = state_path.with_name(state_path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, state_path)
+    if error is not None:
+        raise error
+    return status
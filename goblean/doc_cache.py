@@ -0,0 +1,308 @@
+"""Cited documentation cache: storage and reachability checks.
+
+Entries live in an SQLite database (:class:`DocCacheStore`) so readers and
+writers update individual entries in transactions instead of rewriting one
+JSON document; the report run and the background verifier can share it safely.
+
+Sources are checked concurrently with a bounded thread pool and a per-host
+connection limit.  Every request has a timeout; connection errors, timeouts,
+``429`` and ``5xx`` responses are retried with exponential backoff.  Stored
+``ETag`` and ``Last-Modified`` validators are sent as conditional headers so
+unchanged documents answer ``304 Not Modified`` without a body.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Mapping
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+DEFAULT_STORE_PATH = Path("docs/doc_cache.sqlite")
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_WORKERS = 16
+DEFAULT_PER_HOST = 4
+
+
+class SourceCheck:
+    """Outcome of checking one source URL."""
+
+    def __init__(
+        self,
+        ok: bool,
+        status: int | None = None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        error: str | None = None,
+    ):
+        self.ok = ok
+        self.status = status
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+
+
+def _retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def check_source(
+    url: str,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+) -> SourceCheck:
+    """Send a conditional ``HEAD`` request for *url*.
+
+    Responses below 400, including ``304``, count as reachable.  Validators from
+    the response are returned so callers can store them for the next check.
+    """
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    attempt = 0
+    while True:
+        try:
+            req = Request(url, method="HEAD", headers=headers)
+            with urlopen(req, timeout=timeout) as resp:
+                return SourceCheck(
+                    resp.status < 400,
+                    resp.status,
+                    resp.headers.get("ETag") or etag,
+                    resp.headers.get("Last-Modified") or last_modified,
+                )
+        except urllib.error.HTTPError as exc:
+            # urllib reports 304 as an error because it is not a 2xx status.
+            if exc.code == 304:
+                return SourceCheck(True, 304, etag, last_modified)
+            if not _retryable(exc.code) or attempt >= retries:
+                return SourceCheck(False, exc.code, error=str(exc))
+        except (urllib.error.URLError, OSError) as exc:
+            if attempt >= retries:
+                return SourceCheck(False, error=str(exc))
+        except Exception as exc:
+            return SourceCheck(False, error=str(exc))
+        time.sleep(backoff * 2**attempt)
+        attempt += 1
+
+
+def verify_sources(
+    entries: Mapping[str, Dict[str, Any]],
+    max_workers: int = DEFAULT_WORKERS,
+    per_host: int = DEFAULT_PER_HOST,
+    timeout: float = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+) -> Dict[str, SourceCheck]:
+    """Check the ``source_url`` of every doc cache entry concurrently.
+
+    *entries* maps citation URLs to doc cache entries.  At most *per_host*
+    requests are in flight for any one host.  Entries without a source URL are
+    reported as unreachable without a request.
+    """
+
+    host_locks: Dict[str, threading.Semaphore] = {}
+    guard = threading.Lock()
+
+    def run(entry: Dict[str, Any]) -> SourceCheck:
+        source = entry.get("source_url", "")
+        if not source:
+            return SourceCheck(False, error="missing source_url")
+        host = urlsplit(source).netloc
+        with guard:
+            limit = host_locks.setdefault(host, threading.Semaphore(per_host))
+        with limit:
+            return check_source(
+                source,
+                entry.get("etag"),
+                entry.get("last_modified"),
+                timeout,
+                retries,
+                backoff,
+            )
+
+    if not entries:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(entries)))) as pool:
+        futures = {url: pool.submit(run, entry) for url, entry in entries.items()}
+        return {url: future.result() for url, future in futures.items()}
+
+
+# Entry fields stored as columns; ``reachable`` is a nullable boolean so entries
+# that were never verified keep reporting the historical default of reachable.
+ENTRY_FIELDS = (
+    "source_url",
+    "first_seen",
+    "last_verified",
+    "reachable",
+    "etag",
+    "last_modified",
+)
+
+_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS entries (
+        url TEXT PRIMARY KEY,
+        source_url TEXT,
+        first_seen TEXT,
+        last_verified TEXT,
+        reachable INTEGER,
+        etag TEXT,
+        last_modified TEXT
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {}
+    for name in ENTRY_FIELDS:
+        value = row[name]
+        if value is None:
+            continue
+        entry[name] = bool(value) if name == "reachable" else value
+    return entry
+
+
+def _column_values(entry: Mapping[str, Any]) -> Dict[str, Any]:
+    values = {name: entry[name] for name in ENTRY_FIELDS if name in entry}
+    if values.get("reachable") is not None:
+        values["reachable"] = int(bool(values["reachable"]))
+    return values
+
+
+class DocCacheStore:
+    """Doc cache entries keyed by citation URL in an SQLite database.
+
+    Every method opens its own short-lived connection, so one store may be used
+    from several threads or processes.  Writes run in ``BEGIN IMMEDIATE``
+    transactions and only touch the fields they are given, so concurrent
+    writers updating different fields of an entry do not undo each other.  On
+    first use a legacy JSON cache (by default ``doc_cache.json`` next to the
+    database) is imported once.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STORE_PATH, legacy_json: Path | None = None):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        legacy = legacy_json or path.with_suffix(".json")
+        with closing(self._connect()) as con:
+            # WAL lets readers proceed while a writer holds the lock.
+            con.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as con:
+            for statement in _SCHEMA:
+                con.execute(statement)
+            imported = con.execute(
+                "SELECT 1 FROM meta WHERE key = 'legacy_json_imported'"
+            ).fetchone()
+            if imported is None:
+                if legacy.exists():
+                    with legacy.open("r", encoding="utf-8") as f:
+                        self._insert(con, json.load(f), replace=False)
+                con.execute(
+                    "INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)",
+                    [str(legacy)],
+                )
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        return con
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with closing(self._connect()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    @staticmethod
+    def _insert(
+        con: sqlite3.Connection, entries: Mapping[str, Mapping[str, Any]], replace: bool
+    ) -> None:
+        for url, entry in entries.items():
+            values = _column_values(entry)
+            columns = ["url", *values]
+            placeholders = ", ".join("?" for _ in columns)
+            sql = f"INSERT INTO entries ({', '.join(columns)}) VALUES ({placeholders})"
+            if replace and values:
+                updates = ", ".join(f"{name} = excluded.{name}" for name in values)
+                sql += f" ON CONFLICT (url) DO UPDATE SET {updates}"
+            else:
+                sql += " ON CONFLICT (url) DO NOTHING"
+            con.execute(sql, [url, *values.values()])
+
+    def get_many(self, urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the entries for *urls* that exist in the store."""
+
+        urls = list(dict.fromkeys(urls))
+        result: Dict[str, Dict[str, Any]] = {}
+        with closing(self._connect()) as con:
+            # Stay well below SQLite's bound-parameter limit.
+            for i in range(0, len(urls), 500):
+                chunk = urls[i : i + 500]
+                rows = con.execute(
+                    f"SELECT * FROM entries WHERE url IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+                for row in rows:
+                    result[row["url"]] = _row_to_entry(row)
+        return result
+
+    def items(self) -> Dict[str, Dict[str, Any]]:
+        """Return every entry keyed by citation URL."""
+
+        with closing(self._connect()) as con:
+            rows = con.execute("SELECT * FROM entries ORDER BY url")
+            return {row["url"]: _row_to_entry(row) for row in rows}
+
+    def upsert_many(self, entries: Mapping[str, Mapping[str, Any]]) -> None:
+        """Insert *entries* or update the fields they contain, atomically."""
+
+        if entries:
+            with self._transaction() as con:
+                self._insert(con, entries, replace=True)
+
+    def insert_missing(self, entries: Mapping[str, Mapping[str, Any]]) -> None:
+        """Insert *entries* whose URL is not in the store yet, atomically."""
+
+        if entries:
+            with self._transaction() as con:
+                self._insert(con, entries, replace=False)
+
+
+def open_store(path: Path | None = None) -> DocCacheStore:
+    """Return the store for *path*, defaulting to :data:`DEFAULT_STORE_PATH`.
+
+    Legacy ``.json`` caches are rejected with :class:`ValueError`: the store
+    only imports them once, so later edits to the JSON would be ignored.
+    """
+
+    if path is None:
+        return DocCacheStore(DEFAULT_STORE_PATH)
+    if path.suffix == ".json":
+        raise ValueError(
+            f"{path} is a legacy JSON doc cache; the doc cache is now the SQLite "
+            f"store {path.with_suffix('.sqlite')}, which imports {path.name} once "
+            "on first use. Pass the .sqlite path and edit the store instead."
+        )
+    return DocCacheStore(path)
@@ -0,0 +1,349 @@
+"""DuckDB-backed reports over canonical data and baseline CSVs.
+
+Canonical JSONL or Parquet files and the CSVs in an output directory are
+registered as DuckDB views so reports can be written as SQL.  DuckDB scans the
+inputs with multiple threads and spills large aggregations to disk, replacing
+the single-threaded Python loops in :mod:`goblean.report` for big inputs.
+"""
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Iterable, List, Sequence
+
+from goblean.profiling import add_profile_arguments, profile_from_args
+from goblean.sessions import SESSION_HEADER, SESSION_PARAMS
+
+if TYPE_CHECKING:  # duckdb is imported when a connection is opened
+    import duckdb
+
+# Columns read from canonical JSONL.  ``headers`` and ``params`` stay JSON so
+# arbitrary keys survive; the optional ``sdk`` fields mirror ``fingerprint``.
+_CANONICAL_COLUMNS = (
+    "{url: 'VARCHAR', method: 'VARCHAR', headers: 'JSON', params: 'JSON', "
+    "sdk: 'VARCHAR', sdk_version: 'VARCHAR'}"
+)
+
+# SQL counterparts of ``goblean.fingerprint`` and ``goblean.sessions``.
+_MACROS = [
+    """
+    CREATE OR REPLACE MACRO header_ci(h, name) AS
+        json_extract_string(h, list_filter(json_keys(h), k -> lower(k) = name)[1])
+    """,
+    """
+    CREATE OR REPLACE MACRO platform_guess(ua) AS CASE
+        WHEN lower(coalesce(ua, '')) LIKE '%roku%' THEN 'roku'
+        WHEN lower(coalesce(ua, '')) LIKE '%android%' THEN 'android'
+        WHEN lower(coalesce(ua, '')) LIKE '%ios%'
+            OR lower(coalesce(ua, '')) LIKE '%iphone%' THEN 'ios'
+        ELSE 'unknown'
+    END
+    """,
+    # ``_parse_version`` keeps the leading digits of each dot-separated part and
+    # stops at the first part that does not start with a digit.
+    """
+    CREATE OR REPLACE MACRO version_scope(v) AS coalesce(
+        nullif(
+            array_to_string(
+                list_transform(
+                    string_split(
+                        regexp_replace(
+                            regexp_extract(coalesce(v, ''), '^[0-9][^.]*(\\.[0-9][^.]*)*'),
+                            '([0-9]+)[^.]*',
+                            '\\1',
+                            'g'
+                        ),
+                        '.'
+                    ),
+                    p -> CAST(TRY_CAST(p AS HUGEINT) AS VARCHAR)
+                ),
+                '.'
+            ),
+            ''
+        ),
+        '0.0.0-virtual'
+    )
+    """,
+]
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _path_list(paths: Sequence[Path]) -> str:
+    return "[" + ", ".join(_quote(str(p)) for p in paths) + "]"
+
+
+def _session_expr() -> str:
+    parts = [f"json_extract_string(params, {_quote(name)})" for name in SESSION_PARAMS]
+    parts.append(f"header_ci(headers, {_quote(SESSION_HEADER)})")
+    # Sessions without an id are named after their file, like ``path.name``
+    # in the Python aggregators.
+    parts.append("parse_filename(filename)")
+    return "coalesce(" + ", ".join(parts) + ")"
+
+
+def connect(
+    canonical: Path | Iterable[Path],
+    out_dir: Path | None = None,
+    threads: int | None = None,
+    database: str = ":memory:",
+) -> duckdb.DuckDBPyConnection:
+    """Return a connection with canonical data and report CSVs as views.
+
+    ``canonical_raw`` exposes the envelopes of every *canonical* file (JSONL or
+    Parquet written by :func:`canonical_to_parquet`); ``events`` adds one row per
+    envelope with its session, timestamp, playhead and fingerprint.  Each
+    ``*.csv`` in *out_dir* becomes a view named after the file stem.
+    """
+
+    import duckdb
+
+    paths = [canonical] if isinstance(canonical, Path) else list(canonical)
+    con = duckdb.connect(database)
+    con.execute("SET TimeZone = 'UTC'")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    for macro in _MACROS:
+        con.execute(macro)
+
+    jsonl = [p for p in paths if p.suffix != ".parquet"]
+    parquet = [p for p in paths if p.suffix == ".parquet"]
+    sources = []
+    if jsonl:
+        sources.append(
+            "SELECT url, method, headers, params, sdk, sdk_version, filename "
+            f"FROM read_json({_path_list(jsonl)}, format = 'newline_delimited', "
+            f"columns = {_CANONICAL_COLUMNS}, filename = true)"
+        )
+    if parquet:
+        sources.append(
+            "SELECT url, method, CAST(headers AS JSON) AS headers, "
+            "CAST(params AS JSON) AS params, sdk, sdk_version, filename "
+            f"FROM read_parquet({_path_list(parquet)}, filename = true, "
+            "union_by_name = true)"
+        )
+    if not sources:
+        raise ValueError("no canonical inputs given")
+    con.execute("CREATE OR REPLACE VIEW canonical_raw AS " + " UNION ALL ".join(sources))
+    con.execute(
+        f"""
+        CREATE OR REPLACE VIEW events AS
+        SELECT
+            {_session_expr()} AS session_id,
+            TRY_CAST(json_extract_string(params, 'ts') AS DOUBLE) AS ts,
+            TRY_CAST(json_extract_string(params, 'playhead') AS DOUBLE) AS playhead,
+            platform_guess(header_ci(headers, 'user-agent')) AS platform,
+            coalesce(nullif(sdk, ''), header_ci(headers, 'x-sdk-name'), 'unknown') AS sdk,
+            version_scope(coalesce(nullif(sdk_version, ''), header_ci(headers, 'x-sdk-version')))
+                AS version_scope,
+            filename AS file_source
+        FROM canonical_raw
+        """
+    )
+    if out_dir is not None and out_dir.exists():
+        for csv_path in sorted(out_dir.glob("*.csv")):
+            con.execute(
+                f'CREATE OR REPLACE VIEW "{csv_path.stem}" AS '
+                f"SELECT * FROM read_csv({_quote(str(csv_path))}, header = true, "
+                "all_varchar = true)"
+            )
+    return con
+
+
+def _has_view(con: duckdb.DuckDBPyConnection, name: str) -> bool:
+    row = con.execute(
+        "SELECT count(*) FROM duckdb_views() WHERE view_name = ?", [name]
+    ).fetchone()
+    return bool(row and row[0])
+
+
+def coverage_rates_sql(
+    con: duckdb.DuckDBPyConnection, session_dates: str | None = None
+) -> str:
+    """SQL for coverage and fp rates grouped by platform, SDK and version.
+
+    ``coverage`` is the share of sessions in ``coverage.csv`` with a label other
+    than ``ABSTAIN``; ``fp_rate`` is the share of labelled sessions that were
+    labelled ``PASS`` yet appear in ``violations.csv``.  With *session_dates*,
+    a query of ``(session_id, date)`` pairs, the rates are also grouped by
+    ``date`` and a session counts on every date it has events.
+    """
+
+    date = "d.date, " if session_dates else ""
+    if not _has_view(con, "coverage"):
+        return (
+            f"SELECT {'NULL::VARCHAR AS date, ' if session_dates else ''}"
+            "NULL::VARCHAR AS platform, NULL::VARCHAR AS sdk, "
+            "NULL::VARCHAR AS version_guess, 0::BIGINT AS sessions, "
+            "0.0::DOUBLE AS coverage, 0.0::DOUBLE AS fp_rate WHERE false"
+        )
+    violated = (
+        "SELECT DISTINCT session_id FROM violations"
+        if _has_view(con, "violations")
+        else "SELECT NULL::VARCHAR AS session_id WHERE false"
+    )
+    dates = f"JOIN ({session_dates}) d ON d.session_id = c.session_id" if session_dates else ""
+    return f"""
+        SELECT
+            {date}c.platform,
+            c.sdk,
+            c.version_guess,
+            count(DISTINCT c.session_id) AS sessions,
+            coalesce(
+                count(DISTINCT c.session_id) FILTER (WHERE c.label <> 'ABSTAIN')
+                / nullif(count(DISTINCT c.session_id), 0),
+                0.0
+            ) AS coverage,
+            coalesce(
+                count(DISTINCT c.session_id) FILTER (WHERE c.label = 'PASS' AND v.session_id IS NOT NULL)
+                / nullif(count(DISTINCT c.session_id) FILTER (WHERE c.label <> 'ABSTAIN'), 0),
+                0.0
+            ) AS fp_rate
+        FROM coverage c
+        {dates}
+        LEFT JOIN ({violated}) v ON v.session_id = c.session_id
+        GROUP BY ALL
+    """
+
+
+def metrics_daily_sql(con: duckdb.DuckDBPyConnection) -> str:
+    """SQL producing ``metrics_daily.csv`` rows.
+
+    One row per ``(date, platform, sdk, version_scope)`` where every envelope
+    contributes to the group of its own timestamp and fingerprint.
+    """
+
+    violations = (
+        "SELECT session_id, count(*) AS n FROM violations GROUP BY session_id"
+        if _has_view(con, "violations")
+        else "SELECT NULL::VARCHAR AS session_id, 0::BIGINT AS n WHERE false"
+    )
+    return f"""
+        WITH group_sessions AS (
+            SELECT DISTINCT
+                coalesce(CAST(CAST(to_timestamp(ts) AS DATE) AS VARCHAR), '') AS date,
+                platform,
+                sdk,
+                version_scope,
+                session_id
+            FROM events
+        ),
+        violation_counts AS ({violations}),
+        grouped AS (
+            SELECT
+                date,
+                platform,
+                sdk,
+                version_scope,
+                count(*) AS total_sessions,
+                sum(coalesce(vc.n, 0))::BIGINT AS violations
+            FROM group_sessions
+            LEFT JOIN violation_counts vc USING (session_id)
+            GROUP BY ALL
+        ),
+        rates AS ({coverage_rates_sql(con, "SELECT DISTINCT session_id, date FROM group_sessions")})
+        SELECT
+            g.date,
+            g.platform,
+            g.sdk,
+            g.version_scope,
+            '0' AS batch,
+            coalesce(r.coverage, 0.0) AS coverage,
+            coalesce(r.fp_rate, 0.0) AS fp_rate,
+            0.0 AS tp_rate,
+            0.0 AS fn_rate,
+            g.violations,
+            g.total_sessions,
+            NULL::VARCHAR AS notes
+        FROM grouped g
+        LEFT JOIN rates r
+            ON r.date = g.date
+            AND r.platform = g.platform
+            AND r.sdk = g.sdk
+            AND r.version_guess = g.version_scope
+        ORDER BY g.date, g.platform, g.sdk, g.version_scope
+    """
+
+
+SESSIONS_INDEX_SQL = """
+    SELECT
+        session_id,
+        arg_min(platform, coalesce(ts, 'infinity'::DOUBLE)) AS platform,
+        arg_min(sdk, coalesce(ts, 'infinity'::DOUBLE)) AS sdk,
+        arg_min(version_scope, coalesce(ts, 'infinity'::DOUBLE)) AS version_guess,
+        min(ts) AS first_ts,
+        max(ts) AS last_ts,
+        count(*) AS event_count,
+        string_agg(DISTINCT file_source, '|' ORDER BY file_source) AS file_source
+    FROM events
+    GROUP BY session_id
+    ORDER BY session_id
+"""
+
+
+def query(con: duckdb.DuckDBPyConnection, sql: str) -> List[tuple[Any, ...]]:
+    """Return all rows produced by *sql*."""
+
+    return con.execute(sql).fetchall()
+
+
+def _copy(con: duckdb.DuckDBPyConnection, sql: str, dest: Path) -> None:
+    con.execute(f"COPY ({sql}) TO {_quote(str(dest))} (FORMAT CSV, HEADER)")
+
+
+def write_reports(
+    canonical: Path | Iterable[Path], out_dir: Path, threads: int | None = None
+) -> None:
+    """Write ``metrics_daily.csv``, ``sessions_index.csv`` and ``coverage_rates.csv``.
+
+    Existing ``coverage.csv`` and ``violations.csv`` in *out_dir* feed the
+    grouped coverage and fp rates.
+    """
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    con = connect(canonical, out_dir, threads)
+    try:
+        _copy(con, metrics_daily_sql(con), out_dir / "metrics_daily.csv")
+        _copy(con, SESSIONS_INDEX_SQL, out_dir / "sessions_index.csv")
+        rates = coverage_rates_sql(con) + " ORDER BY ALL"
+        _copy(con, rates, out_dir / "coverage_rates.csv")
+    finally:
+        con.close()
+
+
+def canonical_to_parquet(canonical: Path | Iterable[Path], dest: Path) -> None:
+    """Convert canonical JSONL into a Parquet file readable by :func:`connect`."""
+
+    con = connect(canonical)
+    try:
+        con.execute(
+            "COPY (SELECT url, method, CAST(headers AS VARCHAR) AS headers, "
+            "CAST(params AS VARCHAR) AS params, sdk, sdk_version FROM canonical_raw) "
+            f"TO {_quote(str(dest))} (FORMAT PARQUET)"
+        )
+    finally:
+        con.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compute grouped reports from canonical data with DuckDB"
+    )
+    parser.add_argument(
+        "canonical", type=Path, nargs="+", help="Canonical jsonl or parquet files"
+    )
+    parser.add_argument(
+        "--out", type=Path, default=Path("out"), help="Output directory for CSVs"
+    )
+    parser.add_argument("--threads", type=int, default=None, help="DuckDB threads")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    with profile_from_args(args, "duckdb_report"):
+        write_reports(args.canonical, args.out, args.threads)
+    print(f"Wrote reports to {args.out}")
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
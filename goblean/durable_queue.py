@@ -0,0 +1,258 @@
+"""Durable append-only CSV logs with consumer offsets.
+
+An :class:`OffsetLog` is a CSV file that is only ever appended to.  Records
+are addressed by offset (the index of the data row since the log was created)
+and each named consumer keeps its own position in ``<name>.offsets.json``, so
+a stage reads only the records it has not processed yet.
+
+Consumers :meth:`~OffsetLog.claim` a batch, process it and then
+:meth:`~OffsetLog.ack` it.  A claimed batch is leased; if it is not
+acknowledged before the lease expires (the worker died) it is handed out again,
+so processing is at-least-once and several workers can share one consumer
+name.  State changes are serialized with an exclusive ``flock`` on
+``<name>.csv.lock``.  Records every consumer has acknowledged are dropped from
+the log once enough of them accumulate.
+
+Fields must not contain line breaks; each record is one line.
+"""
+from __future__ import annotations
+
+import csv
+import fcntl
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_LEASE = 300.0
+DEFAULT_COMPACT_ROWS = 1000
+
+
+def _encode(rows: Sequence[Sequence[str]]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+class Batch:
+    """Records ``[start, end)`` claimed by *consumer*."""
+
+    def __init__(
+        self,
+        consumer: str,
+        start: int,
+        end: int,
+        rows: List[List[str]],
+    ):
+        self.consumer = consumer
+        self.start = start
+        self.end = end
+        self.rows = rows
+
+
+class OffsetLog:
+    """Append-only CSV log at *path* with the given *header*.
+
+    *consumers* are registered up front so records are kept for them even
+    before they first claim; other consumer names register on first use.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        header: Sequence[str],
+        consumers: Sequence[str] = (),
+        compact_rows: int = DEFAULT_COMPACT_ROWS,
+    ):
+        self.path = path
+        self.header = list(header)
+        self.consumers = list(consumers)
+        self.compact_rows = compact_rows
+        self.state_path = path.with_name(f"{path.stem}.offsets.json")
+        self.lock_path = path.with_name(f"{path.name}.lock")
+
+    @contextmanager
+    def _locked(self) -> Iterator[Dict[str, Any]]:
+        """Hold the log lock and yield its state, saved on exit."""
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock_path.open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                state = self._sync(self._load())
+                for name in self.consumers:
+                    self._consumer(state, name)
+                yield state
+                self._save(state)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Any] | None:
+        try:
+            with self.state_path.open("r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, state: Dict[str, Any]) -> None:
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _sync(self, state: Dict[str, Any] | None) -> Dict[str, Any]:
+        """Create the log if needed and count rows appended by other writers."""
+
+        if not self.path.exists():
+            with self.path.open("wb") as f:
+                f.write(_encode([self.header]))
+            state = None
+        size = self.path.stat().st_size
+        if state is None or size < state["end"][1]:
+            # New log, or one written before offsets were kept: index it once.
+            with self.path.open("rb") as f:
+                f.readline()
+                base = [0, f.tell()]
+            state = {"base": base, "end": list(base), "consumers": {}}
+        if size > state["end"][1]:
+            rows, position = self._read(state["end"][1], None)
+            state["end"] = [state["end"][0] + len(rows), position]
+        return state
+
+    def _read(
+        self, position: int, limit: int | None
+    ) -> Tuple[List[List[str]], int]:
+        lines: List[str] = []
+        with self.path.open("rb") as f:
+            f.seek(position)
+            while limit is None or len(lines) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # end of log, or a record still being written
+                lines.append(line.decode("utf-8"))
+                position = f.tell()
+        return [row for row in csv.reader(lines)], position
+
+    def _position(self, state: Dict[str, Any], offset: int) -> int:
+        """Return the byte position of *offset*, reading forward from the base."""
+
+        base_offset, position = state["base"]
+        if offset > base_offset:
+            _, position = self._read(position, offset - base_offset)
+        return position
+
+    def append(self, rows: Sequence[Sequence[str]]) -> int:
+        """Append *rows* and return the offset after the last one."""
+
+        with self._locked() as state:
+            if rows:
+                with self.path.open("ab") as f:
+                    f.write(_encode(rows))
+                    state["end"] = [state["end"][0] + len(rows), f.tell()]
+            return state["end"][0]
+
+    def _consumer(self, state: Dict[str, Any], name: str) -> Dict[str, Any]:
+        return state["consumers"].setdefault(
+            name, {"next": list(state["base"]), "pending": {}}
+        )
+
+    def claim(
+        self, consumer: str, max_items: int = 100, lease: float = DEFAULT_LEASE
+    ) -> Batch | None:
+        """Claim up to *max_items* unprocessed records for *consumer*.
+
+        Batches whose lease expired are handed out again before new records.
+        Returns ``None`` when there is nothing to process.
+        """
+
+        now = time.time()
+        with self._locked() as state:
+            cons = self._consumer(state, consumer)
+            for start, (position, end, expires) in sorted(
+                cons["pending"].items(), key=lambda item: int(item[0])
+            ):
+                if expires <= now:
+                    rows, _ = self._read(position, end - int(start))
+                    cons["pending"][start] = [position, end, now + lease]
+                    return Batch(consumer, int(start), end, rows)
+            start, position = cons["next"]
+            rows, new_position = self._read(position, max_items)
+            if not rows:
+                return None
+            end = start + len(rows)
+            cons["pending"][str(start)] = [position, end, now + lease]
+            cons["next"] = [end, new_position]
+            return Batch(consumer, start, end, rows)
+
+    def ack(self, batch: Batch) -> None:
+        """Mark *batch* processed; records all consumers processed may be dropped."""
+
+        with self._locked() as state:
+            self._consumer(state, batch.consumer)["pending"].pop(str(batch.start), None)
+            self._maybe_compact(state)
+
+    def committed(self, consumer: str) -> int:
+        """Return the offset before which *consumer* has processed everything."""
+
+        with self._locked() as state:
+            return self._committed(self._consumer(state, consumer))
+
+    @staticmethod
+    def _committed(cons: Dict[str, Any]) -> int:
+        return min([cons["next"][0], *(int(s) for s in cons["pending"])])
+
+    def lag(self, consumer: str) -> int:
+        """Return the number of records *consumer* has not processed yet."""
+
+        with self._locked() as state:
+            return state["end"][0] - self._committed(self._consumer(state, consumer))
+
+    def _maybe_compact(self, state: Dict[str, Any]) -> None:
+        consumers = state["consumers"].values()
+        if not consumers:
+            return
+        done = min(self._committed(cons) for cons in consumers)
+        base_offset, base_position = state["base"]
+        if done - base_offset < self.compact_rows:
+            return
+        cut = self._position(state, done)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with self.path.open("rb") as src, tmp.open("wb") as dst:
+            dst.write(src.read(base_position))
+            src.seek(cut)
+            while chunk := src.read(1 << 20):
+                dst.write(chunk)
+        os.replace(tmp, self.path)
+        shift = cut - base_position
+        state["base"] = [done, base_position]
+        state["end"][1] -= shift
+        for cons in consumers:
+            cons["next"][1] -= shift
+            for pending in cons["pending"].values():
+                pending[0] -= shift
+
+
+def drain(
+    log: OffsetLog,
+    consumer: str,
+    process: Callable[[List[List[str]]], None],
+    max_items: int = 100,
+    lease: float = DEFAULT_LEASE,
+) -> int:
+    """Claim, process and acknowledge batches until *consumer* is caught up.
+
+    *process* is called with each batch's rows.  Returns the number of records
+    processed.
+    """
+
+    count = 0
+    while True:
+        batch = log.claim(consumer, max_items, lease)
+        if batch is None:
+            return count
+        process(batch.rows)
+        log.ack(batch)
+        count += len(batch.rows)
@@ -1,5 +1,8 @@
 """Platform and SDK version inference."""
 
-from .platform_version import fingerprint
+from goblean._lazy import attach
 
 __all__ = ["fingerprint"]
+
+# Public name -> submodule defining it, imported on first access.
+__getattr__, __dir__ = attach(__name__, {"fingerprint": ".platform_version"})
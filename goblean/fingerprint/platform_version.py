@@ -3,6 +3,8 @@ from __future__ import annotations
 import re
 from typing import Dict, Any, Tuple
 
+from .. import instrument
+
 
 def _parse_version(text: str) -> Tuple[int, ...]:
     """Return a semantic-version tuple from *text*.
@@ -29,6 +31,11 @@ def fingerprint(event: Dict[str, Any]) -> Tuple[str, str, Tuple[int, ...]]:
     defaults to ``"unknown"`` or an empty version tuple.
     """
 
+    with instrument.stage("fingerprint"):
+        return _fingerprint(event)
+
+
+def _fingerprint(event: Dict[str, Any]) -> Tuple[str, str, Tuple[int, ...]]:
     headers = event.get("headers", {})
 
     # HTTP headers are case-insensitive. Normalise the mapping to lowercase
@@ -0,0 +1,214 @@
+"""Append-only history CSVs with running aggregates.
+
+Each history keeps a JSON sidecar (``<name>.stats.json``) with the number of
+rows, per-column sums and the most recent rows, so averages and recent trends
+are available without re-reading the history.  The sidecar records the size of
+the CSV it describes; if the CSV was changed by anything else the sidecar is
+rebuilt from the files.
+
+Once a history holds more than ``max_rows`` rows, all but the most recent
+``window`` rows are rolled up into one row of ``<name>.rollup.csv`` (first and
+last timestamp, row count and column sums) and removed from the history, so
+both reading and appending stay bounded.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence
+
+DEFAULT_WINDOW = 52
+DEFAULT_MAX_ROWS = 1000
+
+
+class HistoryStats:
+    """Running count and sums of numeric history columns plus recent rows."""
+
+    def __init__(self, columns: Sequence[str], window: int = DEFAULT_WINDOW):
+        self.columns = list(columns)
+        self.window = window
+        self.count = 0
+        self.sums: Dict[str, float] = {c: 0.0 for c in self.columns}
+        self.recent: List[List[float]] = []
+        self.rows = 0
+        self.size = 0
+
+    def add(self, values: Mapping[str, Any]) -> None:
+        row = [float(values[c]) for c in self.columns]
+        self.count += 1
+        for column, value in zip(self.columns, row):
+            self.sums[column] += value
+        self.recent.append(row)
+        del self.recent[: -self.window]
+
+    def mean(self, column: str) -> float:
+        return self.sums[column] / self.count if self.count else 0.0
+
+    def recent_values(self, column: str) -> List[float]:
+        """Return *column* for the most recent rows, oldest first."""
+
+        i = self.columns.index(column)
+        return [row[i] for row in self.recent]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "window": self.window,
+            "count": self.count,
+            "sums": self.sums,
+            "recent": self.recent,
+            "rows": self.rows,
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, Any]) -> HistoryStats:
+        stats = cls(data["columns"], data["window"])
+        stats.count = data["count"]
+        stats.sums = {c: float(data["sums"][c]) for c in stats.columns}
+        stats.recent = [list(map(float, row)) for row in data["recent"]]
+        stats.rows = data["rows"]
+        stats.size = data["size"]
+        return stats
+
+
+def stats_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.stats.json")
+
+
+def rollup_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.rollup.csv")
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _read_dicts(path: Path) -> List[Dict[str, str]]:
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _save(path: Path, stats: HistoryStats) -> None:
+    target = stats_path(path)
+    tmp = target.with_name(target.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(stats.to_json(), f)
+    os.replace(tmp, target)
+
+
+def rebuild_stats(
+    path: Path, columns: Sequence[str], window: int = DEFAULT_WINDOW
+) -> HistoryStats:
+    """Recompute the statistics of *path* from its rollup and rows."""
+
+    stats = HistoryStats(columns, window)
+    for rolled in _read_dicts(rollup_path(path)):
+        stats.count += int(rolled["count"])
+        for column in stats.columns:
+            stats.sums[column] += float(rolled[f"sum_{column}"])
+    rows = _read_dicts(path)
+    for row in rows:
+        stats.add(row)
+    stats.rows = len(rows)
+    stats.size = _size(path)
+    _save(path, stats)
+    return stats
+
+
+def load_stats(
+    path: Path, columns: Sequence[str], window: int = DEFAULT_WINDOW
+) -> HistoryStats:
+    """Return the statistics of the history at *path*.
+
+    The sidecar is used when it matches the history and *columns*; otherwise
+    the statistics are rebuilt once and saved.
+    """
+
+    try:
+        with stats_path(path).open("r", encoding="utf-8") as f:
+            stats = HistoryStats.from_json(json.load(f))
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        stats = None
+    if (
+        stats is not None
+        and stats.columns == list(columns)
+        and stats.window == window
+        and stats.size == _size(path)
+    ):
+        return stats
+    return rebuild_stats(path, columns, window)
+
+
+def compact(path: Path, stats: HistoryStats) -> None:
+    """Roll all but the most recent ``stats.window`` rows of *path* up."""
+
+    with path.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    old, keep = rows[: -stats.window], rows[-stats.window :]
+    if not old:
+        return
+    index = {name: i for i, name in enumerate(header)}
+    rolled = [
+        old[0][0],
+        old[-1][0],
+        str(len(old)),
+        *(repr(sum(float(r[index[c]]) for r in old)) for c in stats.columns),
+    ]
+    target = rollup_path(path)
+    exists = target.exists()
+    with target.open("a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not exists:
+            writer.writerow(
+                ["first_ts", "last_ts", "count", *(f"sum_{c}" for c in stats.columns)]
+            )
+        writer.writerow(rolled)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(keep)
+    os.replace(tmp, path)
+    stats.rows = len(keep)
+    stats.size = _size(path)
+
+
+def append_row(
+    path: Path,
+    header: Sequence[str],
+    row: Sequence[str],
+    columns: Sequence[str],
+    window: int = DEFAULT_WINDOW,
+    max_rows: int = DEFAULT_MAX_ROWS,
+) -> HistoryStats:
+    """Append *row* to the history at *path* and return updated statistics.
+
+    *columns* names the numeric columns to aggregate.  The header is written
+    when the history is created.  The history is compacted once it exceeds
+    *max_rows* rows.
+    """
+
+    stats = load_stats(path, columns, window)
+    exists = path.exists()
+    with path.open("a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not exists:
+            writer.writerow(header)
+        writer.writerow(row)
+    stats.add(dict(zip(header, row)))
+    stats.rows += 1
+    stats.size = _size(path)
+    if stats.rows > max_rows:
+        compact(path, stats)
+    _save(path, stats)
+    return stats
@@ -0,0 +1,54 @@
+"""Minimal HTML report model rendered in a single pass."""
+from __future__ import annotations
+
+import html
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+
+class HtmlReport:
+    """HTML document assembled from sections and rendered once.
+
+    Sections are kept in memory in the order they are added, so several steps
+    can contribute to one document without re-reading or rewriting the file.
+    """
+
+    def __init__(self, title: str):
+        self.title = title
+        self.sections: List[Tuple[str, str]] = []
+
+    def add_section(self, heading: str, lines: Iterable[str]) -> None:
+        """Append a section of HTML *lines* under an ``<h2>`` *heading*.
+
+        An empty *heading* adds the lines without a heading.
+        """
+
+        self.sections.append((heading, "".join(f"{line}\n" for line in lines)))
+
+    def has_section(self, heading: str) -> bool:
+        return any(h == heading for h, _ in self.sections)
+
+    def content(self) -> str:
+        """Return the rendered sections without the title and document tags."""
+
+        parts = []
+        for heading, body in self.sections:
+            if heading:
+                parts.append(f"<h2>{html.escape(heading)}</h2>\n")
+            parts.append(body)
+        return "".join(parts)
+
+    def render(self) -> str:
+        return (
+            "<html><body>\n"
+            f"<h1>{html.escape(self.title)}</h1>\n"
+            f"{self.content()}"
+            "</body></html>\n"
+        )
+
+    def write(self, path: Path) -> str:
+        """Render the report to *path* and return the HTML."""
+
+        text = self.render()
+        path.write_text(text, encoding="utf-8")
+        return text
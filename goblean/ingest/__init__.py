@@ -1,5 +1,10 @@
 """HAR ingestion utilities."""
 
-from .har_ingest import ingest_folder
+from goblean._lazy import attach
 
-__all__ = ["ingest_folder"]
+__all__ = ["ingest_folder", "HarStreamParser"]
+
+# Public name -> submodule defining it, imported on first access.
+__getattr__, __dir__ = attach(
+    __name__, {"ingest_folder": ".har_ingest", "HarStreamParser": ".har_stream"}
+)
@@ -0,0 +1,177 @@
+"""Incremental parsing of HAR uploads as their bytes arrive.
+
+:class:`HarStreamParser` is fed raw chunks, optionally gzip compressed, and
+returns the ``log.entries`` items completed so far, so an upload can be
+normalized while the rest of it is still in flight and never has to be held
+in memory as a whole.  Only the current partial entry is buffered.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import re
+import zlib
+from typing import Any, Dict, List
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+_TOKEN = re.compile(r'["{}\[\]:,]')
+# Rest of a JSON string after its opening quote, up to the closing quote.
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_SEPARATORS = re.compile(r"[\s,]*")
+
+# Keys of the containers enclosing the entries array: the top-level object,
+# ``log`` and ``entries``.
+_ENTRIES_PATH = [None, "log", "entries"]
+
+
+class HarStreamParser:
+    """Parse a HAR document chunk by chunk.
+
+    *gzip* forces or disables gzip decoding; by default it is detected from
+    the first bytes.  More than *max_bytes* of decoded JSON raises
+    :class:`ValueError`, as does a malformed or truncated document on
+    :meth:`close`.
+    """
+
+    def __init__(self, gzip: bool | None = None, max_bytes: int | None = None):
+        self.gzip = gzip
+        self.max_bytes = max_bytes
+        self.bytes_in = 0
+        self.bytes_decoded = 0
+        self._inflate: Any = None
+        self._head = b""
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        # Keys of the open containers while looking for the entries array.
+        self._path: List[str | None] = []
+        self._last_string: str | None = None
+        self._key: str | None = None
+        self._in_entries = False
+        self._done = False
+        # Buffered entry text needed before decoding is retried.
+        self._retry_at = 0
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        """Consume *data* and return the entries it completed."""
+
+        self.bytes_in += len(data)
+        if self.gzip is None:
+            self._head += data
+            if len(self._head) < len(GZIP_MAGIC):
+                return []
+            data, self._head = self._head, b""
+            self.gzip = data.startswith(GZIP_MAGIC)
+        if self.gzip:
+            if self._inflate is None:
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                data = self._inflate.decompress(data)
+            except zlib.error as exc:
+                raise ValueError(f"invalid gzip stream: {exc}") from None
+        return self._feed_decoded(data)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Finish the document and return its last entries."""
+
+        data, self._head = self._head, b""
+        if self.gzip is None:
+            self.gzip = data.startswith(GZIP_MAGIC)
+        if self.gzip:
+            if self._inflate is None:
+                self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                data = self._inflate.decompress(data) + self._inflate.flush()
+            except zlib.error as exc:
+                raise ValueError(f"invalid gzip stream: {exc}") from None
+            if not self._inflate.eof:
+                raise ValueError("truncated gzip stream")
+        entries = self._feed_decoded(data, final=True)
+        if not self._done:
+            raise ValueError("HAR document has no complete log.entries array")
+        return entries
+
+    def _feed_decoded(self, data: bytes, final: bool = False) -> List[Dict[str, Any]]:
+        self.bytes_decoded += len(data)
+        if self.max_bytes is not None and self.bytes_decoded > self.max_bytes:
+            raise ValueError(f"HAR document is larger than {self.max_bytes} bytes")
+        try:
+            text = self._text.decode(data, final)
+        except UnicodeDecodeError as exc:
+            raise ValueError(f"HAR document is not UTF-8: {exc}") from None
+        if self._done:
+            return []
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        if not self._in_entries:
+            self._seek_entries()
+        entries: List[Dict[str, Any]] = []
+        if self._in_entries:
+            self._read_entries(entries, final)
+        return entries
+
+    def _seek_entries(self) -> None:
+        """Scan the document head up to the opening ``[`` of the entries."""
+
+        buf = self._buf
+        pos = self._pos
+        while True:
+            match = _TOKEN.search(buf, pos)
+            if match is None:
+                self._pos = len(buf)
+                return
+            char, start = match.group(), match.start()
+            if char == '"':
+                end = _STRING_REST.match(buf, start + 1)
+                if end is None:
+                    # Resume at the quote once the string is complete.
+                    self._pos = start
+                    return
+                self._last_string = json.loads(buf[start : end.end()])
+                pos = end.end()
+                continue
+            pos = start + 1
+            if char == ":":
+                self._key = self._last_string
+            elif char == ",":
+                self._key = None
+            elif char in "{[":
+                self._path.append(self._key)
+                self._key = None
+                if char == "[" and self._path == _ENTRIES_PATH:
+                    self._in_entries = True
+                    self._pos = pos
+                    return
+            else:
+                if not self._path:
+                    raise ValueError(f"unbalanced {char!r} in HAR document")
+                self._path.pop()
+
+    def _read_entries(self, entries: List[Dict[str, Any]], final: bool) -> None:
+        buf = self._buf
+        pos = self._pos
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                self._done = True
+                self._buf, pos = "", 0
+                break
+            # A large entry arrives over many chunks; only retry once the
+            # buffered text has doubled so decoding it stays linear.
+            if not final and len(buf) - pos < self._retry_at:
+                break
+            try:
+                entry, end = self._json.raw_decode(buf, pos)
+            except json.JSONDecodeError as exc:
+                if final:
+                    raise ValueError(f"malformed HAR entry: {exc}") from None
+                self._retry_at = 2 * (len(buf) - pos)
+                break
+            self._retry_at = 0
+            entries.append(entry)
+            pos = end
+        self._pos = pos
@@ -0,0 +1,203 @@
+"""Lightweight run instrumentation: counters, stage timers and peak memory.
+
+Instrumentation is off unless a :class:`Metrics` collector is active (see
+:func:`collect`).  While it is off, :func:`count` returns immediately and
+:func:`stage` returns a shared no-op context manager, so the hooks can stay in
+hot loops.  Collected metrics are written as ``run_metrics.json`` and,
+optionally, in the Prometheus text exposition format.
+"""
+from __future__ import annotations
+
+import json
+import re
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List
+
+_NULL = nullcontext()
+
+_active: Metrics | None = None
+
+
+def _rss_bytes() -> int:
+    """Return the peak resident set size of this process in bytes."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _Stage:
+    def __init__(self, metrics: Metrics, name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.stack = self.metrics.stack()
+        self.stack.append(self.name)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        self.stack.pop()
+
+
+class Metrics:
+    """Counters, per-stage call counts and seconds, and peak RSS samples."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, int] = {}
+        self.stages: Dict[str, list] = {}  # name -> [calls, seconds]
+        self.memory: Dict[str, int] = {}
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.wall: float | None = None
+        self._lock = threading.Lock()
+        self._stacks: Dict[int, List[str]] = {}
+
+    def stack(self, thread_id: int | None = None) -> List[str]:
+        """Return the stages currently open in a thread (default: this one)."""
+
+        if thread_id is None:
+            thread_id = threading.get_ident()
+        stack = self._stacks.get(thread_id)
+        if stack is None:
+            stack = self._stacks.setdefault(thread_id, [])
+        return stack
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name: str, seconds: float, calls: int = 1) -> None:
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = [0, 0.0]
+            stats[0] += calls
+            stats[1] += seconds
+
+    def sample_memory(self, label: str) -> None:
+        rss = _rss_bytes()
+        with self._lock:
+            self.memory[label] = max(self.memory.get(label, 0), rss)
+
+    def to_json(self) -> Dict[str, Any]:
+        stages = {}
+        for name, (calls, seconds) in sorted(self.stages.items()):
+            stages[name] = {
+                "calls": calls,
+                "seconds": seconds,
+                "mean_ms": seconds / calls * 1000 if calls else 0.0,
+                "per_second": calls / seconds if seconds else 0.0,
+            }
+        return {
+            "started": self.started,
+            # Seconds so far while the collector is still active.
+            "wall_seconds": (
+                self.wall if self.wall is not None else time.perf_counter() - self._start
+            ),
+            "counters": dict(sorted(self.counters.items())),
+            "stages": stages,
+            "peak_rss_bytes": max([_rss_bytes(), *self.memory.values()]),
+            "memory": dict(sorted(self.memory.items())),
+        }
+
+    def to_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+
+        data = self.to_json()
+        lines = []
+        for name, value in data["counters"].items():
+            metric = f"goblean_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        if data["stages"]:
+            lines.append("# TYPE goblean_stage_calls_total counter")
+            for name, stats in data["stages"].items():
+                lines.append(f'goblean_stage_calls_total{{stage="{_label(name)}"}} {stats["calls"]}')
+            lines.append("# TYPE goblean_stage_seconds_total counter")
+            for name, stats in data["stages"].items():
+                lines.append(
+                    f'goblean_stage_seconds_total{{stage="{_label(name)}"}} {stats["seconds"]!r}'
+                )
+        if data["memory"]:
+            lines.append("# TYPE goblean_stage_peak_rss_bytes gauge")
+            for name, value in data["memory"].items():
+                lines.append(f'goblean_stage_peak_rss_bytes{{stage="{_label(name)}"}} {value}')
+        lines += [
+            "# TYPE goblean_peak_rss_bytes gauge",
+            f"goblean_peak_rss_bytes {data['peak_rss_bytes']}",
+            "# TYPE goblean_wall_seconds gauge",
+            f"goblean_wall_seconds {data['wall_seconds']!r}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir: Path, prometheus: bool = False) -> Path:
+        """Write ``run_metrics.json`` (and ``run_metrics.prom``) to *out_dir*."""
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / "run_metrics.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2)
+        if prometheus:
+            (out_dir / "run_metrics.prom").write_text(self.to_prometheus(), encoding="utf-8")
+        return path
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def active() -> Metrics | None:
+    """Return the active collector, or ``None`` when instrumentation is off."""
+
+    return _active
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add *n* to counter *name* if instrumentation is on."""
+
+    if _active is not None:
+        _active.count(name, n)
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Return a context manager timing one call of stage *name*."""
+
+    if _active is None:
+        return _NULL
+    return _Stage(_active, name)
+
+
+def sample_memory(label: str) -> None:
+    """Record the current peak RSS under *label* if instrumentation is on."""
+
+    if _active is not None:
+        _active.sample_memory(label)
+
+
+@contextmanager
+def collect() -> Iterator[Metrics]:
+    """Activate a :class:`Metrics` collector for the duration of the block.
+
+    If a collector is already active, as under ``--profile``, it is reused.
+    """
+
+    global _active
+    if _active is not None:
+        yield _active
+        return
+    metrics = _active = Metrics()
+    try:
+        yield metrics
+    finally:
+        metrics.wall = time.perf_counter() - metrics._start
+        _active = None
@@ -0,0 +1,277 @@
+"""MinHash signatures and a persistent LSH index of session shapes.
+
+A session's shape is its set of ``"<endpoint> <param>"`` pairs.  Its MinHash
+signature estimates the Jaccard similarity of two shapes as the share of equal
+signature slots.  The signature is split into bands, and sessions sharing any
+band bucket are candidates, so matching a session costs a few indexed lookups
+rather than a comparison with every session seen before.
+
+:class:`ShapeIndex` keeps one row per distinct signature in SQLite, with the
+first session that showed it and how many sessions did since, so the index
+grows with the number of distinct shapes rather than sessions.  Each nightly
+batch is scored against the index as it stood before the batch and then
+added, so a shape first seen tonight is novel for all of tonight's sessions.
+
+The scores of the last few batches are recorded too, keyed by session id and
+signature, so rerunning a batch returns the scores of its first run instead of
+matching its sessions against themselves and counting them twice.  A session
+id that comes back with a different shape is scored again.  Scores older than
+``keep_batches`` calls are dropped, so they take space in proportion to the
+recent batches only.
+"""
+from __future__ import annotations
+
+import hashlib
+import random
+import sqlite3
+import struct
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+DEFAULT_INDEX_FILE = "lsh_index.sqlite"
+DEFAULT_PERMUTATIONS = 64
+DEFAULT_BANDS = 16
+DEFAULT_KEEP_BATCHES = 7
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    """
+    CREATE TABLE IF NOT EXISTS shapes (
+        digest BLOB PRIMARY KEY,
+        signature BLOB NOT NULL,
+        session_id TEXT NOT NULL,
+        n INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS buckets (
+        band INTEGER NOT NULL,
+        key BLOB NOT NULL,
+        digest BLOB NOT NULL,
+        PRIMARY KEY (band, key, digest)
+    ) WITHOUT ROWID
+    """,
+    # Scores used to be keyed by session id alone.
+    "DROP TABLE IF EXISTS sessions",
+    """
+    CREATE TABLE IF NOT EXISTS scores (
+        session_id TEXT NOT NULL,
+        digest BLOB NOT NULL,
+        batch INTEGER NOT NULL,
+        novelty REAL NOT NULL,
+        match TEXT,
+        similarity REAL NOT NULL,
+        PRIMARY KEY (session_id, digest)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS scores_batch ON scores (batch)",
+]
+
+
+def _token_hash(token: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class MinHasher:
+    """MinHash over *num_perm* universal hash functions chosen by *seed*."""
+
+    def __init__(self, num_perm: int = DEFAULT_PERMUTATIONS, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.perms = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+        ]
+
+    def signature(self, tokens: Iterable[str]) -> Tuple[int, ...]:
+        """Return the signature of *tokens*; an empty set gets all-max slots."""
+
+        hashes = [_token_hash(t) for t in set(tokens)]
+        if not hashes:
+            return (_MAX_HASH,) * self.num_perm
+        return tuple(
+            min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in self.perms
+        )
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Return the estimated Jaccard similarity of two signatures."""
+
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def _pack(signature: Sequence[int]) -> bytes:
+    return struct.pack(f"<{len(signature)}I", *signature)
+
+
+def _unpack(data: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f"<{len(data) // 4}I", data)
+
+
+class Match:
+    """Novelty of a signature and the most similar indexed session."""
+
+    def __init__(self, novelty: float, session_id: str | None, similarity: float):
+        self.novelty = novelty
+        self.session_id = session_id
+        self.similarity = similarity
+
+
+class ShapeIndex:
+    """Persistent LSH index of distinct signatures at *path*.
+
+    The number of permutations and bands are fixed when the index is created;
+    reopening it with different ones raises :class:`ValueError`.  Session
+    scores are kept for the last *keep_batches* calls to :meth:`score_and_add`.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        num_perm: int = DEFAULT_PERMUTATIONS,
+        bands: int = DEFAULT_BANDS,
+        seed: int = 1,
+        keep_batches: int = DEFAULT_KEEP_BATCHES,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.keep_batches = keep_batches
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, seed)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        settings = {"num_perm": str(num_perm), "bands": str(bands), "seed": str(seed)}
+        with self._transaction() as con:
+            for statement in _SCHEMA:
+                con.execute(statement)
+            stored = dict(con.execute("SELECT key, value FROM meta").fetchall())
+            if stored and stored != settings:
+                raise ValueError(f"{path} was built with {stored}, not {settings}")
+            con.executemany(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)", settings.items()
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with closing(self._connect()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    def _band_keys(self, signature: Sequence[int]) -> List[bytes]:
+        return [
+            hashlib.blake2b(
+                _pack(signature[i * self.rows : (i + 1) * self.rows]), digest_size=8
+            ).digest()
+            for i in range(self.bands)
+        ]
+
+    @staticmethod
+    def _digest(signature: Sequence[int]) -> bytes:
+        return hashlib.blake2b(_pack(signature), digest_size=16).digest()
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as con:
+            return con.execute("SELECT count(*) FROM shapes").fetchone()[0]
+
+    def _match(self, con: sqlite3.Connection, signature: Tuple[int, ...]) -> Match:
+        exact = con.execute(
+            "SELECT session_id FROM shapes WHERE digest = ?", [self._digest(signature)]
+        ).fetchone()
+        if exact is not None:
+            return Match(0.0, exact[0], 1.0)
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(
+                row[0]
+                for row in con.execute(
+                    "SELECT digest FROM buckets WHERE band = ? AND key = ?", [band, key]
+                )
+            )
+        best = Match(1.0, None, 0.0)
+        for digest in sorted(candidates):
+            stored, session = con.execute(
+                "SELECT signature, session_id FROM shapes WHERE digest = ?", [digest]
+            ).fetchone()
+            score = similarity(signature, _unpack(stored))
+            if score > best.similarity:
+                best = Match(1.0 - score, session, score)
+        return best
+
+    def score_and_add(
+        self, shapes: Mapping[str, Iterable[str]] | Iterable[Tuple[str, Iterable[str]]]
+    ) -> Dict[str, Match]:
+        """Score sessions by novelty against the index, then index them.
+
+        *shapes* maps session ids to their shape tokens, or is a stream of
+        ``(session_id, tokens)`` pairs.  Sessions with the
+        same signature are scored once.  A session scored with the same shape
+        by one of the last ``keep_batches`` calls keeps the score it got then
+        and is not added again.
+        """
+
+        matches: Dict[str, Match] = {}
+        signatures: Dict[Tuple[int, ...], List[str]] = {}
+        with self._transaction() as con:
+            batch = con.execute("SELECT coalesce(max(batch), 0) + 1 FROM scores").fetchone()[0]
+            pairs = shapes.items() if isinstance(shapes, Mapping) else shapes
+            for sid, tokens in pairs:
+                signature = self.hasher.signature(tokens)
+                key = [sid, self._digest(signature)]
+                known = con.execute(
+                    "SELECT novelty, match, similarity FROM scores "
+                    "WHERE session_id = ? AND digest = ?",
+                    key,
+                ).fetchone()
+                if known is not None:
+                    matches[sid] = Match(*known)
+                    con.execute(
+                        "UPDATE scores SET batch = ? WHERE session_id = ? AND digest = ?",
+                        [batch, *key],
+                    )
+                    continue
+                signatures.setdefault(signature, []).append(sid)
+            for signature, sids in signatures.items():
+                match = self._match(con, signature)
+                digest = self._digest(signature)
+                for sid in sids:
+                    matches[sid] = match
+                con.executemany(
+                    "INSERT OR IGNORE INTO scores "
+                    "(session_id, digest, batch, novelty, match, similarity) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (sid, digest, batch, match.novelty, match.session_id, match.similarity)
+                        for sid in sids
+                    ],
+                )
+            for signature, sids in signatures.items():
+                digest = self._digest(signature)
+                updated = con.execute(
+                    "UPDATE shapes SET n = n + ? WHERE digest = ?", [len(sids), digest]
+                ).rowcount
+                if updated:
+                    continue
+                con.execute(
+                    "INSERT INTO shapes (digest, signature, session_id, n) VALUES (?, ?, ?, ?)",
+                    [digest, _pack(signature), min(sids), len(sids)],
+                )
+                con.executemany(
+                    "INSERT OR IGNORE INTO buckets (band, key, digest) VALUES (?, ?, ?)",
+                    [(band, key, digest) for band, key in enumerate(self._band_keys(signature))],
+                )
+            con.execute("DELETE FROM scores WHERE batch <= ?", [batch - self.keep_batches])
+        return matches
@@ -1,5 +1,8 @@
 """Telemetry normalization utilities."""
 
-from .envelope import canonical_envelope
+from goblean._lazy import attach
 
 __all__ = ["canonical_envelope"]
+
+# Public name -> submodule defining it, imported on first access.
+__getattr__, __dir__ = attach(__name__, {"canonical_envelope": ".envelope"})
@@ -6,6 +6,7 @@ import json
 from pathlib import Path
 from typing import Any, Dict, Iterable
 
+from ..profiling import add_profile_arguments, profile_from_args
 from .envelope import canonical_envelope
 
 
@@ -25,15 +26,17 @@ def main() -> None:
     )
     parser.add_argument("har", type=Path, help="Input .har file")
     parser.add_argument("out", type=Path, help="Output .jsonl path")
+    add_profile_arguments(parser)
     args = parser.parse_args()
 
-    with args.har.open("r", encoding="utf-8") as f:
-        har = json.load(f)
+    with profile_from_args(args, "normalize"):
+        with args.har.open("r", encoding="utf-8") as f:
+            har = json.load(f)
 
-    args.out.parent.mkdir(parents=True, exist_ok=True)
-    with args.out.open("w", encoding="utf-8") as out_f:
-        for env in normalize_entries(har):
-            out_f.write(json.dumps(env) + "\n")
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with args.out.open("w", encoding="utf-8") as out_f:
+            for env in normalize_entries(har):
+                out_f.write(json.dumps(env) + "\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+"""Streaming end-to-end pipeline from HAR files to reports.
+
+HAR entries flow through generators, normalize and then schema check, and each
+valid envelope is handed once to every consumer: the cadence metrics, the
+parameter dictionary, the rule evaluation (which fingerprints each session)
+and the baseline report aggregators.  Nothing is written between stages;
+only the requested outputs are materialized at the end, so a batch run
+decodes every HAR once and never re-encodes envelopes unless the canonical
+JSONL is asked for.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, TextIO, Tuple
+
+from pydantic import ValidationError
+
+from . import instrument
+from .aggregate import Aggregator, CadenceMetrics
+from .cluster import SessionProfiles, write_clusters
+from .dictionary import new_dictionary, save_dictionary, update_dictionary
+from .ingest.har_ingest import read_har
+from .normalize.envelope import canonical_envelope
+from .profiling import add_profile_arguments, profile_from_args
+from .report import baseline_aggregators, write_baseline_reports
+from .rules import load_specs
+from .schema_check import CanonicalEnvelope, format_error
+from .shadow_eval import Rule, RuleEvaluator
+
+OUTPUTS = ("metrics", "dictionary", "shadow", "reports", "clusters", "canonical")
+DEFAULT_OUTPUTS = ("metrics", "dictionary", "shadow", "reports", "clusters")
+
+# Schema errors kept for the summary; the rest are only counted.
+DEFAULT_MAX_ERRORS = 100
+
+
+def har_paths(paths: Iterable[Path]) -> List[Path]:
+    """Return the HAR files named by *paths*, expanding folders."""
+
+    result: List[Path] = []
+    for path in paths:
+        if path.is_dir():
+            result.extend(sorted(path.glob("*.har")))
+        else:
+            result.append(path)
+    return result
+
+
+def har_entries(paths: Iterable[Path]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(file name, entry)`` for every HAR entry, one file at a time."""
+
+    for path in paths:
+        with instrument.stage("ingest"):
+            har = read_har(path)
+        instrument.count("har_files")
+        instrument.count("bytes", path.stat().st_size)
+        instrument.sample_memory("ingest")
+        for entry in har.get("log", {}).get("entries", []):
+            yield path.name, entry
+
+
+def normalized(
+    entries: Iterable[Tuple[str, Dict[str, Any]]]
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(source, canonical envelope)`` for each entry."""
+
+    for source, entry in entries:
+        with instrument.stage("normalize"):
+            env = canonical_envelope(entry)
+        yield source, env
+
+
+class SchemaErrors:
+    """Count of invalid envelopes and the first ``(source, index, message)``."""
+
+    def __init__(self, max_errors: int = DEFAULT_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.count = 0
+        self.errors: List[Tuple[str, int, str]] = []
+
+
+def schema_checked(
+    envelopes: Iterable[Tuple[str, Dict[str, Any]]], errors: SchemaErrors
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield envelopes that validate; record the others in *errors*.
+
+    Envelopes are validated as Python objects, so no JSON is produced.
+    *index* counts the entries of each source from 1.
+    """
+
+    source = None
+    index = 0
+    for item in envelopes:
+        if item[0] != source:
+            source, index = item[0], 0
+        index += 1
+        try:
+            with instrument.stage("schema_check"):
+                CanonicalEnvelope.model_validate(item[1])
+        except ValidationError as exc:
+            errors.count += 1
+            instrument.count("schema_errors")
+            if len(errors.errors) < errors.max_errors:
+                errors.errors.append((source, index, format_error(exc)))
+            continue
+        yield item
+
+
+class DictionaryAggregator(Aggregator):
+    """Parameter dictionary from :func:`~goblean.dictionary.update_dictionary`."""
+
+    def __init__(self) -> None:
+        self.dictionary = new_dictionary()
+
+    def update(self, env: Dict[str, Any]) -> None:
+        update_dictionary(self.dictionary, env.get("params", {}))
+
+    def result(self) -> Dict[str, Any]:
+        return {"params": len(self.dictionary)}
+
+
+class CanonicalWriter(Aggregator):
+    """Write every envelope to a canonical JSONL file."""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.count = 0
+
+    def update(self, env: Dict[str, Any]) -> None:
+        self.f.write(json.dumps(env) + "\n")
+        self.count += 1
+
+    def result(self) -> Dict[str, Any]:
+        return {"count": self.count}
+
+
+# Stage name of each consumer in instrumentation; the rest are reports.
+_STAGES = {
+    "metrics": "metrics",
+    "dictionary": "dictionary",
+    "shadow": "validation",
+    "clusters": "cluster",
+    "canonical": "canonical",
+}
+
+
+def _timed(update: Callable[[Dict[str, Any]], None], name: str) -> Callable:
+    """Return *update*, timed as stage *name* while instrumentation is on."""
+
+    metrics = instrument.active()
+    if metrics is None:
+        return update
+    clock = time.perf_counter
+
+    def timed(env: Dict[str, Any]) -> None:
+        start = clock()
+        update(env)
+        metrics.add_time(name, clock() - start)
+
+    return timed
+
+
+def run(
+    paths: Sequence[Path],
+    out_dir: Path,
+    outputs: Iterable[str] = DEFAULT_OUTPUTS,
+    specs_dir: Path = Path("rules/specs"),
+    partitioned: bool = False,
+    max_errors: int = DEFAULT_MAX_ERRORS,
+) -> Dict[str, Any]:
+    """Stream the HAR files in *paths* through the pipeline into *out_dir*.
+
+    *outputs* selects what is written:
+
+    ``metrics``
+        ``run_summary.json`` (always returned, even when not written)
+    ``dictionary``
+        ``dictionary.json``
+    ``shadow``
+        ``shadow_eval.json`` with every spec in *specs_dir*
+    ``reports``
+        the baseline CSVs and report steps of :mod:`goblean.report`
+    ``clusters``
+        ``clusters.csv`` from :mod:`goblean.cluster`, assigning sessions to
+        the saved model or fitting one
+    ``canonical``
+        ``canonical.jsonl``
+
+    Consumers for outputs that were not requested are not run.  Returns the
+    run summary: file and entry counts, schema errors and cadence metrics.
+    """
+
+    outputs = set(outputs)
+    unknown = outputs - set(OUTPUTS)
+    if unknown:
+        raise ValueError(f"unknown outputs: {', '.join(sorted(unknown))}")
+    files = har_paths(paths)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    cadence = CadenceMetrics()
+    aggregators: Dict[str, Aggregator] = {"metrics": cadence}
+    if "dictionary" in outputs:
+        dictionary = aggregators["dictionary"] = DictionaryAggregator()
+    if "shadow" in outputs:
+        rules = [Rule(spec) for _, spec in load_specs(specs_dir)]
+        aggregators["shadow"] = RuleEvaluator(rules)
+    if "reports" in outputs:
+        aggregators.update(baseline_aggregators(""))
+    if "clusters" in outputs:
+        profiles = aggregators["clusters"] = SessionProfiles()
+    canonical = None
+    if "canonical" in outputs:
+        canonical = (out_dir / "canonical.jsonl").open("w", encoding="utf-8")
+        aggregators["canonical"] = CanonicalWriter(canonical)
+
+    # Aggregators that name sessions after their input follow the HAR file.
+    sourced = [agg for agg in aggregators.values() if hasattr(agg, "source")]
+    updates = [
+        _timed(agg.update, _STAGES.get(name, "report"))
+        for name, agg in aggregators.items()
+    ]
+    errors = SchemaErrors(max_errors)
+    source = None
+    entries = 0
+    try:
+        for name, env in schema_checked(normalized(har_entries(files)), errors):
+            if name != source:
+                source = name
+                for agg in sourced:
+                    agg.source = name
+            entries += 1
+            for update in updates:
+                update(env)
+    finally:
+        if canonical is not None:
+            canonical.close()
+    instrument.count("events", entries)
+    instrument.sample_memory("consumers")
+
+    results = {name: agg.result() for name, agg in aggregators.items()}
+    summary = {
+        "har_files": len(files),
+        "entries": entries,
+        "schema_errors": errors.count,
+        "errors": [list(e) for e in errors.errors],
+        "metrics": results["metrics"],
+    }
+    if "dictionary" in outputs:
+        save_dictionary(dictionary.dictionary, out_dir / "dictionary.json")
+    if "shadow" in outputs:
+        with (out_dir / "shadow_eval.json").open("w", encoding="utf-8") as f:
+            json.dump(results["shadow"], f)
+    if "reports" in outputs:
+        with instrument.stage("report"):
+            write_baseline_reports(results, out_dir, partitioned)
+        instrument.sample_memory("report")
+    if "clusters" in outputs:
+        with instrument.stage("cluster"):
+            write_clusters(profiles, out_dir)
+        instrument.sample_memory("cluster")
+    if "metrics" in outputs:
+        with (out_dir / "run_summary.json").open("w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options of :func:`run` to *parser*."""
+
+    parser.add_argument("paths", type=Path, nargs="+", help="HAR files or folders")
+    parser.add_argument("--out", type=Path, default=Path("out"), help="Output directory")
+    parser.add_argument(
+        "--outputs",
+        default=",".join(DEFAULT_OUTPUTS),
+        help=f"Comma-separated outputs to write ({', '.join(OUTPUTS)})",
+    )
+    parser.add_argument(
+        "--specs", type=Path, default=Path("rules/specs"), help="Rule spec directory"
+    )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Also write dated reports as date=YYYY-MM-DD/ directories",
+    )
+    parser.add_argument(
+        "--no-metrics",
+        action="store_true",
+        help="Do not collect stage timings and counters into run_metrics.json",
+    )
+    parser.add_argument(
+        "--prometheus",
+        action="store_true",
+        help="Also write the run metrics as Prometheus text to run_metrics.prom",
+    )
+    add_profile_arguments(parser)
+
+
+def run_from_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Run the pipeline with :func:`add_run_arguments` options and print the summary."""
+
+    outputs = [o.strip() for o in args.outputs.split(",") if o.strip()]
+    unknown = sorted(set(outputs) - set(OUTPUTS))
+    if unknown:
+        parser.error(f"unknown outputs: {', '.join(unknown)}")
+    with profile_from_args(args, "run"):
+        if args.no_metrics:
+            summary = run(args.paths, args.out, outputs, args.specs, args.partitioned)
+        else:
+            with instrument.collect() as metrics:
+                summary = run(args.paths, args.out, outputs, args.specs, args.partitioned)
+            metrics.write(args.out, args.prometheus)
+    print(json.dumps(summary))
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Stream HAR files through normalize, validation and reports"
+    )
+    add_run_arguments(parser)
+    run_from_args(parser, parser.parse_args(argv))
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
@@ -0,0 +1,164 @@
+"""``--profile`` support shared by the command line entry points.
+
+A profiled run writes, under ``--profile-dir`` (default ``out/profile``):
+
+``<name>.pstats``
+    deterministic :mod:`cProfile` statistics of the main thread
+``<name>.collapsed``
+    sampled stacks of every thread in the collapsed format read by
+    ``flamegraph.pl`` and speedscope; each stack starts with the CLI name and
+    the :mod:`goblean.instrument` stages open in that thread
+``<name>.alloc.txt``
+    the top allocation sites from :mod:`tracemalloc`, only with
+    ``--profile-allocations``
+``<name>.stages.json``
+    stage timings, counters and peak memory collected while profiling
+
+Allocation tracing slows down every allocation and would inflate the cProfile
+timings, so it is off unless asked for; profile timings and allocations in
+separate runs.
+"""
+from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from types import FrameType
+from typing import ContextManager, Dict, Iterator, List
+
+from . import instrument
+
+DEFAULT_PROFILE_DIR = Path("out/profile")
+DEFAULT_INTERVAL = 0.005
+TOP_ALLOCATIONS = 25
+
+
+def _frame_names(frame: FrameType | None) -> List[str]:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", "?")
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class StackSampler:
+    """Sample the stacks of all other threads every *interval* seconds."""
+
+    def __init__(self, name: str, interval: float = DEFAULT_INTERVAL):
+        self.name = name
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="goblean-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def sample(self) -> None:
+        own = threading.get_ident()
+        metrics = instrument.active()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            open_stages = list(metrics.stack(thread_id)) if metrics else []
+            stages = [f"stage:{s}" for s in open_stages]
+            key = ";".join([self.name, *stages, *_frame_names(frame)])
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def write(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            for stack, n in sorted(self.counts.items()):
+                f.write(f"{stack} {n}\n")
+
+
+def _write_allocations(snapshot: tracemalloc.Snapshot, path: Path) -> None:
+    stats = snapshot.statistics("lineno")
+    current, peak = tracemalloc.get_traced_memory()
+    with path.open("w", encoding="utf-8") as f:
+        f.write(f"traced current={current} peak={peak} bytes\n")
+        for stat in stats[:TOP_ALLOCATIONS]:
+            f.write(f"{stat}\n")
+
+
+@contextmanager
+def profile(
+    directory: Path,
+    name: str,
+    interval: float = DEFAULT_INTERVAL,
+    allocations: bool = False,
+) -> Iterator[None]:
+    """Profile the block and write the files described above to *directory*.
+
+    Allocations are traced only with *allocations*.
+    """
+
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler = cProfile.Profile()
+    sampler = StackSampler(name, interval)
+    started_tracing = allocations and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    with instrument.collect() as metrics:
+        sampler.start()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            sampler.stop()
+            if allocations:
+                snapshot = tracemalloc.take_snapshot()
+                _write_allocations(snapshot, directory / f"{name}.alloc.txt")
+            if started_tracing:
+                tracemalloc.stop()
+            profiler.dump_stats(directory / f"{name}.pstats")
+            sampler.write(directory / f"{name}.collapsed")
+            metrics.sample_memory(name)
+            with (directory / f"{name}.stages.json").open("w", encoding="utf-8") as f:
+                json.dump(metrics.to_json(), f, indent=2)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the ``--profile`` options to a CLI."""
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write cProfile statistics and flamegraph stacks to --profile-dir",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        type=Path,
+        default=DEFAULT_PROFILE_DIR,
+        metavar="DIR",
+        help=f"Directory for profile output (default: {DEFAULT_PROFILE_DIR})",
+    )
+    parser.add_argument(
+        "--profile-allocations",
+        action="store_true",
+        help="Profile and also trace allocations with tracemalloc (inflates timings)",
+    )
+
+
+def profile_from_args(args: argparse.Namespace, name: str) -> ContextManager[None]:
+    """Return :func:`profile` for *name* if ``--profile`` was given."""
+
+    if not (args.profile or args.profile_allocations):
+        return nullcontext()
+    return profile(args.profile_dir, name, allocations=args.profile_allocations)
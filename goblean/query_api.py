@@ -0,0 +1,268 @@
+"""Read API over the report tables of an output directory.
+
+``sessions_index.csv``, ``violations.csv``, ``dictionary.csv`` and
+``rules_index.csv`` are loaded once into in-memory DuckDB tables, so requests
+filter and page through columnar tables instead of re-reading CSVs::
+
+    GET /violations?platform=roku&rule=hb-001&limit=100
+    GET /violations?platform=roku&rule=hb-001&limit=100&cursor=<next>
+
+Pagination is keyset based: each page returns a ``next`` cursor naming the
+last row it contained, and the following page starts after it, so deep pages
+cost the same as the first one.
+
+Responses are cached in process.  A report run ends by replacing
+``.pipeline_state.json`` (see :mod:`goblean.dag`); when that file or one of
+the CSVs changes the tables are reloaded and the cache is cleared.  Cursors from before a reload
+are rejected with ``410 Gone``.
+
+Run it with ``python -m goblean.query_api --out out`` (requires uvicorn).
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from fastapi import FastAPI, HTTPException, Request
+
+from .dag import STATE_FILE
+
+if TYPE_CHECKING:  # duckdb is imported when the tables are loaded
+    import duckdb
+
+# Filter parameter -> SQL condition of each table.  ``rules_index`` keeps its
+# scopes as "|"-separated lists.
+TABLES: Dict[str, Dict[str, str]] = {
+    "sessions_index": {
+        "platform": "platform = ?",
+        "sdk": "sdk = ?",
+        "version": "version_guess = ?",
+        "session": "session_id = ?",
+    },
+    "violations": {
+        "platform": "platform = ?",
+        "sdk": "sdk = ?",
+        "version": "version_guess = ?",
+        "rule": "rule_id = ?",
+        "session": "session_id = ?",
+    },
+    "dictionary": {
+        "param": "param = ?",
+        "type": "type = ?",
+    },
+    "rules_index": {
+        "platform": "list_contains(string_split(scope_platforms, '|'), ?)",
+        "sdk": "list_contains(string_split(scope_sdks, '|'), ?)",
+        "rule": "rule_id = ?",
+    },
+}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+DEFAULT_CACHE_ENTRIES = 1024
+
+
+class CursorExpired(ValueError):
+    """Raised for a cursor issued before the tables were reloaded."""
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _stamp(path: Path) -> Tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ReportTables:
+    """The report tables of *out_dir* and a cache of query results.
+
+    Tables are (re)loaded lazily by :meth:`page` whenever the pipeline state
+    file or any of the CSVs changes, so CSVs rewritten outside a report run
+    are picked up too.
+    """
+
+    def __init__(self, out_dir: Path, cache_entries: int = DEFAULT_CACHE_ENTRIES):
+        self.out_dir = out_dir
+        self.cache_entries = cache_entries
+        self.generation = 0
+        self.tables: Dict[str, List[str]] = {}
+        self._con: duckdb.DuckDBPyConnection | None = None
+        self._stamp: Any = None
+        self._cache: OrderedDict[Any, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _current_stamp(self) -> Any:
+        return (
+            _stamp(self.out_dir / STATE_FILE),
+            *(_stamp(self.out_dir / f"{name}.csv") for name in TABLES),
+        )
+
+    def refresh(self) -> bool:
+        """Reload the tables if a report run finished; return whether it did."""
+
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp == self._stamp and self._con is not None:
+                return False
+            self._load()
+            self._stamp = stamp
+            return True
+
+    def _load(self) -> None:
+        import duckdb
+
+        con = duckdb.connect(":memory:")
+        tables: Dict[str, List[str]] = {}
+        for name in TABLES:
+            path = self.out_dir / f"{name}.csv"
+            if not path.exists():
+                continue
+            # _row numbers the rows in file order and is the pagination key.
+            con.execute(
+                f"CREATE TABLE {_ident(name)} AS SELECT row_number() OVER () AS _row, * "
+                "FROM read_csv(?, header = true, all_varchar = true)",
+                [str(path)],
+            )
+            tables[name] = [
+                row[0]
+                for row in con.execute(
+                    "SELECT column_name FROM duckdb_columns() "
+                    "WHERE table_name = ? AND column_name <> '_row' ORDER BY column_index",
+                    [name],
+                ).fetchall()
+            ]
+        # Queries still running on the previous connection keep it open.
+        self._con = con
+        self.tables = tables
+        self.generation += 1
+        self._cache.clear()
+
+    def page(
+        self,
+        table: str,
+        filters: Dict[str, str],
+        cursor: str | None = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> Dict[str, Any]:
+        """Return up to *limit* rows of *table* matching *filters*.
+
+        *filters* maps parameters of :data:`TABLES` to values.  Raises
+        :class:`KeyError` for an unknown or missing table, :class:`ValueError`
+        for an unknown filter or malformed cursor and :class:`CursorExpired`
+        for a cursor of an earlier load.
+        """
+
+        unknown = set(filters) - set(TABLES[table])
+        if unknown:
+            raise ValueError(f"unknown filters for {table}: {', '.join(sorted(unknown))}")
+        self.refresh()
+        cursor_generation, after = self._parse_cursor(cursor)
+        key = (table, tuple(sorted(filters.items())), after, limit)
+        with self._lock:
+            generation = self.generation
+            if cursor_generation is not None and cursor_generation != generation:
+                raise CursorExpired(cursor)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+            if table not in self.tables:
+                raise KeyError(table)
+            con = self._con.cursor()
+            columns = self.tables[table]
+        conditions = ["_row > ?"]
+        values: List[Any] = [after]
+        for name, value in sorted(filters.items()):
+            conditions.append(TABLES[table][name])
+            values.append(value)
+        rows = con.execute(
+            f"SELECT _row, {', '.join(_ident(c) for c in columns)} FROM {_ident(table)} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY _row LIMIT ?",
+            [*values, limit + 1],
+        ).fetchall()
+        con.close()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        result = {
+            "items": [dict(zip(columns, row[1:])) for row in rows],
+            "next": f"{generation}.{rows[-1][0]}" if more else None,
+        }
+        with self._lock:
+            if generation == self.generation:
+                self._cache[key] = result
+                while len(self._cache) > self.cache_entries:
+                    self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _parse_cursor(cursor: str | None) -> Tuple[int | None, int]:
+        """Return the generation and row of *cursor*; ``(None, 0)`` for none."""
+
+        if not cursor:
+            return None, 0
+        try:
+            generation, row = (int(part) for part in cursor.split("."))
+        except ValueError:
+            raise ValueError(f"malformed cursor {cursor!r}") from None
+        return generation, row
+
+
+def create_app(tables: ReportTables) -> FastAPI:
+    """Return the query application serving *tables*."""
+
+    app = FastAPI(title="goblean query")
+    app.state.tables = tables
+
+    @app.get("/health")
+    def health() -> Dict[str, Any]:
+        tables.refresh()
+        return {"generation": tables.generation, "tables": sorted(tables.tables)}
+
+    @app.get("/{table}")
+    def query(
+        table: str,
+        request: Request,
+        cursor: str | None = None,
+        limit: int = DEFAULT_LIMIT,
+    ) -> Dict[str, Any]:
+        if table not in TABLES:
+            raise HTTPException(404, f"unknown table {table!r}")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise HTTPException(400, f"limit must be between 1 and {MAX_LIMIT}")
+        filters = {
+            k: v for k, v in request.query_params.items() if k not in ("cursor", "limit")
+        }
+        try:
+            return tables.page(table, filters, cursor, limit)
+        except CursorExpired:
+            raise HTTPException(410, "reports were refreshed; restart from the first page")
+        except KeyError:
+            raise HTTPException(404, f"{table}.csv has not been written")
+        except ValueError as exc:
+            raise HTTPException(400, str(exc))
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve report tables over HTTP")
+    parser.add_argument("--out", type=Path, default=Path("out"), help="Report directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    uvicorn.run(create_app(ReportTables(args.out)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
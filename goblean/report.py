@@ -4,27 +4,91 @@ from __future__ import annotations
 import argparse
 import csv
 import json
+import shutil
+import sys
 import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
-import urllib.request
-
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+
+from goblean import doc_cache, history
+from goblean.aggregate import (
+    Aggregator,
+    CadenceMetrics,
+    DistinctCount,
+    as_float,
+    code_modules,
+    feed,
+    iter_canonical,
+    run_aggregators,
+)
+from goblean.cache import ResultCache, add_cache_arguments, cache_from_args
+from goblean.cluster import CLUSTERS_HEADER
+from goblean.dag import Step, read_artifact, run_steps
+from goblean.durable_queue import OffsetLog, drain
 from goblean.fingerprint import fingerprint
-
-
-def populate_rules_index(out_dir: Path) -> None:
-    """Populate ``rules_index.csv`` with scope and test counts."""
+from goblean.html_report import HtmlReport
+from goblean.profiling import add_profile_arguments, profile_from_args
+from goblean.rules import fixture_counts, load_specs
+from goblean.sessions import session_id
+
+
+WEEKLY_REPORT_TITLE = "Weekly Citation Report"
+
+# Append-only distribution logs: header and the stages consuming each log.
+DISTRIBUTION_LOGS = {
+    "distribution_queue.csv": (["file_path", "queued_at"], ["schedule"]),
+    "distribution_schedule.csv": (["file_path", "scheduled_for"], ["deliver", "success"]),
+    "distribution_delivery.csv": (["file_path", "delivered_at"], ["receipts"]),
+    "distribution_receipts.csv": (["file_path", "receipt_at"], ["success"]),
+}
+DISTRIBUTION_BATCH_SIZE = 100
+
+WEEKLY_HISTORY_HEADER = [
+    "ts",
+    "escalated_citations",
+    "notified_citations",
+    "escalated_citations_trend",
+    "notified_citations_trend",
+    "unreachable_citations",
+    "unreachable_citations_trend",
+]
+WEEKLY_TREND_COLUMNS = [
+    "escalated_citations_trend",
+    "notified_citations_trend",
+    "unreachable_citations_trend",
+]
+
+
+def distribution_log(out_dir: Path, name: str) -> OffsetLog:
+    """Return the distribution log *name* under *out_dir*."""
+
+    header, consumers = DISTRIBUTION_LOGS[name]
+    return OffsetLog(out_dir / name, header, consumers)
+
+
+def populate_rules_index(out_dir: Path) -> Tuple[List[List[str]], List[List[str]]]:
+    """Populate ``rules_index.csv`` with scope and test counts.
+
+    Returns the rows written to ``rules_index.csv`` and ``unreachable_docs.csv``,
+    headers included.
+    """
 
     specs_dir = Path("rules/specs")
     tests_dir = Path("rules/tests")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(parents=True, exist_ok=True)
-    doc_cache: Dict[str, Dict[str, Any]] = {}
-    if doc_cache_path.exists():
-        with doc_cache_path.open("r", encoding="utf-8") as f:
-            doc_cache = json.load(f)
-    unreachable_entries: list[list[str]] = []
+    specs = load_specs(specs_dir)
+    # Only the entries cited by current specs are read, and only the ones this
+    # run touches are written back.
+    store = doc_cache.open_store()
+    cited = [
+        c.get("url", "") for _, spec in specs for c in spec.get("citations", [])
+    ]
+    cache = store.get_many(url for url in cited if url)
+    verified: Dict[str, Dict[str, Any]] = {}
+    added: Dict[str, Dict[str, Any]] = {}
+    unreachable_entries: List[List[str]] = []
     header = [
         "rule_id",
         "scope_platforms",
@@ -42,9 +106,8 @@ def populate_rules_index(out_dir: Path) -> None:
         "updated_at",
     ]
     rows = []
-    for spec_file in specs_dir.glob("*.yaml"):
-        with spec_file.open("r", encoding="utf-8") as f:
-            spec = json.load(f)
+    fixtures = fixture_counts(tests_dir)
+    for _, spec in specs:
         scope = spec.get("scope", {})
         checks = spec.get("checks", [])
         constitutional_touch = ""
@@ -56,8 +119,9 @@ def populate_rules_index(out_dir: Path) -> None:
         platforms = "|".join(scope.get("platforms", []))
         sdks = "|".join(scope.get("sdks", []))
         version_range = scope.get("version_range", "")
-        tests_pass = len(list(tests_dir.glob(f"{rule_id}__pass__*.har")))
-        tests_fail = len(list(tests_dir.glob(f"{rule_id}__fail__*.har")))
+        counts = fixtures.get(rule_id, {})
+        tests_pass = counts.get("pass", 0)
+        tests_fail = counts.get("fail", 0)
         citation_urls: list[str] = []
         citation_quotes: list[str] = []
         citation_source_urls: list[str] = []
@@ -68,7 +132,7 @@ def populate_rules_index(out_dir: Path) -> None:
             if not url:
                 continue
             now = datetime.now(timezone.utc).isoformat()
-            entry = doc_cache.get(url)
+            entry = cache.get(url)
             if entry:
                 reachable = entry.get("reachable", True)
                 if not reachable:
@@ -82,7 +146,8 @@ def populate_rules_index(out_dir: Path) -> None:
                     )
                     continue
                 entry["last_verified"] = now
-                doc_cache[url] = entry
+                if url not in added:
+                    verified[url] = {"last_verified": now}
                 citation_source_urls.append(entry.get("source_url", ""))
                 citation_first_seen.append(entry.get("first_seen", ""))
                 citation_last_verified.append(entry.get("last_verified", ""))
@@ -93,7 +158,8 @@ def populate_rules_index(out_dir: Path) -> None:
                     "last_verified": now,
                     "reachable": True,
                 }
-                doc_cache[url] = entry
+                cache[url] = entry
+                added[url] = entry
                 citation_source_urls.append(entry["source_url"])
                 citation_first_seen.append(entry["first_seen"])
                 citation_last_verified.append(entry["last_verified"])
@@ -123,62 +189,73 @@ def populate_rules_index(out_dir: Path) -> None:
                 updated_at,
             ]
         )
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(doc_cache, f, indent=2)
+    store.insert_missing(added)
+    store.upsert_many(verified)
+    rows.insert(0, header)
+    unreachable_entries.insert(
+        0, ["citation_url", "source_url", "first_seen", "last_verified"]
+    )
     with (out_dir / "rules_index.csv").open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(header)
-        writer.writerows(rows)
+        csv.writer(f).writerows(rows)
     with (out_dir / "unreachable_docs.csv").open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["citation_url", "source_url", "first_seen", "last_verified"])
-        writer.writerows(unreachable_entries)
-
-
-def verify_doc_cache(doc_cache_path: Path | None = None) -> Dict[str, bool]:
+        csv.writer(f).writerows(unreachable_entries)
+    return rows, unreachable_entries
+
+
+def verify_doc_cache(
+    doc_cache_path: Path | None = None,
+    max_workers: int = doc_cache.DEFAULT_WORKERS,
+    per_host: int = doc_cache.DEFAULT_PER_HOST,
+    timeout: float = doc_cache.DEFAULT_TIMEOUT,
+    retries: int = doc_cache.DEFAULT_RETRIES,
+    backoff: float = doc_cache.DEFAULT_BACKOFF,
+) -> Dict[str, bool]:
     """Verify cached documents and update ``last_verified`` timestamps.
 
-    Performs a ``HEAD`` request against each ``source_url``. Entries that
-    respond with a status code < 400 are marked ``reachable`` and have their
-    ``last_verified`` field refreshed to the current time. Unreachable entries
-    are marked ``reachable`` = ``False`` and retain their previous timestamps.
+    Performs a conditional ``HEAD`` request against each ``source_url``,
+    concurrently and with a per-request *timeout* (see
+    :func:`goblean.doc_cache.verify_sources`). Entries that respond with a
+    status code < 400 or ``304`` are marked ``reachable``, have their
+    ``last_verified`` field refreshed to the current time and store the
+    returned ``etag``/``last_modified`` validators. Unreachable entries are
+    marked ``reachable`` = ``False`` and retain their previous timestamps.
+    Only the verification fields are written, in one transaction, so the store
+    at *doc_cache_path* (see :func:`goblean.doc_cache.open_store`) can be
+    updated by a report run at the same time.
     The function returns a mapping from citation URLs to a boolean indicating
     verification success.
     """
 
-    if doc_cache_path is None:
-        doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(parents=True, exist_ok=True)
-    cache: Dict[str, Dict[str, Any]] = {}
-    if doc_cache_path.exists():
-        with doc_cache_path.open("r", encoding="utf-8") as f:
-            cache = json.load(f)
+    store = doc_cache.open_store(doc_cache_path)
+    cache = store.items()
+    checks = doc_cache.verify_sources(
+        cache, max_workers, per_host, timeout, retries, backoff
+    )
+    updates: Dict[str, Dict[str, Any]] = {}
     results: Dict[str, bool] = {}
     for url, entry in cache.items():
-        source = entry.get("source_url", "")
-        ok = False
-        if source:
-            try:
-                req = urllib.request.Request(source, method="HEAD")
-                with urllib.request.urlopen(req) as resp:
-                    ok = resp.status < 400
-            except Exception:
-                ok = False
-        entry["reachable"] = ok
-        if ok:
-            entry["last_verified"] = datetime.now(timezone.utc).isoformat()
-        results[url] = ok
-        cache[url] = entry
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(cache, f, indent=2)
+        check = checks[url]
+        update: Dict[str, Any] = {"reachable": check.ok}
+        if check.ok:
+            update["last_verified"] = datetime.now(timezone.utc).isoformat()
+            if check.etag:
+                update["etag"] = check.etag
+            if check.last_modified:
+                update["last_modified"] = check.last_modified
+        if any(entry.get(k) != v for k, v in update.items()):
+            updates[url] = update
+        results[url] = check.ok
+    store.upsert_many(updates)
     return results
 
 
 def schedule_doc_cache_verification(
-    interval_seconds: int, doc_cache_path: Path | None = None
+    interval_seconds: int, doc_cache_path: Path | None = None, **verify_kwargs: Any
 ) -> threading.Event:
     """Run ``verify_doc_cache`` periodically in a background thread.
 
+    Extra keyword arguments are passed to :func:`verify_doc_cache`; its request
+    timeouts bound how long a single unreachable host can delay a run.
     Returns a :class:`threading.Event` that can be set to stop the schedule.
     """
 
@@ -186,83 +263,86 @@ def schedule_doc_cache_verification(
 
     def loop() -> None:
         while not stop_event.is_set():
-            verify_doc_cache(doc_cache_path)
+            verify_doc_cache(doc_cache_path, **verify_kwargs)
             stop_event.wait(interval_seconds)
 
     threading.Thread(target=loop, daemon=True).start()
     return stop_event
 
 
-def notify_unreachable_docs(out_dir: Path) -> None:
-    """Write notifications for unreachable citation sources."""
+def _rows(out_dir: Path, name: str, rows: List[List[str]] | None) -> List[List[str]]:
+    """Return *rows* if given, else the rows of ``out_dir/name`` (``[]`` if absent)."""
+
+    if rows is None:
+        rows = read_artifact(out_dir / name)
+    return rows or []
+
+
+def _write_rows(path: Path, rows: List[List[str]]) -> List[List[str]]:
+    with path.open("w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+    return rows
 
-    src = out_dir / "unreachable_docs.csv"
-    if not src.exists():
-        return
-    with src.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    notify_path = out_dir / "unreachable_notifications.csv"
+
+def _stamp_first_column(
+    out_dir: Path, src: List[List[str]], name: str, column: str
+) -> List[List[str]] | None:
+    """Write ``[first column, now]`` for every data row of *src* to *name*."""
+
+    if len(src) <= 1:
+        return None
     now = datetime.now(timezone.utc).isoformat()
-    with notify_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["citation_url", "notified_at"])
-        for row in rows[1:]:
-            writer.writerow([row[0], now])
+    rows = [[src[0][0], column], *([row[0], now] for row in src[1:])]
+    return _write_rows(out_dir / name, rows)
+
+
+def notify_unreachable_docs(
+    out_dir: Path, unreachable: List[List[str]] | None = None
+) -> List[List[str]] | None:
+    """Write notifications for unreachable citation sources.
+
+    *unreachable* holds the rows of ``unreachable_docs.csv`` if the caller
+    already has them.  Returns the rows written, or ``None`` if there was
+    nothing to notify.
+    """
 
+    src = _rows(out_dir, "unreachable_docs.csv", unreachable)
+    return _stamp_first_column(out_dir, src, "unreachable_notifications.csv", "notified_at")
 
-def escalate_unreachable_docs(out_dir: Path) -> None:
+
+def escalate_unreachable_docs(
+    out_dir: Path, notifications: List[List[str]] | None = None
+) -> List[List[str]] | None:
     """Escalate previously notified unreachable citations."""
 
-    notify_path = out_dir / "unreachable_notifications.csv"
-    if not notify_path.exists():
-        return
-    with notify_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    escalate_path = out_dir / "unreachable_escalations.csv"
-    now = datetime.now(timezone.utc).isoformat()
-    with escalate_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["citation_url", "escalated_at"])
-        for row in rows[1:]:
-            writer.writerow([row[0], now])
-
-
-def summarize_escalations(out_dir: Path) -> None:
-    """Summarize citation status in a weekly report."""
-
-    escalate_path = out_dir / "unreachable_escalations.csv"
-    notify_path = out_dir / "unreachable_notifications.csv"
-    unreachable_path = out_dir / "unreachable_docs.csv"
-
-    escalated = 0
-    if escalate_path.exists():
-        with escalate_path.open("r", encoding="utf-8") as f:
-            rows = list(csv.reader(f))
-        escalated = len(rows) - 1 if len(rows) > 1 else 0
-
-    notified = 0
-    if notify_path.exists():
-        with notify_path.open("r", encoding="utf-8") as f:
-            rows = list(csv.reader(f))
-        notified = len(rows) - 1 if len(rows) > 1 else 0
-
-    unreachable = 0
-    if unreachable_path.exists():
-        with unreachable_path.open("r", encoding="utf-8") as f:
-            rows = list(csv.reader(f))
-        unreachable = len(rows) - 1 if len(rows) > 1 else 0
-
-    weekly_path = out_dir / "weekly_report.csv"
+    src = _rows(out_dir, "unreachable_notifications.csv", notifications)
+    return _stamp_first_column(out_dir, src, "unreachable_escalations.csv", "escalated_at")
+
+
+def summarize_escalations(
+    out_dir: Path,
+    unreachable_docs: List[List[str]] | None = None,
+    notifications: List[List[str]] | None = None,
+    escalations: List[List[str]] | None = None,
+    previous: List[List[str]] | None = None,
+) -> List[List[str]]:
+    """Summarize citation status for the weekly report.
+
+    The optional arguments hold the rows of ``unreachable_docs.csv``,
+    ``unreachable_notifications.csv``, ``unreachable_escalations.csv`` and the
+    previous ``weekly_report.csv``; missing ones are read from *out_dir*.
+    Returns the rows written to ``weekly_report.csv``.
+    """
+
+    escalated = max(len(_rows(out_dir, "unreachable_escalations.csv", escalations)) - 1, 0)
+    notified = max(len(_rows(out_dir, "unreachable_notifications.csv", notifications)) - 1, 0)
+    unreachable = max(len(_rows(out_dir, "unreachable_docs.csv", unreachable_docs)) - 1, 0)
+
     prev_escalated = 0
     prev_notified = 0
     prev_unreachable = 0
-    if weekly_path.exists():
-        with weekly_path.open("r", encoding="utf-8") as f:
-            rows = list(csv.reader(f))
+    rows = _rows(out_dir, "weekly_report.csv", previous)
+    if rows:
         for metric, value in rows[1:]:
             if metric == "escalated_citations":
                 prev_escalated = int(value)
@@ -270,441 +350,788 @@ def summarize_escalations(out_dir: Path) -> None:
                 prev_notified = int(value)
             elif metric == "unreachable_citations":
                 prev_unreachable = int(value)
-    trend_escalated = escalated - prev_escalated
-    trend_notified = notified - prev_notified
-    trend_unreachable = unreachable - prev_unreachable
-    with weekly_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["metric", "value"])
-        writer.writerow(["escalated_citations", str(escalated)])
-        writer.writerow(["notified_citations", str(notified)])
-        writer.writerow(["escalated_citations_trend", str(trend_escalated)])
-        writer.writerow(["notified_citations_trend", str(trend_notified)])
-        writer.writerow(["unreachable_citations", str(unreachable)])
-        writer.writerow(["unreachable_citations_trend", str(trend_unreachable)])
-    html_path = out_dir / "weekly_report.html"
-    with html_path.open("w", encoding="utf-8") as f:
-        f.write("<html><body>\n")
-        f.write("<h1>Weekly Citation Report</h1>\n")
-        f.write("<table><tr><th>metric</th><th>value</th></tr>\n")
-        f.write(f"<tr><td>escalated_citations</td><td>{escalated}</td></tr>\n")
-        f.write(f"<tr><td>notified_citations</td><td>{notified}</td></tr>\n")
-        f.write(f"<tr><td>unreachable_citations</td><td>{unreachable}</td></tr>\n")
-        f.write("</table>\n<h2>Trends</h2>\n")
-        for name, val in [
-            ("escalated_citations_trend", trend_escalated),
-            ("notified_citations_trend", trend_notified),
-            ("unreachable_citations_trend", trend_unreachable),
-        ]:
-            bar = "█" * max(val, 0)
-            f.write(f"<div>{name}: {val:+d} {bar}</div>\n")
-        f.write("</body></html>\n")
-
-    history_path = out_dir / "weekly_report_history.csv"
-    history_exists = history_path.exists()
-    with history_path.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not history_exists:
-            writer.writerow(
-                [
-                    "ts",
-                    "escalated_citations",
-                    "notified_citations",
-                    "escalated_citations_trend",
-                    "notified_citations_trend",
-                    "unreachable_citations",
-                    "unreachable_citations_trend",
-                ]
-            )
-        writer.writerow(
-            [
-                datetime.now(timezone.utc).isoformat(),
-                str(escalated),
-                str(notified),
-                str(trend_escalated),
-                str(trend_notified),
-                str(unreachable),
-                str(trend_unreachable),
-            ]
-        )
+    return _write_rows(
+        out_dir / "weekly_report.csv",
+        [
+            ["metric", "value"],
+            ["escalated_citations", str(escalated)],
+            ["notified_citations", str(notified)],
+            ["escalated_citations_trend", str(escalated - prev_escalated)],
+            ["notified_citations_trend", str(notified - prev_notified)],
+            ["unreachable_citations", str(unreachable)],
+            ["unreachable_citations_trend", str(unreachable - prev_unreachable)],
+        ],
+    )
 
-    analyze_trend_history(out_dir)
 
-    analysis_path = out_dir / "weekly_report_analysis.html"
-    report_path = out_dir / "weekly_report.html"
-    if analysis_path.exists() and report_path.exists():
-        analysis_html = analysis_path.read_text(encoding="utf-8")
-        start = analysis_html.find("<body>")
-        end = analysis_html.rfind("</body>")
-        if start != -1 and end != -1:
-            snippet = analysis_html[start + len("<body>") : end]
-            content = report_path.read_text(encoding="utf-8")
-            insert = content.rfind("</body>")
-            if insert != -1:
-                content = (
-                    content[:insert]
-                    + "<h2>Trend Analysis</h2>\n"
-                    + snippet
-                    + content[insert:]
-                )
-                report_path.write_text(content, encoding="utf-8")
-
-
-
-def analyze_trend_history(out_dir: Path) -> None:
-    """Analyze weekly report history for average trend patterns."""
-
-    history_path = out_dir / "weekly_report_history.csv"
-    if not history_path.exists():
-        return
-    with history_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    es = [int(r[3]) for r in rows[1:]]
-    no = [int(r[4]) for r in rows[1:]]
-    un = [int(r[6]) for r in rows[1:]]
-    n = len(es)
-    avg_es = sum(es) / n
-    avg_no = sum(no) / n
-    avg_un = sum(un) / n
-
-    analysis_path = out_dir / "weekly_report_analysis.csv"
-    with analysis_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["metric", "avg_trend"])
-        writer.writerow(["escalated_citations_trend_avg", f"{avg_es:.2f}"])
-        writer.writerow(["notified_citations_trend_avg", f"{avg_no:.2f}"])
-        writer.writerow(["unreachable_citations_trend_avg", f"{avg_un:.2f}"])
-
-    html_path = out_dir / "weekly_report_analysis.html"
-    with html_path.open("w", encoding="utf-8") as f:
-        f.write("<html><body>\n<h1>Weekly Trend Analysis</h1>\n")
-        for name, val in [
-            ("escalated_citations_trend_avg", avg_es),
-            ("notified_citations_trend_avg", avg_no),
-            ("unreachable_citations_trend_avg", avg_un),
-        ]:
-            bar = "█" * max(int(round(val)), 0)
-            f.write(f"<div>{name}: {val:.2f} {bar}</div>\n")
-        f.write("</body></html>\n")
+def record_weekly_history(
+    out_dir: Path, weekly: List[List[str]] | None = None
+) -> history.HistoryStats:
+    """Append this run's ``weekly_report.csv`` values to the weekly history.
+
+    Returns the running statistics of the history.
+    """
+
+    values = dict(_rows(out_dir, "weekly_report.csv", weekly)[1:])
+    return history.append_row(
+        out_dir / "weekly_report_history.csv",
+        WEEKLY_HISTORY_HEADER,
+        [
+            datetime.now(timezone.utc).isoformat(),
+            *(values.get(column, "0") for column in WEEKLY_HISTORY_HEADER[1:]),
+        ],
+        WEEKLY_TREND_COLUMNS,
+    )
+
+
+def _trend_analysis(averages: List[float]) -> HtmlReport:
+    analysis = HtmlReport("Weekly Trend Analysis")
+    analysis.add_section(
+        "",
+        [
+            f"<div>{column}_avg: {val:.2f} {'█' * max(int(round(val)), 0)}</div>"
+            for column, val in zip(WEEKLY_TREND_COLUMNS, averages)
+        ],
+    )
+    return analysis
+
+
+def analyze_trend_history(
+    out_dir: Path, averages: List[float] | None = None
+) -> List[List[str]] | None:
+    """Analyze weekly report history for average trend patterns.
+
+    *averages* holds the mean of each of :data:`WEEKLY_TREND_COLUMNS`, as
+    returned with the history by :func:`record_weekly_history`; without it
+    they come from the running totals kept next to the history.  Writes
+    ``weekly_report_analysis.html`` and returns the rows written to
+    ``weekly_report_analysis.csv``.
+    """
+
+    if averages is None:
+        history_path = out_dir / "weekly_report_history.csv"
+        if not history_path.exists():
+            return None
+        stats = history.load_stats(history_path, WEEKLY_TREND_COLUMNS)
+        if not stats.count:
+            return None
+        averages = [stats.mean(c) for c in WEEKLY_TREND_COLUMNS]
+
+    rows = _write_rows(
+        out_dir / "weekly_report_analysis.csv",
+        [
+            ["metric", "avg_trend"],
+            *([f"{c}_avg", f"{v:.2f}"] for c, v in zip(WEEKLY_TREND_COLUMNS, averages)),
+        ],
+    )
+    _trend_analysis(averages).write(out_dir / "weekly_report_analysis.html")
+    return rows
 
 
 def queue_weekly_report(out_dir: Path) -> None:
-    """Queue generated weekly report for distribution."""
+    """Queue the weekly report for distribution.
+
+    Only the path is queued; the report is rendered there at the end of the
+    run, once the delivery success trends are part of it.
+    """
 
     report_path = out_dir / "weekly_report.html"
-    if not report_path.exists():
-        return
-    queue_path = out_dir / "distribution_queue.csv"
     now = datetime.now(timezone.utc).isoformat()
-    exists = queue_path.exists()
-    with queue_path.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not exists:
-            writer.writerow(["file_path", "queued_at"])
-        writer.writerow([str(report_path), now])
-
-
-def schedule_distribution(out_dir: Path) -> None:
-    """Schedule queued reports for delivery."""
-
-    queue_path = out_dir / "distribution_queue.csv"
-    if not queue_path.exists():
-        return
-    with queue_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    schedule_path = out_dir / "distribution_schedule.csv"
-    now = datetime.now(timezone.utc).isoformat()
-    with schedule_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["file_path", "scheduled_for"])
-        for row in rows[1:]:
-            writer.writerow([row[0], now])
-
-
-def deliver_scheduled_reports(out_dir: Path) -> None:
-    """Deliver scheduled reports and log delivery time."""
-
-    schedule_path = out_dir / "distribution_schedule.csv"
-    if not schedule_path.exists():
-        return
-    with schedule_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    delivery_path = out_dir / "distribution_delivery.csv"
-    now = datetime.now(timezone.utc).isoformat()
-    with delivery_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["file_path", "delivered_at"])
-        for row in rows[1:]:
-            writer.writerow([row[0], now])
-
-
-def record_delivery_receipts(out_dir: Path) -> None:
-    """Record a receipt for each delivered report."""
-
-    delivery_path = out_dir / "distribution_delivery.csv"
-    if not delivery_path.exists():
-        return
-    with delivery_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    receipts_path = out_dir / "distribution_receipts.csv"
-    now = datetime.now(timezone.utc).isoformat()
-    with receipts_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["file_path", "receipt_at"])
-        for row in rows[1:]:
-            writer.writerow([row[0], now])
-
-
-def visualize_delivery_success_trends(out_dir: Path) -> None:
-    """Render a simple HTML chart of success-rate history."""
-
-    history_path = out_dir / "distribution_success_history.csv"
-    if not history_path.exists():
-        return
-    with history_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) <= 1:
-        return
-    rates = [float(r[3]) for r in rows[1:]]
-    html_path = out_dir / "distribution_success_trends.html"
-    with html_path.open("w", encoding="utf-8") as f:
-        f.write("<html><body>\n<h1>Delivery Success Trends</h1>\n")
-        for rate in rates:
-            bar = "█" * int(round(rate * 10))
-            f.write(f"<div>{rate:.2f} {bar}</div>\n")
-        f.write("</body></html>\n")
-
-
-def analyze_delivery_success(out_dir: Path) -> None:
-    """Summarize delivery success rates."""
-
-    schedule_path = out_dir / "distribution_schedule.csv"
-    receipts_path = out_dir / "distribution_receipts.csv"
-    success_path = out_dir / "distribution_success.csv"
-    history_path = out_dir / "distribution_success_history.csv"
-    summary_path = out_dir / "distribution_success_summary.csv"
-    scheduled = 0
-    delivered = 0
-    if schedule_path.exists():
-        with schedule_path.open("r", encoding="utf-8") as f:
-            scheduled = max(len(list(csv.reader(f))) - 1, 0)
-    if receipts_path.exists():
-        with receipts_path.open("r", encoding="utf-8") as f:
-            delivered = max(len(list(csv.reader(f))) - 1, 0)
+    queue = distribution_log(out_dir, "distribution_queue.csv")
+    queue.append([[str(report_path), now]])
+
+
+def _forward(
+    out_dir: Path, source: str, consumer: str, target: str, batch_size: int
+) -> int:
+    """Stamp new records of log *source* with the current time into *target*."""
+
+    src = distribution_log(out_dir, source)
+    dst = distribution_log(out_dir, target)
+
+    def process(rows: List[List[str]]) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        dst.append([[row[0], now] for row in rows])
+
+    return drain(src, consumer, process, batch_size)
+
+
+def schedule_distribution(
+    out_dir: Path, batch_size: int = DISTRIBUTION_BATCH_SIZE
+) -> int:
+    """Schedule newly queued reports for delivery.
+
+    Returns the number of reports scheduled.
+    """
+
+    return _forward(
+        out_dir,
+        "distribution_queue.csv",
+        "schedule",
+        "distribution_schedule.csv",
+        batch_size,
+    )
+
+
+def deliver_scheduled_reports(
+    out_dir: Path, workers: int = 1, batch_size: int = DISTRIBUTION_BATCH_SIZE
+) -> int:
+    """Deliver newly scheduled reports and log delivery time.
+
+    Up to *workers* threads claim batches from the schedule; other processes
+    may deliver from the same schedule concurrently.  A batch whose worker dies
+    is delivered again once its lease expires.  Returns the number of
+    deliveries made by this call.
+    """
+
+    args = (
+        out_dir,
+        "distribution_schedule.csv",
+        "deliver",
+        "distribution_delivery.csv",
+        batch_size,
+    )
+    if workers <= 1:
+        return _forward(*args)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_forward, *args) for _ in range(workers)]
+        return sum(f.result() for f in futures)
+
+
+def record_delivery_receipts(
+    out_dir: Path, batch_size: int = DISTRIBUTION_BATCH_SIZE
+) -> int:
+    """Record a receipt for each newly delivered report.
+
+    Returns the number of receipts recorded.
+    """
+
+    return _forward(
+        out_dir,
+        "distribution_delivery.csv",
+        "receipts",
+        "distribution_receipts.csv",
+        batch_size,
+    )
+
+
+def _delivery_trends(rates: List[float]) -> HtmlReport:
+    trends = HtmlReport("Delivery Success Trends")
+    trends.add_section(
+        "", [f"<div>{rate:.2f} {'█' * int(round(rate * 10))}</div>" for rate in rates]
+    )
+    return trends
+
+
+def visualize_delivery_success_trends(
+    out_dir: Path, rates: List[float] | None = None
+) -> str | None:
+    """Render a simple HTML chart of success-rate history.
+
+    The chart shows the most recent rates kept with the history, or *rates*
+    if the caller already has them.  Returns the HTML written to
+    ``distribution_success_trends.html``.
+    """
+
+    if rates is None:
+        history_path = out_dir / "distribution_success_history.csv"
+        if not history_path.exists():
+            return None
+        rates = history.load_stats(history_path, ["success_rate"]).recent_values(
+            "success_rate"
+        )
+    if not rates:
+        return None
+    return _delivery_trends(rates).write(out_dir / "distribution_success_trends.html")
+
+
+def analyze_delivery_success(out_dir: Path) -> history.HistoryStats:
+    """Summarize delivery success rates.
+
+    Counts the reports scheduled and the receipts recorded since the previous
+    analysis, writes them to ``distribution_success.csv`` and appends them to
+    the success history.  Returns the running statistics of the history.
+    """
+
+    schedule = distribution_log(out_dir, "distribution_schedule.csv")
+    receipts = distribution_log(out_dir, "distribution_receipts.csv")
+    scheduled = drain(schedule, "success", lambda rows: None)
+    delivered = drain(receipts, "success", lambda rows: None)
     rate = delivered / scheduled if scheduled else 0.0
-    with success_path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["scheduled", "delivered", "success_rate"])
-        writer.writerow([str(scheduled), str(delivered), f"{rate:.2f}"])
-
-    history_exists = history_path.exists()
-    with history_path.open("a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if not history_exists:
-            writer.writerow(["ts", "scheduled", "delivered", "success_rate"])
-        writer.writerow(
-            [
-                datetime.now(timezone.utc).isoformat(),
-                str(scheduled),
-                str(delivered),
-                f"{rate:.2f}",
-            ]
+    _write_rows(
+        out_dir / "distribution_success.csv",
+        [
+            ["scheduled", "delivered", "success_rate"],
+            [str(scheduled), str(delivered), f"{rate:.2f}"],
+        ],
+    )
+
+    stats = history.append_row(
+        out_dir / "distribution_success_history.csv",
+        ["ts", "scheduled", "delivered", "success_rate"],
+        [
+            datetime.now(timezone.utc).isoformat(),
+            str(scheduled),
+            str(delivered),
+            f"{rate:.2f}",
+        ],
+        ["success_rate"],
+    )
+    _write_rows(
+        out_dir / "distribution_success_summary.csv",
+        [["avg_success_rate"], [f"{stats.mean('success_rate'):.2f}"]],
+    )
+    return stats
+
+
+def weekly_report_model(
+    weekly: List[List[str]],
+    averages: List[float] | None = None,
+    rates: List[float] | None = None,
+) -> HtmlReport:
+    """Assemble the weekly report from its parts.
+
+    *weekly* holds the rows of ``weekly_report.csv``, *averages* the trend
+    averages of the weekly history and *rates* the recent delivery success
+    rates.
+    """
+
+    values = {metric: int(value) for metric, value in weekly[1:]}
+    report = HtmlReport(WEEKLY_REPORT_TITLE)
+    report.add_section(
+        "",
+        [
+            "<table><tr><th>metric</th><th>value</th></tr>",
+            *(
+                f"<tr><td>{name}</td><td>{values.get(name, 0)}</td></tr>"
+                for name in [
+                    "escalated_citations",
+                    "notified_citations",
+                    "unreachable_citations",
+                ]
+            ),
+            "</table>",
+        ],
+    )
+    report.add_section(
+        "Trends",
+        [
+            f"<div>{name}: {val:+d} {'█' * max(val, 0)}</div>"
+            for name, val in ((c, values.get(c, 0)) for c in WEEKLY_TREND_COLUMNS)
+        ],
+    )
+    if averages:
+        report.add_section(
+            "Trend Analysis", [_trend_analysis(averages).content().rstrip("\n")]
         )
-    with history_path.open("r", encoding="utf-8") as f:
-        rows = list(csv.reader(f))
-    if len(rows) > 1:
-        rates = [float(r[3]) for r in rows[1:]]
-        avg = sum(rates) / len(rates)
-        with summary_path.open("w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["avg_success_rate"])
-            writer.writerow([f"{avg:.2f}"])
+    if rates:
+        report.add_section(
+            "Delivery Success Trends", [_delivery_trends(rates).content().rstrip("\n")]
+        )
+    return report
+
 
-    visualize_delivery_success_trends(out_dir)
+def render_weekly_report(
+    out_dir: Path,
+    weekly: List[List[str]] | None = None,
+    averages: List[float] | None = None,
+    rates: List[float] | None = None,
+) -> str:
+    """Write the weekly report to ``weekly_report.html`` and return the HTML.
 
+    See :func:`weekly_report_model` for the arguments; ``weekly_report.csv``
+    is read from *out_dir* if *weekly* is not given.
+    """
 
-def integrate_delivery_success_trends(out_dir: Path) -> None:
-    """Embed delivery success trend charts into the weekly report."""
+    report = weekly_report_model(
+        _rows(out_dir, "weekly_report.csv", weekly), averages, rates
+    )
+    return report.write(out_dir / "weekly_report.html")
 
-    report_path = out_dir / "weekly_report.html"
-    trends_path = out_dir / "distribution_success_trends.html"
-    if not (report_path.exists() and trends_path.exists()):
-        return
-    content = report_path.read_text(encoding="utf-8")
-    if "<h2>Delivery Success Trends</h2>" in content:
-        return
-    trends_html = trends_path.read_text(encoding="utf-8")
-    start = trends_html.find("<body>")
-    end = trends_html.rfind("</body>")
-    if start == -1 or end == -1:
-        return
-    snippet = trends_html[start + len("<body>") : end].strip()
-    snippet = snippet.replace("<h1>Delivery Success Trends</h1>", "").strip()
-    if not snippet:
-        return
-    insert = content.rfind("</body>")
-    if insert == -1:
-        return
-    addition = "<h2>Delivery Success Trends</h2>\n" + snippet + "\n"
-    updated = content[:insert] + addition + content[insert:]
-    report_path.write_text(updated, encoding="utf-8")
-
-
-def metrics_from_canonical(path: Path) -> Dict[str, Any]:
+
+def metrics_from_canonical(
+    path: Path, extra: Iterable[Aggregator] = (), cache: ResultCache | None = None
+) -> Dict[str, Any]:
     """Compute simple metrics from a canonical JSONL file.
 
     The function returns a mapping with event ``count``, average ``cadence`` in
     the timestamp sequence (seconds between events), and a boolean flag
     ``non_decreasing_playhead`` indicating whether the ``playhead`` parameter is
     monotonic.
+
+    The file is read once and memory use does not grow with its size.  Any
+    *extra* aggregators are fed the same envelopes and their results are merged
+    into the returned mapping.  Without extra aggregators, results are reused
+    from *cache* while the file and the code are unchanged.
+    """
+
+    extra = list(extra)
+    if cache is not None and not extra:
+        code = [sys.modules[__name__], *code_modules(CadenceMetrics)]
+        key = cache.key("metrics_from_canonical", [path], code)
+        return cache.get_or_compute(key, lambda: metrics_from_canonical(path))
+    cadence = CadenceMetrics()
+    feed(iter_canonical(path), [cadence, *extra])
+    metrics = cadence.result()
+    for agg in extra:
+        metrics.update(agg.result())
+    return metrics
+
+
+# Baseline CSVs keyed by file name.  Each entry holds the CSV header and an
+# optional factory for the aggregator that produces its rows; every registered
+# aggregator is fed by the same scan of the canonical file.
+BASELINE_REPORTS: Dict[str, Tuple[List[str], Callable[[str], Aggregator] | None]] = {}
+
+
+def register_baseline_report(
+    name: str,
+    header: List[str],
+    factory: Callable[[str], Aggregator] | None = None,
+) -> None:
+    """Register a CSV written by :func:`write_baseline_csvs`.
+
+    *factory* is called with the canonical file name, used as the default
+    session id, and builds an :class:`~goblean.aggregate.Aggregator` whose
+    ``result()["rows"]`` become the CSV body.  Reports without a factory are
+    written header-only so later steps can append to them.
+    """
+
+    BASELINE_REPORTS[name] = (header, factory)
+
+
+class MetricsDaily(Aggregator):
+    """``metrics_daily.csv`` rows grouped by date, platform, SDK and version.
+
+    Every envelope counts towards the group of its own ``ts`` date and
+    fingerprint.  Distinct sessions are counted per group with
+    :class:`~goblean.aggregate.DistinctCount`, so memory is bounded by the
+    number of groups, not sessions or events; groups with more than a few
+    hundred sessions report an estimate.
+
+    *coverage* and *violations* hold the rows of ``coverage.csv`` and
+    ``violations.csv``, header first.  With them the ``coverage``, ``fp_rate``
+    and ``violations`` columns are filled in as
+    :func:`goblean.duckdb_report.metrics_daily_sql` does; only the sessions
+    they name are tracked individually.  Without them those columns are zero,
+    as the SQL gives for header-only files.
+    """
+
+    depends_on = ("goblean.fingerprint", "goblean.fingerprint.platform_version", "goblean.sessions")
+
+    def __init__(
+        self,
+        source: str = "",
+        coverage: List[List[str]] | None = None,
+        violations: List[List[str]] | None = None,
+    ) -> None:
+        self.source = source
+        self.groups: Dict[Tuple[str, str, str, str], DistinctCount] = {}
+        self._dates: Dict[int, str] = {}
+        # (session id, platform, sdk, version_guess, label) per coverage row.
+        self.labels: List[Tuple[str, ...]] = []
+        if coverage:
+            index = {name: i for i, name in enumerate(coverage[0])}
+            columns = ["session_id", "platform", "sdk", "version_guess", "label"]
+            self.labels = [tuple(row[index[c]] for c in columns) for row in coverage[1:]]
+        # Violation rows per session.
+        self.violations: Counter[str] = Counter()
+        if violations:
+            column = violations[0].index("session_id")
+            self.violations.update(row[column] for row in violations[1:] if row[column])
+        # Dates of the labelled sessions, and the violating sessions per group.
+        self.session_dates: Dict[str, set[str]] = {sid: set() for sid, *_ in self.labels}
+        self.violating: Dict[Tuple[str, str, str, str], set[str]] = {}
+
+    def _date(self, ts: float | None) -> str:
+        if ts is None:
+            return ""
+        try:
+            day = int(ts // 86400)
+        except (OverflowError, ValueError):
+            return ""
+        date_str = self._dates.get(day)
+        if date_str is None:
+            try:
+                date_str = datetime.fromtimestamp(day * 86400, tz=timezone.utc).date().isoformat()
+            except (OverflowError, OSError, ValueError):
+                date_str = ""
+            self._dates[day] = date_str
+        return date_str
+
+    def update(self, env: Dict[str, Any]) -> None:
+        platform, sdk, ver = fingerprint(env)
+        version = ".".join(map(str, ver)) if ver else "0.0.0-virtual"
+        date_str = self._date(as_float(env.get("params", {}).get("ts")))
+        key = (date_str, platform, sdk, version)
+        sessions = self.groups.get(key)
+        if sessions is None:
+            sessions = self.groups[key] = DistinctCount()
+        sid = session_id(env, self.source)
+        sessions.add(sid)
+        dates = self.session_dates.get(sid)
+        if dates is not None:
+            dates.add(date_str)
+        if sid in self.violations:
+            self.violating.setdefault(key, set()).add(sid)
+
+    def _rates(self) -> Dict[Tuple[str, str, str, str], Tuple[float, float]]:
+        """Return ``(coverage, fp_rate)`` per date and labelled fingerprint."""
+
+        seen: Dict[Tuple[str, str, str, str], Tuple[set, set, set]] = {}
+        for sid, platform, sdk, version, label in self.labels:
+            labelled = label not in ("", "ABSTAIN")
+            for date_str in self.session_dates[sid]:
+                every, covered, false_pass = seen.setdefault(
+                    (date_str, platform, sdk, version), (set(), set(), set())
+                )
+                every.add(sid)
+                if labelled:
+                    covered.add(sid)
+                if label == "PASS" and sid in self.violations:
+                    false_pass.add(sid)
+        return {
+            key: (
+                len(covered) / len(every),
+                len(false_pass) / len(covered) if covered else 0.0,
+            )
+            for key, (every, covered, false_pass) in seen.items()
+        }
+
+    def result(self) -> Dict[str, Any]:
+        rates = self._rates()
+        rows = []
+        for key, sessions in sorted(self.groups.items()):
+            date_str, platform, sdk, version = key
+            coverage, fp_rate = rates.get(key, (0.0, 0.0))
+            violations = sum(self.violations[sid] for sid in self.violating.get(key, ()))
+            rows.append(
+                [date_str,platform,sdk,version,"0",coverage,fp_rate,0.0,0.0,violations,len(sessions),""]
+            )
+        return {"rows": rows}
+
+
+def write_partitioned_csv(
+    dest: Path, header: List[str], rows: Iterable[List[Any]], column: str = "date"
+) -> None:
+    """Write *rows* under ``dest/<column>=<value>/`` directories.
+
+    The partition column is dropped from the files themselves, following the
+    Hive layout understood by DuckDB and Polars so readers can prune partitions
+    by directory name.  Rows without a value go to ``<column>=unknown``.
+
+    The partitions are written to a sibling directory that then replaces
+    *dest*, so partitions of earlier runs that have no rows now are removed.
+    """
+
+    index = header.index(column)
+    part_header = header[:index] + header[index + 1 :]
+    partitions: Dict[str, List[List[Any]]] = {}
+    for row in rows:
+        partitions.setdefault(str(row[index]) or "unknown", []).append(
+            row[:index] + row[index + 1 :]
+        )
+    tmp = dest.with_name(dest.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for value, part_rows in partitions.items():
+        part_dir = tmp / f"{column}={value}"
+        part_dir.mkdir()
+        with (part_dir / f"{dest.name}.csv").open("w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(part_header)
+            writer.writerows(part_rows)
+    shutil.rmtree(dest, ignore_errors=True)
+    tmp.rename(dest)
+
+
+register_baseline_report(
+    "metrics_daily.csv",
+    ["date","platform","sdk","version_scope","batch","coverage","fp_rate","tp_rate","fn_rate","violations","total_sessions","notes"],
+    MetricsDaily,
+)
+register_baseline_report(
+    "violations.csv",
+    [
+        "session_id",
+        "event_id",
+        "platform",
+        "sdk",
+        "version_guess",
+        "rule_id",
+        "fail_code",
+        "severity",
+        "ts",
+    ],
+)
+register_baseline_report(
+    "coverage.csv",
+    [
+        "session_id",
+        "platform",
+        "sdk",
+        "version_guess",
+        "label",
+        "confidence",
+        "source_lf_ids",
+    ],
+)
+register_baseline_report(
+    "dictionary.csv",
+    [
+        "param",
+        "aliases",
+        "type",
+        "unit",
+        "min",
+        "max",
+        "mean",
+        "stdev",
+        "stability",
+        "presence_map",
+        "evidence_examples",
+    ],
+)
+# Written header-only here; goblean.cluster fills it in.
+register_baseline_report("clusters.csv", CLUSTERS_HEADER)
+register_baseline_report(
+    "sessions_index.csv",
+    [
+        "session_id",
+        "platform",
+        "sdk",
+        "version_guess",
+        "first_ts",
+        "last_ts",
+        "event_count",
+        "file_source",
+    ],
+)
+
+
+def _step(
+    func: Callable[..., Any],
+    inputs: List[str],
+    outputs: List[str],
+    cacheable: bool = True,
+) -> Step:
+    """Wrap a report function taking ``(out_dir, *inputs)`` as a :class:`Step`.
+
+    The function's return value becomes its first output.
+    """
+
+    def run(out_dir: Path, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {outputs[0]: func(out_dir, *(data[name] for name in inputs))}
+
+    return Step(func.__name__, run, inputs, outputs, cacheable)
+
+
+def _log_step(
+    func: Callable[[Path], Any], inputs: List[str], outputs: List[str]
+) -> Step:
+    """Wrap a stage consuming distribution logs by offset as a :class:`Step`.
+
+    The stage tracks its own position, so the logs are not passed in and the
+    step always runs.
+    """
+
+    def run(out_dir: Path, data: Mapping[str, Any]) -> None:
+        func(out_dir)
+
+    return Step(func.__name__, run, inputs, outputs, cacheable=False)
+
+
+def _rules_index_step(out_dir: Path, data: Dict[str, Any]) -> Dict[str, Any]:
+    rules_index, unreachable = populate_rules_index(out_dir)
+    return {"rules_index.csv": rules_index, "unreachable_docs.csv": unreachable}
+
+
+def _weekly_history_step(out_dir: Path, data: Mapping[str, Any]) -> Dict[str, Any]:
+    stats = record_weekly_history(out_dir, data["weekly_report.csv"])
+    return {"weekly_trend_averages": [stats.mean(c) for c in WEEKLY_TREND_COLUMNS]}
+
+
+def _delivery_success_step(out_dir: Path, data: Mapping[str, Any]) -> Dict[str, Any]:
+    stats = analyze_delivery_success(out_dir)
+    return {"delivery_success_rates": stats.recent_values("success_rate")}
+
+
+def report_steps() -> List[Step]:
+    """Return the report steps run after the baseline CSVs, in sequential order.
+
+    The rules index depends on spec files and the doc cache, the history steps
+    append to history files, and the distribution stages keep offsets into
+    their logs, so none of those are skipped when their inputs are unchanged.
+    The history steps hand their running statistics to the steps that derive
+    reports from them (``weekly_trend_averages`` and
+    ``delivery_success_rates``); those steps, like the rest, are skipped while
+    their inputs are unchanged.  The citation steps and the distribution
+    stages are independent and run concurrently.  The path of the weekly
+    report is queued up front and ``weekly_report.html`` is rendered once, at
+    the end, with the delivery success trends of the run.
+    """
+
+    return [
+        Step(
+            "populate_rules_index",
+            _rules_index_step,
+            outputs=["rules_index.csv", "unreachable_docs.csv"],
+            cacheable=False,
+        ),
+        _step(
+            notify_unreachable_docs,
+            ["unreachable_docs.csv"],
+            ["unreachable_notifications.csv"],
+        ),
+        _step(
+            escalate_unreachable_docs,
+            ["unreachable_notifications.csv"],
+            ["unreachable_escalations.csv"],
+        ),
+        _step(
+            summarize_escalations,
+            [
+                "unreachable_docs.csv",
+                "unreachable_notifications.csv",
+                "unreachable_escalations.csv",
+                "weekly_report.csv",
+            ],
+            ["weekly_report.csv"],
+        ),
+        Step(
+            "record_weekly_history",
+            _weekly_history_step,
+            ["weekly_report.csv"],
+            ["weekly_report_history.csv", "weekly_trend_averages"],
+            cacheable=False,
+        ),
+        _step(
+            analyze_trend_history,
+            ["weekly_trend_averages"],
+            ["weekly_report_analysis.csv", "weekly_report_analysis.html"],
+        ),
+        _log_step(queue_weekly_report, [], ["distribution_queue.csv"]),
+        _log_step(
+            schedule_distribution, ["distribution_queue.csv"], ["distribution_schedule.csv"]
+        ),
+        _log_step(
+            deliver_scheduled_reports,
+            ["distribution_schedule.csv"],
+            ["distribution_delivery.csv"],
+        ),
+        _log_step(
+            record_delivery_receipts,
+            ["distribution_delivery.csv"],
+            ["distribution_receipts.csv"],
+        ),
+        Step(
+            "analyze_delivery_success",
+            _delivery_success_step,
+            ["distribution_schedule.csv", "distribution_receipts.csv"],
+            [
+                "distribution_success.csv",
+                "distribution_success_history.csv",
+                "distribution_success_summary.csv",
+                "delivery_success_rates",
+            ],
+            cacheable=False,
+        ),
+        _step(
+            visualize_delivery_success_trends,
+            ["delivery_success_rates"],
+            ["distribution_success_trends.html"],
+        ),
+        _step(
+            render_weekly_report,
+            ["weekly_report.csv", "weekly_trend_averages", "delivery_success_rates"],
+            ["weekly_report.html"],
+        ),
+    ]
+
+
+def baseline_aggregators(source: str) -> Dict[str, Aggregator]:
+    """Return a fresh aggregator for every report in :data:`BASELINE_REPORTS`.
+
+    *source* is the default session id for envelopes without one.
     """
 
-    count = 0
-    ts_list: list[float] = []
-    playheads: list[float] = []
-    with path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            env = json.loads(line)
-            count += 1
-            params = env.get("params", {})
-            ts = params.get("ts")
-            if ts is not None:
-                try:
-                    ts_list.append(float(ts))
-                except (TypeError, ValueError):
-                    pass
-            ph = params.get("playhead")
-            if ph is not None:
-                try:
-                    playheads.append(float(ph))
-                except (TypeError, ValueError):
-                    pass
-    cadence = 0.0
-    if len(ts_list) > 1:
-        cadence = (ts_list[-1] - ts_list[0]) / (len(ts_list) - 1)
-    non_decreasing_playhead = (
-        all(later >= earlier for earlier, later in zip(playheads, playheads[1:]))
-        if playheads
-        else True
-    )
-    first_ts = ts_list[0] if ts_list else None
     return {
-        "count": count,
-        "cadence": cadence,
-        "non_decreasing_playhead": non_decreasing_playhead,
-        "first_ts": first_ts,
+        name: factory(source)
+        for name, (_, factory) in BASELINE_REPORTS.items()
+        if factory is not None
+    }
+
+
+def _scan_canonical(
+    canonical: Path, cache: ResultCache | None
+) -> Dict[str, Dict[str, Any]]:
+    """Run the metrics and report aggregators over *canonical* in one scan."""
+
+    def scan() -> Dict[str, Dict[str, Any]]:
+        aggregators: Dict[str, Aggregator] = {"metrics": CadenceMetrics()}
+        aggregators.update(baseline_aggregators(canonical.name))
+        return run_aggregators(iter_canonical(canonical), aggregators)
+
+    if cache is None:
+        return scan()
+    factories = {
+        name: factory for name, (_, factory) in BASELINE_REPORTS.items() if factory
     }
+    code = [sys.modules[__name__], *code_modules(CadenceMetrics, *factories.values())]
+    params = {
+        # The file name is part of the results (as the default session id).
+        "source": str(canonical),
+        "reports": {n: f"{f.__module__}.{f.__qualname__}" for n, f in factories.items()},
+    }
+    key = cache.key("baseline_reports", [canonical], code, params)
+    return cache.get_or_compute(key, scan)
 
 
-def write_baseline_csvs(canonical: Path, out_dir: Path) -> None:
+def write_baseline_csvs(
+    canonical: Path,
+    out_dir: Path,
+    partitioned: bool = False,
+    cache: ResultCache | None = None,
+) -> Dict[str, Any]:
     """Write baseline observability CSVs to *out_dir*.
 
-    Only ``metrics_daily.csv`` receives a data row; the rest contain headers
-    only so future steps can append to them.
+    The canonical file is scanned once; that scan feeds the metrics returned to
+    the caller and the aggregator of every report in :data:`BASELINE_REPORTS`.
+    ``metrics_daily.csv`` receives one row per date, platform, SDK and version;
+    the rest contain headers only so future steps can append to them.  With
+    *partitioned* the dated reports are also written as ``date=YYYY-MM-DD/``
+    directories under ``out_dir/<report>/``.  The remaining reports run as
+    :func:`report_steps`, skipping steps whose inputs did not change.  With
+    *cache* the scan results are reused while the file and code are unchanged.
+    """
+
+    results = _scan_canonical(canonical, cache)
+    write_baseline_reports(results, out_dir, partitioned)
+    return results["metrics"]
+
+
+def write_baseline_reports(
+    results: Mapping[str, Dict[str, Any]], out_dir: Path, partitioned: bool = False
+) -> Dict[str, str]:
+    """Write :data:`BASELINE_REPORTS` from aggregator *results* and run the rest.
+
+    *results* maps report names to the ``result()`` of their aggregators;
+    reports without results are written header-only.  Returns the status of
+    every :func:`report_steps` step.
     """
 
-    metrics = metrics_from_canonical(canonical)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    header = ["date","platform","sdk","version_scope","batch","coverage","fp_rate","tp_rate","fn_rate","violations","total_sessions","notes"]
-    date_str = ""
-    if metrics.get("first_ts") is not None:
-        date_str = datetime.fromtimestamp(float(metrics["first_ts"]), tz=timezone.utc).date().isoformat()
-
-    platform = "unknown"
-    sdk = "unknown"
-    version = "0.0.0-virtual"
-    with canonical.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            env = json.loads(line)
-            platform, sdk, ver = fingerprint(env)
-            version = ".".join(map(str, ver)) if ver else "0.0.0-virtual"
-            break
-
-    row = [date_str,platform,sdk,version,"0",0.0,0.0,0.0,0.0,0,1,""]
-    with (out_dir / "metrics_daily.csv").open("w", newline="", encoding="utf-8") as f:
-        csv.writer(f).writerows([header,row])
-
-    other_files: Dict[str, list[str]] = {
-        "violations.csv": [
-            "session_id",
-            "event_id",
-            "platform",
-            "sdk",
-            "version_guess",
-            "rule_id",
-            "fail_code",
-            "severity",
-            "ts",
-        ],
-        "coverage.csv": [
-            "session_id",
-            "platform",
-            "sdk",
-            "version_guess",
-            "label",
-            "confidence",
-            "source_lf_ids",
-        ],
-        "dictionary.csv": [
-            "param",
-            "aliases",
-            "type",
-            "unit",
-            "min",
-            "max",
-            "mean",
-            "stdev",
-            "stability",
-            "presence_map",
-            "evidence_examples",
-        ],
-        "clusters.csv": [
-            "cluster_id",
-            "platform_guess",
-            "sdk_guess",
-            "signature",
-            "representative_sessions",
-            "n",
-            "novelty_score",
-        ],
-        "sessions_index.csv": [
-            "session_id",
-            "platform",
-            "sdk",
-            "version_guess",
-            "first_ts",
-            "last_ts",
-            "event_count",
-            "file_source",
-        ],
-    }
-    for name, head in other_files.items():
+    for name, (header, _) in BASELINE_REPORTS.items():
+        rows = results.get(name, {}).get("rows", [])
         with (out_dir / name).open("w", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(head)
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        if partitioned and rows and "date" in header:
+            write_partitioned_csv(out_dir / Path(name).stem, header, rows)
 
-    populate_rules_index(out_dir)
-    notify_unreachable_docs(out_dir)
-    escalate_unreachable_docs(out_dir)
-    summarize_escalations(out_dir)
-    queue_weekly_report(out_dir)
-    schedule_distribution(out_dir)
-    deliver_scheduled_reports(out_dir)
-    record_delivery_receipts(out_dir)
-    analyze_delivery_success(out_dir)
-    integrate_delivery_success_trends(out_dir)
+    return run_steps(report_steps(), out_dir)
 
 
 def main() -> None:
@@ -713,10 +1140,20 @@ def main() -> None:
     )
     parser.add_argument("path", type=Path, help="Input canonical jsonl")
     parser.add_argument("--out", type=Path, help="Output directory for baseline CSVs", default=None)
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Also write dated reports as date=YYYY-MM-DD/ directories",
+    )
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
     args = parser.parse_args()
-    metrics = metrics_from_canonical(args.path)
-    if args.out:
-        write_baseline_csvs(args.path, args.out)
+    cache = cache_from_args(args)
+    with profile_from_args(args, "report"):
+        if args.out:
+            metrics = write_baseline_csvs(args.path, args.out, args.partitioned, cache)
+        else:
+            metrics = metrics_from_canonical(args.path, cache=cache)
     print(json.dumps(metrics))
 
 
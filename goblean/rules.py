@@ -0,0 +1,121 @@
+"""Rule specs and golden fixture lookup.
+
+Specs are parsed once and cached by file modification time and size, so edits
+are picked up on the next call without re-reading unchanged files.  Fixture
+counts come from a single listing of the tests directory that is reused until
+the directory itself changes.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+_FIXTURE_RE = re.compile(r"^(?P<rule>.+?)__(?P<kind>pass|fail)__.*\.har$")
+
+_lock = threading.Lock()
+_spec_cache: Dict[Path, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_fixture_cache: Dict[Path, Tuple[int, Dict[str, Dict[str, int]]]] = {}
+
+
+# Like git's "racily clean" check: a file modified within this window may
+# change again without its mtime moving on coarse-grained file systems, so it is
+# not cached yet.
+_RACY_NS = 2_000_000_000
+
+
+def _stamp(st: os.stat_result) -> Tuple[int, int]:
+    return st.st_mtime_ns, st.st_size
+
+
+def _settled(mtime_ns: int) -> bool:
+    return time.time_ns() - mtime_ns > _RACY_NS
+
+
+def load_spec(path: Path, st: os.stat_result | None = None) -> Dict[str, Any]:
+    """Return the parsed spec at *path*, re-reading it only if it changed.
+
+    Callers must treat the returned mapping as read-only; it is shared by every
+    caller until the file changes.
+    """
+
+    stamp = _stamp(st or path.stat())
+    key = Path(os.path.abspath(path))
+    with _lock:
+        cached = _spec_cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with path.open("r", encoding="utf-8") as f:
+        spec = json.load(f)
+    if _settled(stamp[0]):
+        with _lock:
+            _spec_cache[key] = (stamp, spec)
+    return spec
+
+
+def load_specs(specs_dir: Path) -> List[Tuple[Path, Dict[str, Any]]]:
+    """Return ``(path, spec)`` for every ``*.yaml`` spec in *specs_dir*.
+
+    Specs are returned in file name order.  Cache entries for specs that have
+    been deleted from *specs_dir* are dropped.
+    """
+
+    if not specs_dir.is_dir():
+        return []
+    entries = []
+    with os.scandir(specs_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".yaml") and entry.is_file():
+                entries.append(entry)
+    entries.sort(key=lambda e: e.name)
+    specs = [(Path(e.path), load_spec(Path(e.path), e.stat())) for e in entries]
+    present = {Path(os.path.abspath(path)) for path, _ in specs}
+    specs_abs = Path(os.path.abspath(specs_dir))
+    with _lock:
+        for key in list(_spec_cache):
+            if key.parent == specs_abs and key not in present:
+                del _spec_cache[key]
+    return specs
+
+
+def fixture_counts(tests_dir: Path) -> Dict[str, Dict[str, int]]:
+    """Return ``{rule_id: {"pass": n, "fail": m}}`` for fixtures in *tests_dir*.
+
+    Fixtures are named ``<rule_id>__pass__<name>.har`` or
+    ``<rule_id>__fail__<name>.har``.  The directory is listed once and the
+    index is reused until the directory's modification time changes.
+    """
+
+    try:
+        mtime = tests_dir.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    key = Path(os.path.abspath(tests_dir))
+    with _lock:
+        cached = _fixture_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    counts: Dict[str, Dict[str, int]] = {}
+    with os.scandir(tests_dir) as it:
+        for entry in it:
+            match = _FIXTURE_RE.match(entry.name)
+            if match is None:
+                continue
+            rule = counts.setdefault(match.group("rule"), {"pass": 0, "fail": 0})
+            rule[match.group("kind")] += 1
+    if _settled(mtime):
+        with _lock:
+            _fixture_cache[key] = (mtime, counts)
+    return counts
+
+
+def clear_cache() -> None:
+    """Forget every cached spec and fixture index."""
+
+    with _lock:
+        _spec_cache.clear()
+        _fixture_cache.clear()
@@ -0,0 +1,313 @@
+"""HTTP ingest service for HAR uploads.
+
+Capture agents ``POST`` a HAR file, plain or gzip compressed, to ``/ingest``.
+The body is parsed incrementally with
+:class:`~goblean.ingest.har_stream.HarStreamParser` as it arrives, off the
+event loop; every :data:`DEFAULT_BATCH_SIZE` entries are handed to a worker
+thread that normalizes and schema checks them and stages the valid envelopes
+in the :class:`ShardedStore`.  Once the whole body is read the staged
+envelopes are committed to the shards and the response is sent, so envelopes
+are available to the batch tools within seconds of capture.
+
+Backpressure is applied at two points.  At most *max_uploads* uploads are
+processed at once; further ones get ``429 Too Many Requests`` with a
+``Retry-After`` header before any of their body is read.  Each upload keeps at
+most :data:`DEFAULT_WINDOW` batches in flight and stops reading its body while
+they are being stored, which slows the sender through TCP flow control rather
+than buffering the upload in memory.
+
+Every upload gets an id, returned as ``upload`` in the response.  A
+malformed or dropped upload stores nothing: its staged batches are discarded
+and a ``400`` names the upload and ``"stored": 0``, so the sender can retry
+it without duplicating envelopes.
+
+Run it with ``python -m goblean.service --store out/store`` (requires
+uvicorn).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+
+from . import instrument
+from .ingest.har_stream import HarStreamParser
+from .normalize.envelope import canonical_envelope
+from .schema_check import CanonicalEnvelope
+from .sessions import session_id
+
+DEFAULT_SHARDS = 16
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_UPLOADS = 8
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_WINDOW = 2
+DEFAULT_MAX_UPLOAD_BYTES = 1 << 30
+RETRY_AFTER_SECONDS = 5
+
+
+class ShardedStore:
+    """Canonical JSONL split into *shards* files by session id.
+
+    Envelopes go to ``<root>/shard-NN.jsonl`` by a stable hash of their
+    session id, so a session always lands in the same shard and the shards
+    can be read independently (for example by ``goblean.shadow_eval``).
+    Appends to one shard are serialized; different shards are written
+    concurrently.
+
+    Appends for an *upload* are staged under ``<root>/.staging/<upload>/``
+    until :meth:`commit` moves them to the shards or :meth:`discard` drops
+    them.
+    """
+
+    def __init__(self, root: Path, shards: int = DEFAULT_SHARDS):
+        self.root = root
+        self.shards = shards
+        self._locks = [threading.Lock() for _ in range(shards)]
+        root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, shard: int, upload: str | None = None) -> Path:
+        root = self.root if upload is None else self.root / ".staging" / upload
+        return root / f"shard-{shard:02d}.jsonl"
+
+    def shard(self, sid: str) -> int:
+        digest = hashlib.blake2b(sid.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.shards
+
+    def append(
+        self, envelopes: Sequence[Tuple[str, Dict[str, Any]]], upload: str | None = None
+    ) -> Dict[int, int]:
+        """Append ``(session id, envelope)`` pairs; return envelopes per shard.
+
+        With *upload* the envelopes are staged for that upload.
+        """
+
+        lines: Dict[int, List[str]] = {}
+        for sid, env in envelopes:
+            lines.setdefault(self.shard(sid), []).append(json.dumps(env) + "\n")
+        if upload is not None and lines:
+            self.path(0, upload).parent.mkdir(parents=True, exist_ok=True)
+        for shard, shard_lines in sorted(lines.items()):
+            # One write per shard and batch, so a batch is never interleaved
+            # with another one.
+            with self._locks[shard], self.path(shard, upload).open("a", encoding="utf-8") as f:
+                f.write("".join(shard_lines))
+        return {shard: len(shard_lines) for shard, shard_lines in lines.items()}
+
+    def commit(self, upload: str) -> None:
+        """Append the envelopes staged for *upload* to the shards."""
+
+        for shard in range(self.shards):
+            staged = self.path(shard, upload)
+            if not staged.exists():
+                continue
+            with self._locks[shard], staged.open("rb") as src, self.path(shard).open("ab") as dst:
+                shutil.copyfileobj(src, dst)
+        self.discard(upload)
+
+    def discard(self, upload: str) -> None:
+        """Drop the envelopes staged for *upload*."""
+
+        shutil.rmtree(self.root / ".staging" / upload, ignore_errors=True)
+
+
+def store_batch(
+    store: ShardedStore,
+    source: str,
+    entries: Sequence[Dict[str, Any]],
+    upload: str | None = None,
+) -> Dict[str, int]:
+    """Normalize and schema check *entries* and append the valid ones.
+
+    With *upload* the envelopes are staged for that upload.
+    """
+
+    valid = []
+    errors = 0
+    with instrument.stage("normalize"):
+        envelopes = [canonical_envelope(entry) for entry in entries]
+    for env in envelopes:
+        try:
+            with instrument.stage("schema_check"):
+                CanonicalEnvelope.model_validate(env)
+        except ValidationError:
+            errors += 1
+            continue
+        valid.append((session_id(env, source), env))
+    with instrument.stage("store"):
+        store.append(valid, upload)
+    instrument.count("schema_errors", errors)
+    instrument.count("events", len(valid))
+    return {"entries": len(entries), "stored": len(valid), "schema_errors": errors}
+
+
+class IngestService:
+    """Worker pool and admission control shared by all uploads."""
+
+    def __init__(
+        self,
+        store: ShardedStore,
+        workers: int = DEFAULT_WORKERS,
+        max_uploads: int = DEFAULT_MAX_UPLOADS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        window: int = DEFAULT_WINDOW,
+        max_upload_bytes: int = DEFAULT_MAX_UPLOAD_BYTES,
+    ):
+        self.store = store
+        self.batch_size = batch_size
+        self.window = window
+        self.max_uploads = max_uploads
+        self.max_upload_bytes = max_upload_bytes
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="goblean-ingest")
+        self.uploads = threading.BoundedSemaphore(max_uploads)
+        self.active = 0
+
+    def try_admit(self) -> bool:
+        """Reserve an upload slot; ``False`` when all are taken."""
+
+        if not self.uploads.acquire(blocking=False):
+            return False
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self.uploads.release()
+
+    async def ingest(self, request: Request, source: str, upload: str) -> Dict[str, int]:
+        """Stream the body of *request* into the store as *upload*.
+
+        Nothing is stored unless the whole body is read and parsed.
+        """
+
+        encoding = request.headers.get("content-encoding", "").lower()
+        parser = HarStreamParser(
+            gzip=True if encoding == "gzip" else None, max_bytes=self.max_upload_bytes
+        )
+        loop = asyncio.get_running_loop()
+        pending: List[asyncio.Future] = []
+        totals = {"entries": 0, "stored": 0, "schema_errors": 0}
+        batch: List[Dict[str, Any]] = []
+
+        async def submit(entries: List[Dict[str, Any]]) -> None:
+            while len(pending) >= self.window:
+                _add(totals, await pending.pop(0))
+            pending.append(
+                loop.run_in_executor(
+                    self.executor, store_batch, self.store, source, entries, upload
+                )
+            )
+
+        try:
+            try:
+                async for chunk in request.stream():
+                    # Decompressing and decoding a chunk is CPU bound.
+                    for entry in await loop.run_in_executor(None, parser.feed, chunk):
+                        batch.append(entry)
+                        if len(batch) >= self.batch_size:
+                            await submit(batch)
+                            batch = []
+                batch.extend(await loop.run_in_executor(None, parser.close))
+                if batch:
+                    await submit(batch)
+            finally:
+                for future in pending:
+                    _add(totals, await future)
+        except BaseException:
+            await loop.run_in_executor(None, self.store.discard, upload)
+            raise
+        await loop.run_in_executor(self.executor, self.store.commit, upload)
+        instrument.count("har_uploads")
+        instrument.count("bytes", parser.bytes_in)
+        return totals
+
+
+def _add(totals: Dict[str, int], result: Dict[str, int]) -> None:
+    for key, value in result.items():
+        totals[key] += value
+
+
+def create_app(service: IngestService) -> FastAPI:
+    """Return the ingest application backed by *service*."""
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        yield
+        service.executor.shutdown(wait=True)
+
+    app = FastAPI(title="goblean ingest", lifespan=lifespan)
+    app.state.ingest = service
+
+    @app.post("/ingest")
+    async def ingest(request: Request, source: str = "upload.har") -> JSONResponse:
+        if not service.try_admit():
+            instrument.count("uploads_rejected")
+            return JSONResponse(
+                {"detail": "ingest is saturated, retry later"},
+                status_code=429,
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        upload = uuid.uuid4().hex
+        try:
+            totals = await service.ingest(request, source, upload)
+        except ValueError as exc:
+            return JSONResponse(
+                {"detail": str(exc), "upload": upload, "stored": 0}, status_code=400
+            )
+        finally:
+            service.release()
+        return JSONResponse({"source": source, "upload": upload, **totals})
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        return {
+            "uploads": service.active,
+            "max_uploads": service.max_uploads,
+            "shards": service.store.shards,
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve HAR uploads over HTTP")
+    parser.add_argument(
+        "--store", type=Path, default=Path("out/store"), help="Sharded canonical store"
+    )
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--max-uploads",
+        type=int,
+        default=DEFAULT_MAX_UPLOADS,
+        help="Concurrent uploads before answering 429",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    service = IngestService(
+        ShardedStore(args.store, args.shards),
+        workers=args.workers,
+        max_uploads=args.max_uploads,
+        batch_size=args.batch_size,
+    )
+    uvicorn.run(create_app(service), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
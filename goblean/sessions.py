@@ -0,0 +1,29 @@
+"""Session identification for canonical envelopes."""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+# Parameters carrying a playback session identifier, in order of preference.
+SESSION_PARAMS = ("session_id", "sid", "sessionId")
+
+# Header consulted when no session parameter is present (case-insensitive).
+SESSION_HEADER = "x-session-id"
+
+
+def session_id(env: Dict[str, Any], default: str = "") -> str:
+    """Return the session identifier of *env*.
+
+    Session parameters take precedence over the ``X-Session-Id`` header.  When
+    neither is present *default* is returned; callers typically pass the source
+    file name so each capture without explicit ids forms one session.
+    """
+
+    params = env.get("params", {})
+    for name in SESSION_PARAMS:
+        value = params.get(name)
+        if value is not None:
+            return str(value)
+    for name, value in env.get("headers", {}).items():
+        if name.lower() == SESSION_HEADER:
+            return str(value)
+    return default
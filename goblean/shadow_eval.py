@@ -1,37 +1,358 @@
-"""Shadow evaluation utilities for specs."""
+"""Shadow evaluation utilities for specs.
+
+:func:`shadow_eval` reports the legacy single-rule result for one canonical
+file.  :func:`shadow_eval_rules` evaluates every spec over a set of canonical
+shards in a single scan and reports coverage and false positive rate per rule
+and platform.  Shadow data is assumed to be healthy, so every violation counts
+as a false positive.
+"""
 from __future__ import annotations
 
 import argparse
 import json
+import re
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
+from .aggregate import Aggregator, as_float, code_modules, feed, iter_canonical
+from .cache import ResultCache, add_cache_arguments, cache_from_args
+from .fingerprint import fingerprint
 from .report import metrics_from_canonical
+from .profiling import add_profile_arguments, profile_from_args
+from .rules import load_specs
+from .sessions import session_id
+
+# Version range that puts every SDK version in scope.
+VIRTUAL_VERSION = "0.0.0-virtual"
+
+
+class Check(ABC):
+    """Per-session state of one rule check.
+
+    :meth:`verdict` returns ``True`` if the session passed, ``False`` if it
+    violated the check and ``None`` if the session had no data to judge.
+    """
+
+    @abstractmethod
+    def update(self, env: Dict[str, Any]) -> None:
+        """Consume one envelope of the session."""
+
+    @abstractmethod
+    def verdict(self) -> bool | None:
+        """Return the session's verdict."""
+
+
+class NonDecreasingPlayhead(Check):
+    """Playhead values must never decrease within a session."""
+
+    def __init__(self, enabled: Any = True):
+        self.prev: float | None = None
+        self.ok = True
+
+    def update(self, env: Dict[str, Any]) -> None:
+        ph = as_float(env.get("params", {}).get("playhead"))
+        if ph is None:
+            return
+        if self.prev is not None and ph < self.prev:
+            self.ok = False
+        self.prev = ph
+
+    def verdict(self) -> bool | None:
+        return None if self.prev is None else self.ok
+
+
+# Check name in a spec's ``checks`` entries -> factory taking the entry's value.
+CHECKS: Dict[str, Callable[[Any], Check]] = {}
+
+
+def register_check(name: str, factory: Callable[[Any], Check]) -> None:
+    """Make *name* usable in spec ``checks`` entries."""
+
+    CHECKS[name] = factory
+
+
+register_check("non_decreasing_playhead", NonDecreasingPlayhead)
+
+
+_OPERATOR = r"(>=|<=|==|!=|>|<|=|\^|~)"
+_COMPARISON = re.compile(_OPERATOR + r"?v?(\d+|[xX*])(?:\.(\d+|[xX*]))?(?:\.(\d+|[xX*]))?$")
+
+Comparison = Tuple[str, Tuple[int, int, int]]
+
+
+def _pad(parts: Sequence[int]) -> Tuple[int, int, int]:
+    return tuple((list(parts) + [0, 0, 0])[:3])  # type: ignore[return-value]
+
+
+def _bump(parts: Sequence[int], index: int) -> Tuple[int, int, int]:
+    return _pad([*parts[:index], parts[index] + 1])
+
+
+def _expand(op: str, parts: List[int], token: str) -> List[Comparison]:
+    """Return plain comparisons equivalent to one range token."""
+
+    if not parts:
+        if op in ("", "=", "==", "^", "~", ">="):
+            return []
+        raise ValueError(f"{token!r} has no version")
+    if op == "^":
+        nonzero = [i for i, p in enumerate(parts) if p]
+        return [(">=", _pad(parts)), ("<", _bump(parts, nonzero[0] if nonzero else len(parts) - 1))]
+    if op == "~":
+        return [(">=", _pad(parts)), ("<", _bump(parts, min(1, len(parts) - 1)))]
+    if len(parts) == 3:
+        return [("==" if op in ("", "=") else op, _pad(parts))]
+    # Partial versions cover every version they prefix.
+    if op in ("", "=", "=="):
+        return [(">=", _pad(parts)), ("<", _bump(parts, len(parts) - 1))]
+    if op in (">=", "<"):
+        return [(op, _pad(parts))]
+    if op == ">":
+        return [(">=", _bump(parts, len(parts) - 1))]
+    if op == "<=":
+        return [("<", _bump(parts, len(parts) - 1))]
+    raise ValueError(f"{token!r} needs a full version")
+
+
+def parse_version_range(version_range: str) -> List[Comparison]:
+    """Return the comparisons of *version_range*, all of which must hold.
+
+    The range is a space- or comma-separated list of comparisons such as
+    ``">=3.0.0 <4.0.0"`` or ``">= 3.0"``.  Versions may be partial or use
+    ``x``/``*`` wildcards (``1.x``), and npm-style ``^1.2.3`` and ``~2.3``
+    are understood.  An empty range and :data:`VIRTUAL_VERSION` allow any
+    version.  Raises :class:`ValueError` for anything else.
+    """
+
+    if not version_range or version_range == VIRTUAL_VERSION:
+        return []
+    text = re.sub(_OPERATOR + r"\s+", r"\1", version_range.replace(",", " "))
+    comparisons: List[Comparison] = []
+    for token in text.split():
+        match = _COMPARISON.match(token)
+        if match is None:
+            raise ValueError(f"cannot parse {token!r}")
+        parts: List[int] = []
+        for part in match.group(2, 3, 4):
+            if part is None or not part.isdigit():
+                break
+            parts.append(int(part))
+        if any(p is not None and p.isdigit() for p in match.group(2, 3, 4)[len(parts) :]):
+            raise ValueError(f"{token!r} has a number after a wildcard")
+        comparisons.extend(_expand(match.group(1) or "", parts, token))
+    return comparisons
+
 
+_COMPARE: Dict[str, Callable[[Tuple[int, ...], Tuple[int, ...]], bool]] = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
 
-def shadow_eval(canonical: Path) -> Dict[str, Any]:
+
+def satisfies(version: Tuple[int, ...], comparisons: Sequence[Comparison]) -> bool:
+    """Return whether *version* meets every parsed comparison.
+
+    An unknown (empty) version always does.
+    """
+
+    if not version:
+        return True
+    padded = _pad(version)
+    return all(_COMPARE[op](padded, bound) for op, bound in comparisons)
+
+
+def version_in_range(version: Tuple[int, ...], version_range: str) -> bool:
+    """Return whether *version* satisfies *version_range*.
+
+    See :func:`parse_version_range` for the syntax.
+    """
+
+    return satisfies(version, parse_version_range(version_range))
+
+
+class Rule:
+    """A spec's scope and checks, ready for evaluation.
+
+    The version range is parsed up front; an invalid one raises
+    :class:`ValueError` naming the rule.  Checks without a registered
+    implementation in :data:`CHECKS` are ignored; a rule with no implemented
+    checks never reaches a verdict.
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        scope = spec.get("scope", {})
+        self.rule_id = spec.get("rule_id", "")
+        self.platforms = set(scope.get("platforms", []))
+        self.sdks = set(scope.get("sdks", []))
+        self.version_range = scope.get("version_range", "")
+        try:
+            self.comparisons = parse_version_range(self.version_range)
+        except ValueError as exc:
+            raise ValueError(
+                f"rule {self.rule_id!r}: invalid version_range {self.version_range!r}: {exc}"
+            ) from None
+        self.checks: List[Tuple[Callable[[Any], Check], Any]] = []
+        for entry in spec.get("checks", []):
+            for name, value in entry.items():
+                if name in CHECKS and value:
+                    self.checks.append((CHECKS[name], value))
+
+    def in_scope(self, platform: str, sdk: str, version: Tuple[int, ...]) -> bool:
+        """Return whether a session fingerprinted as given is in scope.
+
+        Unknown platforms and SDKs, and scopes listing ``"unknown"``, match.
+        """
+
+        if self.platforms and platform != "unknown" and platform not in self.platforms:
+            return False
+        if (
+            self.sdks
+            and "unknown" not in self.sdks
+            and sdk != "unknown"
+            and sdk not in self.sdks
+        ):
+            return False
+        return satisfies(version, self.comparisons)
+
+    def new_checks(self) -> List[Check]:
+        return [factory(value) for factory, value in self.checks]
+
+
+class RuleEvaluator(Aggregator):
+    """Online evaluation of *rules* per session.
+
+    Envelopes without a session id belong to the session named by
+    :attr:`source`, which callers update as they move from one input to the
+    next.  See :func:`shadow_eval_rules` for the result layout.
+    """
+
+    depends_on = ("goblean.fingerprint", "goblean.fingerprint.platform_version", "goblean.sessions")
+
+    def __init__(self, rules: Sequence[Rule], source: str = ""):
+        self.rules = list(rules)
+        self.source = source
+        self.sessions: Dict[str, Tuple[str, List[Tuple[Rule, List[Check]]], List[Any]]] = {}
+
+    def update(self, env: Dict[str, Any]) -> None:
+        sid = session_id(env, self.source)
+        session = self.sessions.get(sid)
+        if session is None:
+            platform, sdk, version = fingerprint(env)
+            states = [
+                (rule, rule.new_checks())
+                for rule in self.rules
+                if rule.in_scope(platform, sdk, version)
+            ]
+            updates = [c.update for _, checks in states for c in checks]
+            session = self.sessions[sid] = (platform, states, updates)
+        for update in session[2]:
+            update(env)
+
+    def result(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {r.rule_id: {} for r in self.rules}
+        for platform, states, _ in self.sessions.values():
+            for rule, checks in states:
+                stats = result[rule.rule_id].setdefault(
+                    platform, {"sessions": 0, "evaluated": 0, "violations": 0}
+                )
+                stats["sessions"] += 1
+                verdicts = [c.verdict() for c in checks]
+                if not verdicts or None in verdicts:
+                    continue
+                stats["evaluated"] += 1
+                if not all(verdicts):
+                    stats["violations"] += 1
+        for platforms in result.values():
+            for stats in platforms.values():
+                evaluated = stats["evaluated"]
+                stats["coverage"] = evaluated / stats["sessions"]
+                stats["fp_rate"] = stats["violations"] / evaluated if evaluated else 0.0
+        return result
+
+
+def shadow_eval(canonical: Path, cache: ResultCache | None = None) -> Dict[str, Any]:
     """Return coverage and false positive rate for baseline data."""
-    metrics = metrics_from_canonical(canonical)
+    metrics = metrics_from_canonical(canonical, cache=cache)
     coverage = 1.0 if metrics["count"] > 0 else 0.0
     fp_rate = 0.0 if metrics["non_decreasing_playhead"] else 1.0
     result: Dict[str, Any] = {"coverage": coverage, "fp_rate": fp_rate}
     return result
 
 
+def shadow_eval_rules(
+    canonicals: Sequence[Path],
+    specs_dir: Path = Path("rules/specs"),
+    cache: ResultCache | None = None,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Evaluate every spec in *specs_dir* over *canonicals* in one scan.
+
+    Envelopes are grouped into sessions by :func:`~goblean.sessions.session_id`
+    (defaulting to the shard's file name), and a session's platform, SDK and
+    version come from its first envelope.  Returns
+    ``{rule_id: {platform: stats}}`` where stats holds the number of in-scope
+    ``sessions``, the ``evaluated`` ones with a verdict, their ``violations``,
+    ``coverage`` (evaluated / sessions) and ``fp_rate`` (violations /
+    evaluated).  Every rule is listed, even without in-scope sessions.
+
+    With *cache* the result is reused while the shards, the specs and the
+    evaluation code are unchanged.
+    """
+
+    specs = [spec for _, spec in load_specs(specs_dir)]
+    if cache is not None:
+        key = cache.key(
+            "shadow_eval_rules",
+            canonicals,
+            code_modules(RuleEvaluator),
+            # Shard names are the default session ids.
+            {"specs": specs, "shards": [p.name for p in canonicals]},
+        )
+        return cache.get_or_compute(
+            key, lambda: shadow_eval_rules(canonicals, specs_dir)
+        )
+    evaluator = RuleEvaluator([Rule(spec) for spec in specs])
+    for path in canonicals:
+        evaluator.source = path.name
+        feed(iter_canonical(path), [evaluator])
+    return evaluator.result()
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Run shadow evaluation for the playhead monotonicity rule"
     )
-    parser.add_argument("canonical", type=Path, help="Input canonical jsonl")
+    parser.add_argument(
+        "canonical", type=Path, nargs="+", help="Input canonical jsonl shards"
+    )
+    parser.add_argument(
+        "--specs",
+        type=Path,
+        default=None,
+        help="Evaluate every spec in this directory, per rule and platform",
+    )
     parser.add_argument(
         "--out",
         type=Path,
         default=Path("out/shadow_eval.json"),
         help="Path to write evaluation result JSON",
     )
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    cache = cache_from_args(args)
+    if args.specs is None and len(args.canonical) > 1:
+        parser.error("multiple canonical files require --specs")
     args.out.parent.mkdir(parents=True, exist_ok=True)
-    result = shadow_eval(args.canonical)
+    with profile_from_args(args, "shadow_eval"):
+        if args.specs is None:
+            result = shadow_eval(args.canonical[0], cache)
+        else:
+            result = shadow_eval_rules(args.canonical, args.specs, cache)
     with args.out.open("w", encoding="utf-8") as f:
         json.dump(result, f)
     print(json.dumps(result))
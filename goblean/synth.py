@@ -0,0 +1,147 @@
+"""Synthetic HAR telemetry for tests and benchmarks.
+
+:func:`synthetic_har` builds a HAR log of player heartbeat beacons: a number of
+sessions spread over platforms, each sending events at a fixed cadence with a
+monotonic playhead and SDK headers, plus optional response bodies to mimic the
+bloat of real captures.  Output is deterministic for a given seed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+# (platform user agent, SDK name, SDK versions)
+PLATFORMS: List[Tuple[str, str, Sequence[str]]] = [
+    ("Roku/DVP-12.5 (12.5.0.4178)", "roku-player", ["3.6.0", "3.7.1", "4.0.0"]),
+    ("Dalvik/2.1.0 (Linux; U; Android 14; Pixel 8)", "exo-sdk", ["2.18.1", "2.19.0"]),
+    ("AppleCoreMedia/1.0.0 (iPhone; U; CPU OS 17_4 like Mac OS X)", "avkit-sdk", ["5.1", "5.2.3"]),
+]
+
+EVENTS = ["start", "heartbeat", "pause", "resume", "heartbeat", "heartbeat"]
+
+BEACON_URL = "https://telemetry.example.com/v1/beacon"
+START_TS = 1_700_000_000.0
+
+
+def _entry(
+    url: str, headers: Dict[str, str], query: Dict[str, str], ts: float, body: str
+) -> Dict[str, Any]:
+    return {
+        "startedDateTime": f"{ts:.3f}",
+        "time": 12.5,
+        "request": {
+            "method": "GET",
+            "url": url,
+            "httpVersion": "HTTP/1.1",
+            "headers": [{"name": k, "value": v} for k, v in headers.items()],
+            "queryString": [{"name": k, "value": v} for k, v in query.items()],
+            "headersSize": -1,
+            "bodySize": 0,
+        },
+        "response": {
+            "status": 200,
+            "statusText": "OK",
+            "httpVersion": "HTTP/1.1",
+            "headers": [{"name": "Content-Type", "value": "application/json"}],
+            "content": {"size": len(body), "mimeType": "application/json", "text": body},
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": len(body),
+        },
+        "cache": {},
+        "timings": {"send": 0.1, "wait": 10.0, "receive": 2.4},
+    }
+
+
+def synthetic_entries(
+    sessions: int = 10,
+    events_per_session: int = 100,
+    cadence: float = 10.0,
+    body_bytes: int = 0,
+    seed: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    """Yield HAR entries for *sessions* interleaved in timestamp order.
+
+    Every session sends *events_per_session* beacons *cadence* seconds apart,
+    starting at a random offset within the first minute.  Responses carry
+    *body_bytes* of filler.
+    """
+
+    rng = random.Random(seed)
+    body = json.dumps({"ok": True, "pad": "x" * max(0, body_bytes - 23)}) if body_bytes else ""
+    starts = []
+    for i in range(sessions):
+        ua, sdk, versions = PLATFORMS[i % len(PLATFORMS)]
+        headers = {
+            "User-Agent": ua,
+            "X-SDK-Name": sdk,
+            "X-SDK-Version": rng.choice(versions),
+            "Accept": "*/*",
+        }
+        starts.append((START_TS + rng.uniform(0, 60), f"s{seed}-{i:06d}", headers))
+    for n in range(events_per_session):
+        for start, sid, headers in starts:
+            ts = start + n * cadence
+            query = {
+                "sid": sid,
+                "event": EVENTS[n % len(EVENTS)] if n else "start",
+                "ts": f"{ts:.3f}",
+                "playhead": f"{n * cadence:.1f}",
+                "bitrate": str(rng.choice([800, 1600, 3200, 6400])),
+            }
+            yield _entry(BEACON_URL, headers, query, ts, body)
+
+
+def synthetic_har(**kwargs: Any) -> Dict[str, Any]:
+    """Return a HAR log of :func:`synthetic_entries` built with *kwargs*."""
+
+    return {
+        "log": {
+            "version": "1.2",
+            "creator": {"name": "goblean.synth", "version": "1"},
+            "entries": list(synthetic_entries(**kwargs)),
+        }
+    }
+
+
+def write_har(path: Path, **kwargs: Any) -> int:
+    """Write :func:`synthetic_har` to *path* and return the number of entries."""
+
+    har = synthetic_har(**kwargs)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump(har, f)
+    return len(har["log"]["entries"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic HAR file")
+    parser.add_argument("out", type=Path, help="Output .har path")
+    parser.add_argument("--sessions", type=int, default=10, help="Number of sessions")
+    parser.add_argument(
+        "--events", type=int, default=100, help="Events per session"
+    )
+    parser.add_argument(
+        "--cadence", type=float, default=10.0, help="Seconds between heartbeats"
+    )
+    parser.add_argument(
+        "--body-bytes", type=int, default=0, help="Response body size per entry"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+    count = write_har(
+        args.out,
+        sessions=args.sessions,
+        events_per_session=args.events,
+        cadence=args.cadence,
+        body_bytes=args.body_bytes,
+        seed=args.seed,
+    )
+    print(f"Wrote {count} entries to {args.out}")
+
+
+if __name__ == "__main__":  # pragma: no cover - CLI entrypoint
+    main()
@@ -1,5 +1,8 @@
 """Deterministic validators (FSM + invariants)."""
 
-from .fsm import evaluate
+from goblean._lazy import attach
 
 __all__ = ["evaluate"]
+
+# Public name -> submodule defining it, imported on first access.
+__getattr__, __dir__ = attach(__name__, {"evaluate": ".fsm"})
@@ -0,0 +1,15 @@
+from pathlib import Path
+
+import pytest
+
+from goblean import doc_cache
+from goblean.doc_cache import DocCacheStore
+
+
+@pytest.fixture
+def doc_store(tmp_path: Path, monkeypatch) -> DocCacheStore:
+    """Point the report steps at a throwaway doc cache."""
+
+    store = DocCacheStore(tmp_path / "doc_cache.sqlite")
+    monkeypatch.setattr(doc_cache, "DEFAULT_STORE_PATH", store.path)
+    return store
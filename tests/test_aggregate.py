@@ -0,0 +1,67 @@
+from typing import Any, Dict
+
+import pytest
+
+from goblean.aggregate import Aggregator, CadenceMetrics, DistinctCount, feed
+
+
+class ParamNames(Aggregator):
+    def __init__(self) -> None:
+        self.names: set[str] = set()
+
+    def update(self, env: Dict[str, Any]) -> None:
+        self.names.update(env.get("params", {}))
+
+    def result(self) -> Dict[str, Any]:
+        return {"param_names": sorted(self.names)}
+
+
+def test_cadence_metrics_tracks_endpoints_online() -> None:
+    agg = CadenceMetrics()
+    feed(
+        [
+            {"params": {"ts": "10", "playhead": "0"}},
+            {"params": {"playhead": "bad"}},
+            {"params": {"ts": "14", "playhead": "5"}},
+            {},
+            {"params": {"ts": "22", "playhead": "4"}},
+        ],
+        [agg],
+    )
+    assert agg.result() == {
+        "count": 5,
+        "cadence": 6.0,
+        "non_decreasing_playhead": False,
+        "first_ts": 10.0,
+    }
+
+
+def test_feed_drives_every_aggregator() -> None:
+    cadence = CadenceMetrics()
+    names = ParamNames()
+    feed([{"params": {"ts": 0, "a": 1}}, {"params": {"b": 2}}], [cadence, names])
+    assert cadence.result()["count"] == 2
+    assert names.result() == {"param_names": ["a", "b", "ts"]}
+
+
+def test_incomplete_aggregator_fails_at_construction() -> None:
+    class OnlyUpdate(Aggregator):
+        def update(self, env):
+            pass
+
+    with pytest.raises(TypeError):
+        OnlyUpdate()
+
+
+def test_distinct_count_is_exact_then_estimated() -> None:
+    small = DistinctCount()
+    for i in range(200):
+        small.add(f"s{i % 100}")
+    assert len(small) == 100
+
+    large = DistinctCount()
+    for i in range(50_000):
+        large.add(f"session-{i}")
+    assert large.values is None
+    assert len(large.registers) == 4096
+    assert abs(len(large) - 50_000) < 50_000 * 0.05
@@ -0,0 +1,121 @@
+import json
+import os
+from pathlib import Path
+
+import goblean.shadow_eval as shadow_eval_module
+from goblean import aggregate
+from goblean.cache import ResultCache
+from goblean.report import metrics_from_canonical
+
+
+def _age(path: Path, seconds: float) -> None:
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - int(seconds * 1e9)))
+
+
+def test_key_tracks_content_code_and_params(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path / "cache")
+    data = tmp_path / "data.jsonl"
+    data.write_text("a\n", encoding="utf-8")
+    _age(data, 10)
+    key = cache.key("job", [data], [aggregate], {"x": 1})
+    assert cache.key("job", [data], [aggregate], {"x": 1}) == key
+    assert cache.key("job", [data], [aggregate], {"x": 2}) != key
+    assert cache.key("job", [data], [], {"x": 1}) != key
+    data.write_text("b\n", encoding="utf-8")
+    assert cache.key("job", [data], [aggregate], {"x": 1}) != key
+
+
+def test_get_or_compute_and_lru_eviction(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path / "cache", max_bytes=250)
+    calls = []
+
+    def compute(value: int):
+        calls.append(value)
+        return {"value": value, "pad": "x" * 80}
+
+    assert cache.get_or_compute("a" * 64, lambda: compute(1))["value"] == 1
+    assert cache.get_or_compute("a" * 64, lambda: compute(1))["value"] == 1
+    assert calls == [1]
+    cache.get_or_compute("b" * 64, lambda: compute(2))
+    _age(cache._path("b" * 64), 60)  # "a" is now the most recently used
+    cache.get_or_compute("c" * 64, lambda: compute(3))
+    assert cache.get("a" * 64)[0] and cache.get("c" * 64)[0]
+    assert cache.get("b" * 64) == (False, None)
+
+    # Values without a JSON form are returned but not stored.
+    assert cache.get_or_compute("d" * 64, lambda: {1, 2}) == {1, 2}
+    assert cache.get("d" * 64) == (False, None)
+
+
+def test_digest_memos_count_and_scans_only_past_the_bound(tmp_path: Path, monkeypatch) -> None:
+    cache = ResultCache(tmp_path / "cache", max_bytes=400)
+    files = []
+    for i in range(8):
+        data = tmp_path / f"data{i}.txt"
+        data.write_text(str(i), encoding="utf-8")
+        _age(data, 10)
+        files.append(data)
+    cache.put("a" * 64, {"pad": "x" * 80})
+
+    scans = []
+    evict = ResultCache.evict
+    monkeypatch.setattr(ResultCache, "evict", lambda self: (scans.append(1), evict(self)))
+    cache.file_digest(files[0])
+    assert scans == []  # still under the bound: no directory scan
+    for data in files[1:]:
+        cache.file_digest(data)
+    assert scans  # memos pushed the running total past max_bytes
+
+    on_disk = sum(p.stat().st_size for p in (tmp_path / "cache").rglob("*.json"))
+    assert on_disk <= 400
+    assert cache._size == on_disk
+    assert len(list((tmp_path / "cache" / "digests").glob("*.json"))) < len(files)
+
+
+def test_cached_evaluations_skip_reading_input(tmp_path: Path, monkeypatch) -> None:
+    cache = ResultCache(tmp_path / "cache")
+    canonical = tmp_path / "c.jsonl"
+    canonical.write_text(
+        json.dumps({"params": {"sid": "s", "playhead": 1}}) + "\n", encoding="utf-8"
+    )
+    metrics = metrics_from_canonical(canonical, cache=cache)
+    result = shadow_eval_module.shadow_eval_rules([canonical], Path("rules/specs"), cache)
+
+    def fail(path):
+        raise AssertionError("input read despite cache hit")
+
+    monkeypatch.setattr(shadow_eval_module, "iter_canonical", fail)
+    monkeypatch.setattr("goblean.report.iter_canonical", fail)
+    assert metrics_from_canonical(canonical, cache=cache) == metrics
+    assert shadow_eval_module.shadow_eval_rules([canonical], Path("rules/specs"), cache) == result
+
+
+def test_fingerprint_changes_invalidate_report_scans(tmp_path: Path, monkeypatch) -> None:
+    from goblean import cache as cache_module
+    from goblean.report import write_baseline_csvs
+
+    cache = ResultCache(tmp_path / "cache")
+    canonical = tmp_path / "c.jsonl"
+    canonical.write_text(
+        json.dumps({"headers": {"User-Agent": "Roku"}, "params": {"sid": "s", "ts": 0}}) + "\n",
+        encoding="utf-8",
+    )
+    calls = []
+    real_scan = aggregate.run_aggregators
+
+    def counting(*args):
+        calls.append(1)
+        return real_scan(*args)
+
+    monkeypatch.setattr("goblean.report.run_aggregators", counting)
+    monkeypatch.setattr("goblean.report.write_baseline_reports", lambda *a: {})
+    write_baseline_csvs(canonical, tmp_path / "out", cache=cache)
+    write_baseline_csvs(canonical, tmp_path / "out", cache=cache)
+    assert len(calls) == 1
+    # An edited fingerprint heuristic has a different source digest.
+    monkeypatch.setitem(
+        cache_module._module_digests, "goblean.fingerprint.platform_version", "edited"
+    )
+    write_baseline_csvs(canonical, tmp_path / "out", cache=cache)
+    assert len(calls) == 2
@@ -0,0 +1,96 @@
+import csv
+import random
+from pathlib import Path
+
+import numpy as np
+from tslearn.metrics import dtw
+
+from goblean import instrument
+from goblean.aggregate import feed
+from goblean.cadence import CadenceIndex, CadenceSeries, shape, write_cadence
+from goblean.normalize.envelope import canonical_envelope
+from goblean.synth import synthetic_entries
+
+
+def test_shape_is_normalized_and_fixed_length() -> None:
+    assert shape([10.0, 10.01, 9.99, 10.0]).tolist() == [0.0] * 32
+    s = shape([float(i % 7) for i in range(500)], length=16)
+    assert s.shape == (16,)
+    assert abs(s.mean()) < 0.1
+    assert shape([1.0, 5.0, 2.0], length=8).shape == (8,)
+
+
+def test_nearest_matches_brute_force_dtw() -> None:
+    rng = np.random.default_rng(0)
+    shapes = [shape(np.cumsum(rng.normal(size=rng.integers(10, 80)))) for _ in range(200)]
+    keys = [f"s{i}" for i in range(len(shapes))]
+    index = CadenceIndex(keys, shapes, radius=2)
+    for q in range(5):
+        found = index.nearest(shapes[q], k=3, exclude=keys[q])
+        brute = sorted(
+            float(dtw(shapes[q], s, sakoe_chiba_radius=2))
+            for key, s in zip(keys, shapes)
+            if key != keys[q]
+        )[:3]
+        assert np.allclose([d for d, _ in found], brute)
+    assert index.assign([shapes[7]], list(range(len(keys)))) == [7]
+
+
+def test_search_work_is_bounded_at_scale() -> None:
+    rng = np.random.default_rng(1)
+    n = 5000
+    shapes = [shape(np.cumsum(rng.normal(size=rng.integers(10, 80)))) for _ in range(n)]
+    keys = [f"s{i}" for i in range(n)]
+    queries = 5
+
+    exact = CadenceIndex(keys, shapes)
+    with instrument.collect() as metrics:
+        for q in range(queries):
+            exact.nearest(shapes[q], k=3, exclude=keys[q])
+    assert metrics.counters["lb_keogh_computed"] < queries * n // 2
+    assert metrics.counters["dtw_computed"] < queries * n // 10
+
+    # A capped search examines a fixed number of shapes per query and still
+    # finds a duplicate, the closest shape by every bound.
+    capped = CadenceIndex([*keys, "dup"], [*shapes, shapes[0]], max_candidates=32)
+    with instrument.collect() as metrics:
+        for q in range(queries):
+            found = capped.nearest(shapes[q], k=3, exclude=keys[q])
+            assert len(found) == 3
+            if q == 0:
+                assert found[0] == (0.0, "dup")
+    assert metrics.counters["lb_keogh_computed"] <= queries * 32
+    assert metrics.counters["dtw_computed"] <= queries * 32
+
+
+def test_series_are_thinned_to_max_points() -> None:
+    series = CadenceSeries(max_points=8)
+    feed(
+        ({"params": {"sid": "a", "ts": str(t), "playhead": str(t)}} for t in range(100)),
+        [series],
+    )
+    samples = series.series()["a"]
+    assert len(samples) < 8
+    gaps = {b[0] - a[0] for a, b in zip(samples, samples[1:])}
+    assert len(gaps) == 1
+
+
+def test_write_cadence_ranks_irregular_session_first(tmp_path: Path) -> None:
+    series = CadenceSeries()
+    feed(
+        (canonical_envelope(e) for e in synthetic_entries(sessions=12, events_per_session=40)),
+        [series],
+    )
+    rng = random.Random(0)
+    t = 0.0
+    for _ in range(40):
+        t += rng.choice([1.0, 30.0])
+        series.update({"params": {"sid": "odd", "ts": str(t)}})
+    write_cadence(series.series(), tmp_path, k=3)
+    with (tmp_path / "cadence.csv").open(newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 13
+    assert rows[0]["session_id"] == "odd"
+    assert float(rows[0]["knn_distance"]) > 0
+    assert float(rows[-1]["knn_distance"]) == 0.0
+    assert len(rows[-1]["nearest_sessions"].split("|")) == 3
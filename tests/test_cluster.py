@@ -0,0 +1,73 @@
+import csv
+from pathlib import Path
+
+from goblean.aggregate import feed
+from goblean.cluster import ClusterModel, SessionProfiles, write_clusters
+from goblean.normalize.envelope import canonical_envelope
+from goblean.sessions import session_id
+from goblean.synth import synthetic_entries
+
+
+def _profiles(extra=None, sessions: int = 60, seed: int = 0, max_open: int | None = None):
+    profiles = SessionProfiles() if max_open is None else SessionProfiles(max_open=max_open)
+    envelopes = []
+    for entry in synthetic_entries(sessions=sessions, events_per_session=10, seed=seed):
+        env = canonical_envelope(entry)
+        if extra:
+            env["params"].update(extra)
+        envelopes.append(env)
+    if max_open is not None:
+        envelopes.sort(key=lambda env: session_id(env, ""))
+    feed(envelopes, [profiles])
+    return profiles
+
+
+def _read(path: Path):
+    with path.open("r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_write_clusters_fits_then_assigns_without_refit(tmp_path: Path) -> None:
+    rows = write_clusters(_profiles(), tmp_path)
+    model_path = tmp_path / "clusters.model.pkl"
+    assert model_path.exists()
+    clusters = _read(tmp_path / "clusters.csv")
+    assert len(clusters) == len(rows) > 1
+    assert sum(int(c["n"]) for c in clusters) == 60
+    assert {c["platform_guess"] for c in clusters} == {"roku", "android", "ios"}
+    assert all("playhead" in c["signature"].split("|") for c in clusters)
+    # Every shape is new to an empty index.
+    assert all(float(c["novelty_score"]) == 1.0 for c in clusters)
+
+    model = ClusterModel.load(model_path)
+    fitted = model.clusterer
+    # New sessions with an unseen parameter are near duplicates of indexed ones.
+    write_clusters(_profiles({"debug_flag": "1"}, sessions=12, seed=1), tmp_path)
+    assert ClusterModel.load(model_path).clusterer.labels_.tolist() == fitted.labels_.tolist()
+    novel = _read(tmp_path / "clusters.csv")
+    assert sum(int(c["n"]) for c in novel) == 12
+    assert all(0.0 < float(c["novelty_score"]) < 0.5 for c in novel)
+    sessions = _read(tmp_path / "session_novelty.csv")
+    assert len(sessions) == 12
+    assert all(s["nearest_session"].startswith("s0-") for s in sessions)
+
+    # A batch of already indexed shapes is not novel at all.
+    write_clusters(_profiles(sessions=6, seed=2), tmp_path)
+    assert all(float(c["novelty_score"]) == 0.0 for c in _read(tmp_path / "clusters.csv"))
+
+
+def test_too_few_sessions_stay_unclustered(tmp_path: Path) -> None:
+    write_clusters(_profiles(sessions=3), tmp_path)
+    assert not (tmp_path / "clusters.model.pkl").exists()
+    [row] = _read(tmp_path / "clusters.csv")
+    assert row["cluster_id"] == "-1"
+    assert row["n"] == "3"
+
+
+def test_closed_sessions_are_streamed_with_bounded_open_sessions(tmp_path: Path) -> None:
+    bounded = _profiles(max_open=2)
+    assert len(bounded.open) <= 2 and bounded.closed_count == 58
+    assert len(bounded) == 60
+    rows = write_clusters(bounded, tmp_path / "bounded")
+    assert not bounded.open
+    assert rows == write_clusters(_profiles(), tmp_path / "all")
@@ -0,0 +1,107 @@
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from goblean.dag import Step, dependencies, read_artifact, run_steps
+
+
+def _copy_upper(calls: List[str]):
+    def run(out_dir: Path, data: Dict[str, Any]) -> Dict[str, Any]:
+        calls.append("upper")
+        text = data["a.txt"].upper()
+        (out_dir / "b.txt").write_text(text, encoding="utf-8")
+        return {"b.txt": text}
+
+    return run
+
+
+def _count(calls: List[str], seen: List[Any]):
+    def run(out_dir: Path, data: Dict[str, Any]) -> Dict[str, Any]:
+        calls.append("count")
+        seen.append(data["b.txt"])
+        (out_dir / "c.txt").write_text(str(len(data["b.txt"])), encoding="utf-8")
+        return {}
+
+    return run
+
+
+def test_dependencies_follow_latest_writer_and_readers() -> None:
+    noop = lambda out_dir, data: None  # noqa: E731
+    steps = [
+        Step("a", noop, outputs=["x"]),
+        Step("b", noop, inputs=["x"], outputs=["y"]),
+        Step("c", noop, inputs=["x"], outputs=["z"]),
+        Step("d", noop, inputs=["z"], outputs=["x"]),
+    ]
+    deps = dependencies(steps)
+    assert deps == {"a": set(), "b": {"a"}, "c": {"a"}, "d": {"a", "b", "c"}}
+
+
+def test_run_steps_skips_unchanged_inputs(tmp_path: Path) -> None:
+    (tmp_path / "a.txt").write_text("abc", encoding="utf-8")
+    calls: List[str] = []
+    seen: List[Any] = []
+    steps = [
+        Step("upper", _copy_upper(calls), ["a.txt"], ["b.txt"]),
+        Step("count", _count(calls, seen), ["b.txt"], ["c.txt"]),
+    ]
+    assert run_steps(steps, tmp_path) == {"upper": "ran", "count": "ran"}
+    assert calls == ["upper", "count"]
+    assert (tmp_path / ".pipeline_state.json").exists()
+
+    calls.clear()
+    assert run_steps(steps, tmp_path) == {"upper": "skipped", "count": "skipped"}
+    assert calls == []
+
+    # A changed input reruns the step; its output is handed on in memory.
+    (tmp_path / "a.txt").write_text("abcd", encoding="utf-8")
+    assert run_steps(steps, tmp_path) == {"upper": "ran", "count": "ran"}
+    assert seen[-1] == "ABCD"
+
+    # An output edited outside the pipeline is rebuilt.
+    calls.clear()
+    (tmp_path / "c.txt").write_text("stale!", encoding="utf-8")
+    assert run_steps(steps, tmp_path) == {"upper": "skipped", "count": "ran"}
+    assert read_artifact(tmp_path / "c.txt") == "4"
+
+
+def test_run_steps_non_cacheable_always_runs(tmp_path: Path) -> None:
+    calls: List[str] = []
+
+    def append(out_dir: Path, data: Dict[str, Any]) -> None:
+        calls.append("append")
+
+    steps = [Step("append", append, outputs=["history.csv"], cacheable=False)]
+    run_steps(steps, tmp_path)
+    run_steps(steps, tmp_path)
+    assert calls == ["append", "append"]
+
+
+def test_run_steps_runs_independent_steps_concurrently(tmp_path: Path) -> None:
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(out_dir: Path, data: Dict[str, Any]) -> None:
+        barrier.wait()
+
+    steps = [
+        Step("left", branch, outputs=["l.csv"], cacheable=False),
+        Step("right", branch, outputs=["r.csv"], cacheable=False),
+    ]
+    assert run_steps(steps, tmp_path, max_workers=2) == {"left": "ran", "right": "ran"}
+
+
+def test_run_steps_propagates_errors_and_skips_dependents(tmp_path: Path) -> None:
+    calls: List[str] = []
+
+    def fail(out_dir: Path, data: Dict[str, Any]) -> None:
+        raise RuntimeError("boom")
+
+    steps = [
+        Step("fail", fail, outputs=["x.csv"]),
+        Step("after", lambda out_dir, data: calls.append("after"), ["x.csv"], ["y.csv"]),
+    ]
+    with pytest.raises(RuntimeError, match="boom"):
+        run_steps(steps, tmp_path)
+    assert calls == []
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator
+
+import pytest
+
+from goblean import doc_cache
+from goblean.report import verify_doc_cache
+
+
+class _Handler(BaseHTTPRequestHandler):
+    hits: Dict[str, int] = {}
+
+    def do_HEAD(self) -> None:  # noqa: N802 - http.server API
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path == "/doc":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+            else:
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        elif self.path == "/flaky" and self.hits[self.path] == 1:
+            self.send_response(503)
+        elif self.path == "/flaky":
+            self.send_response(200)
+        elif self.path == "/slow":
+            time.sleep(1.0)
+            self.send_response(200)
+        else:
+            self.send_response(404)
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@contextmanager
+def _server() -> Iterator[str]:
+    _Handler.hits = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_check_source_conditional_and_retries() -> None:
+    with _server() as base:
+        first = doc_cache.check_source(f"{base}/doc")
+        assert (first.ok, first.status, first.etag) == (True, 200, '"v1"')
+        again = doc_cache.check_source(f"{base}/doc", etag=first.etag)
+        assert (again.ok, again.status, again.etag) == (True, 304, '"v1"')
+
+        flaky = doc_cache.check_source(f"{base}/flaky", backoff=0.01)
+        assert flaky.ok and _Handler.hits["/flaky"] == 2
+
+        missing = doc_cache.check_source(f"{base}/missing", backoff=0.01)
+        assert (missing.ok, missing.status) == (False, 404)
+        assert _Handler.hits["/missing"] == 1
+
+        slow = doc_cache.check_source(f"{base}/slow", timeout=0.2, retries=0)
+        assert not slow.ok
+
+
+def test_verify_doc_cache_concurrent_with_local_server(tmp_path: Path) -> None:
+    with _server() as base:
+        cache = {
+            f"cached://doc{i}": {
+                "source_url": f"{base}/doc",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+            }
+            for i in range(20)
+        }
+        cache["cached://slow"] = {
+            "source_url": f"{base}/slow",
+            "first_seen": "2024-01-01T00:00:00Z",
+            "last_verified": "2024-01-01T00:00:00Z",
+        }
+        (tmp_path / "cache.json").write_text(json.dumps(cache))
+        cache_path = tmp_path / "cache.sqlite"
+
+        start = time.monotonic()
+        results = verify_doc_cache(cache_path, timeout=0.5, retries=1, backoff=0.01, per_host=8)
+        assert time.monotonic() - start < 3
+        assert results["cached://slow"] is False
+        assert all(results[f"cached://doc{i}"] for i in range(20))
+
+        store = doc_cache.open_store(cache_path)
+        updated = store.items()
+        assert updated["cached://doc0"]["etag"] == '"v1"'
+        assert updated["cached://doc0"]["last_verified"] != "2024-01-01T00:00:00Z"
+        assert updated["cached://slow"]["last_verified"] == "2024-01-01T00:00:00Z"
+
+        verify_doc_cache(cache_path, timeout=0.5, retries=1, backoff=0.01)
+        assert store.items()["cached://doc0"]["reachable"] is True
+
+
+def test_open_store_rejects_legacy_json_paths(tmp_path: Path) -> None:
+    legacy = tmp_path / "doc_cache.json"
+    legacy.write_text("{}")
+    with pytest.raises(ValueError, match=r"doc_cache\.sqlite"):
+        doc_cache.open_store(legacy)
+    assert not (tmp_path / "doc_cache.sqlite").exists()
+
+
+def test_store_partial_upserts_and_legacy_import(tmp_path: Path) -> None:
+    legacy = tmp_path / "doc_cache.json"
+    legacy.write_text(json.dumps({"cached://a": {"source_url": "https://a", "first_seen": "t0"}}))
+    store = doc_cache.DocCacheStore(tmp_path / "doc_cache.sqlite")
+    assert store.items() == {"cached://a": {"source_url": "https://a", "first_seen": "t0"}}
+
+    # Concurrent writers touching different fields keep each other's updates.
+    writers = [
+        threading.Thread(target=store.upsert_many, args=({"cached://a": {"etag": '"x"'}},)),
+        threading.Thread(target=store.upsert_many, args=({"cached://a": {"reachable": False}},)),
+    ]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    store.insert_missing({"cached://a": {"source_url": "ignored"}, "cached://b": {"source_url": "https://b"}})
+    entries = store.items()
+    assert entries["cached://a"] == {
+        "source_url": "https://a",
+        "first_seen": "t0",
+        "reachable": False,
+        "etag": '"x"',
+    }
+    assert store.get_many(["cached://b", "cached://none"]) == {"cached://b": {"source_url": "https://b"}}
+
+    # The legacy file is imported only once.
+    legacy.write_text(json.dumps({"cached://c": {"source_url": "https://c"}}))
+    assert "cached://c" not in doc_cache.DocCacheStore(tmp_path / "doc_cache.sqlite").items()
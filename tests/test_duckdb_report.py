@@ -0,0 +1,140 @@
+import csv
+import json
+from pathlib import Path
+
+from goblean.duckdb_report import canonical_to_parquet, connect, query, write_reports
+
+
+def _write_canonical(path: Path) -> None:
+    roku = {"User-Agent": "Roku/DVP-9.10", "X-SDK-Name": "hb-api", "X-SDK-Version": "3.6.0beta"}
+    android = {"user-agent": "Android/10", "x-sdk-name": "hb-api", "x-sdk-version": "1.2.3"}
+    envs = [
+        {"headers": roku, "params": {"sid": "a", "ts": "0", "playhead": "0"}},
+        {"headers": roku, "params": {"sid": "a", "ts": "10", "playhead": "10"}},
+        {"headers": android, "params": {"sid": "b", "ts": 86400, "playhead": 0}},
+        {"headers": roku, "params": {"sid": "c", "ts": "20"}},
+        {"headers": {}, "params": {}},
+    ]
+    with path.open("w", encoding="utf-8") as f:
+        for env in envs:
+            f.write(json.dumps(env) + "\n")
+
+
+def _write_labels(out_dir: Path) -> None:
+    out_dir.mkdir()
+    with (out_dir / "coverage.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["session_id", "platform", "sdk", "version_guess", "label", "confidence", "source_lf_ids"])
+        writer.writerow(["a", "roku", "hb-api", "3.6.0", "PASS", "1.0", ""])
+        writer.writerow(["c", "roku", "hb-api", "3.6.0", "ABSTAIN", "0.0", ""])
+    with (out_dir / "violations.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["session_id", "event_id", "platform", "sdk", "version_guess", "rule_id", "fail_code", "severity", "ts"])
+        writer.writerow(["a", "1", "roku", "hb-api", "3.6.0", "R", "X", "high", "10"])
+        writer.writerow(["a", "2", "roku", "hb-api", "3.6.0", "R", "Y", "high", "10"])
+
+
+def _rows(path: Path) -> list[list[str]]:
+    with path.open("r", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_events_view_mirrors_fingerprint(tmp_path: Path) -> None:
+    canonical = tmp_path / "canonical.jsonl"
+    _write_canonical(canonical)
+    con = connect(canonical)
+    rows = query(
+        con,
+        "SELECT session_id, ts, platform, sdk, version_scope FROM events ORDER BY ts NULLS LAST",
+    )
+    assert rows[0] == ("a", 0.0, "roku", "hb-api", "3.6.0")
+    assert rows[3] == ("b", 86400.0, "android", "hb-api", "1.2.3")
+    assert rows[4] == ("canonical.jsonl", None, "unknown", "unknown", "0.0.0-virtual")
+
+
+def test_write_reports_groups_metrics_and_sessions(tmp_path: Path) -> None:
+    canonical = tmp_path / "canonical.jsonl"
+    _write_canonical(canonical)
+    out_dir = tmp_path / "out"
+    _write_labels(out_dir)
+
+    write_reports(canonical, out_dir, threads=2)
+
+    metrics = _rows(out_dir / "metrics_daily.csv")
+    assert metrics[0][:4] == ["date", "platform", "sdk", "version_scope"]
+    assert metrics[1:] == [
+        ["", "unknown", "unknown", "0.0.0-virtual", "0", "0.0", "0.0", "0.0", "0.0", "0", "1", ""],
+        ["1970-01-01", "roku", "hb-api", "3.6.0", "0", "0.5", "1.0", "0.0", "0.0", "2", "2", ""],
+        ["1970-01-02", "android", "hb-api", "1.2.3", "0", "0.0", "0.0", "0.0", "0.0", "0", "1", ""],
+    ]
+    sessions = _rows(out_dir / "sessions_index.csv")
+    assert sessions[0] == ["session_id", "platform", "sdk", "version_guess", "first_ts", "last_ts", "event_count", "file_source"]
+    assert sessions[1] == ["a", "roku", "hb-api", "3.6.0", "0.0", "10.0", "2", str(canonical)]
+    assert sessions[-1] == ["canonical.jsonl", "unknown", "unknown", "0.0.0-virtual", "", "", "1", str(canonical)]
+    rates = _rows(out_dir / "coverage_rates.csv")
+    assert rates[1] == ["roku", "hb-api", "3.6.0", "2", "0.5", "1.0"]
+
+
+def test_parquet_canonical_matches_jsonl(tmp_path: Path) -> None:
+    canonical = tmp_path / "canonical.jsonl"
+    _write_canonical(canonical)
+    parquet = tmp_path / "canonical.parquet"
+    canonical_to_parquet(canonical, parquet)
+    sql = "SELECT session_id, ts, platform, sdk, version_scope FROM events WHERE ts IS NOT NULL ORDER BY ts"
+    assert query(connect(parquet), sql) == query(connect(canonical), sql)
+
+
+def test_sql_metrics_daily_matches_streaming_aggregator(tmp_path: Path) -> None:
+    from goblean.aggregate import feed, iter_canonical
+    from goblean.report import MetricsDaily
+
+    canonical = tmp_path / "canonical.jsonl"
+    _write_canonical(canonical)
+    out_dir = tmp_path / "out"
+    write_reports(canonical, out_dir)
+
+    agg = MetricsDaily(canonical.name)
+    feed(iter_canonical(canonical), [agg])
+    expected = [[str(v) for v in row] for row in agg.result()["rows"]]
+    assert _rows(out_dir / "metrics_daily.csv")[1:] == expected
+
+
+def test_sql_and_streaming_metrics_daily_agree_on_rates(tmp_path: Path) -> None:
+    from goblean.aggregate import feed, iter_canonical
+    from goblean.report import MetricsDaily
+
+    canonical = tmp_path / "canonical.jsonl"
+    _write_canonical(canonical)
+    out_dir = tmp_path / "out"
+    _write_labels(out_dir)
+    agg = MetricsDaily(
+        canonical.name, _rows(out_dir / "coverage.csv"), _rows(out_dir / "violations.csv")
+    )
+    feed(iter_canonical(canonical), [agg])
+
+    write_reports(canonical, out_dir)
+
+    expected = [[str(v) for v in row] for row in agg.result()["rows"]]
+    assert _rows(out_dir / "metrics_daily.csv")[1:] == expected
+    assert [row[5:7] + row[9:10] for row in expected if row[1] == "roku"] == [["0.5", "1.0", "2"]]
+
+
+def test_metrics_daily_rates_follow_the_session_dates(tmp_path: Path) -> None:
+    roku = {"User-Agent": "Roku/9", "X-SDK-Name": "hb-api", "X-SDK-Version": "3.6.0"}
+    canonical = tmp_path / "canonical.jsonl"
+    with canonical.open("w", encoding="utf-8") as f:
+        f.write(json.dumps({"headers": roku, "params": {"sid": "a", "ts": 0}}) + "\n")
+        f.write(json.dumps({"headers": roku, "params": {"sid": "b", "ts": 86400}}) + "\n")
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    with (out_dir / "coverage.csv").open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["session_id", "platform", "sdk", "version_guess", "label"])
+        writer.writerow(["a", "roku", "hb-api", "3.6.0", "ABSTAIN"])
+        writer.writerow(["b", "roku", "hb-api", "3.6.0", "PASS"])
+
+    write_reports(canonical, out_dir)
+
+    metrics = _rows(out_dir / "metrics_daily.csv")
+    assert [row[0] for row in metrics[1:]] == ["1970-01-01", "1970-01-02"]
+    assert [row[5] for row in metrics[1:]] == ["0.0", "1.0"]
@@ -0,0 +1,84 @@
+import csv
+import threading
+from pathlib import Path
+from typing import List
+
+from goblean.durable_queue import OffsetLog, drain
+
+HEADER = ["item", "at"]
+
+
+def test_consumers_read_only_new_records(tmp_path: Path) -> None:
+    log = OffsetLog(tmp_path / "q.csv", HEADER)
+    assert log.append([["a", "1"], ["b", "2"]]) == 2
+    batch = log.claim("c1", max_items=1)
+    assert (batch.start, batch.end, batch.rows) == (0, 1, [["a", "1"]])
+    log.ack(batch)
+    assert log.lag("c1") == 1 and log.lag("c2") == 2
+
+    seen: List[List[str]] = []
+    assert drain(log, "c1", seen.extend) == 1
+    assert seen == [["b", "2"]]
+    log.append([["c", "3"]])
+    assert drain(log, "c1", seen.extend) == 1
+    assert seen[-1] == ["c", "3"]
+    assert log.claim("c1") is None
+    rows = list(csv.reader((tmp_path / "q.csv").open(encoding="utf-8")))
+    assert rows == [HEADER, ["a", "1"], ["b", "2"], ["c", "3"]]
+
+
+def test_expired_lease_is_redelivered(tmp_path: Path) -> None:
+    log = OffsetLog(tmp_path / "q.csv", HEADER)
+    log.append([["a", "1"]])
+    lost = log.claim("c", lease=0)
+    again = log.claim("c")
+    assert again.rows == lost.rows == [["a", "1"]]
+    log.ack(again)
+    log.ack(lost)
+    assert log.committed("c") == 1 and log.claim("c") is None
+
+
+def test_legacy_log_is_indexed_once(tmp_path: Path) -> None:
+    path = tmp_path / "q.csv"
+    path.write_text("item,at\nold,0\n", encoding="utf-8")
+    log = OffsetLog(path, HEADER)
+    assert log.append([["new", "1"]]) == 2
+    assert drain(log, "c", lambda rows: None) == 2
+
+
+def test_concurrent_workers_process_every_record_once(tmp_path: Path) -> None:
+    log = OffsetLog(tmp_path / "q.csv", HEADER)
+    log.append([[str(i), "x"] for i in range(200)])
+    seen: List[str] = []
+    lock = threading.Lock()
+
+    def process(rows: List[List[str]]) -> None:
+        with lock:
+            seen.extend(r[0] for r in rows)
+
+    workers = [
+        threading.Thread(target=drain, args=(log, "c", process, 7)) for _ in range(4)
+    ]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    assert sorted(seen, key=int) == [str(i) for i in range(200)]
+
+
+def test_compaction_drops_records_every_consumer_processed(tmp_path: Path) -> None:
+    path = tmp_path / "q.csv"
+    log = OffsetLog(path, HEADER, consumers=["slow", "fast"], compact_rows=3)
+    log.append([[str(i), "x"] for i in range(5)])
+    assert drain(log, "slow", lambda rows: None, max_items=2) == 5
+    # "fast" has not claimed anything yet, so nothing is dropped.
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 6
+
+    log.ack(log.claim("fast", max_items=4))
+    assert path.read_text(encoding="utf-8").splitlines() == ["item,at", "4,x"]
+    log.append([["5", "x"]])
+    seen: List[List[str]] = []
+    drain(log, "fast", seen.extend)
+    assert seen == [["4", "x"], ["5", "x"]]
+    assert drain(log, "slow", seen.extend) == 1
+    assert log.committed("slow") == 6
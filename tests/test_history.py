@@ -0,0 +1,54 @@
+import csv
+import json
+from pathlib import Path
+
+from goblean import history
+
+HEADER = ["ts", "value", "label"]
+
+
+def _append(path: Path, i: int, **kwargs) -> history.HistoryStats:
+    return history.append_row(path, HEADER, [f"t{i}", str(i), "x"], ["value"], **kwargs)
+
+
+def test_append_row_keeps_running_aggregates(tmp_path: Path) -> None:
+    path = tmp_path / "h.csv"
+    for i in range(1, 5):
+        stats = _append(path, i, window=3)
+    assert (stats.count, stats.mean("value")) == (4, 2.5)
+    assert stats.recent_values("value") == [2.0, 3.0, 4.0]
+    assert list(csv.reader(path.open(encoding="utf-8")))[0] == HEADER
+
+    saved = json.loads(history.stats_path(path).read_text(encoding="utf-8"))
+    assert saved["count"] == 4 and saved["sums"] == {"value": 10.0}
+    loaded = history.load_stats(path, ["value"], window=3)
+    assert loaded.to_json() == stats.to_json()
+
+
+def test_load_stats_rebuilds_after_external_edit(tmp_path: Path) -> None:
+    path = tmp_path / "h.csv"
+    _append(path, 1)
+    with path.open("a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(["t2", "5", "x"])
+    stats = history.load_stats(path, ["value"])
+    assert (stats.count, stats.mean("value")) == (2, 3.0)
+
+    history.stats_path(path).unlink()
+    assert history.load_stats(path, ["value"]).count == 2
+
+
+def test_compaction_rolls_up_old_rows(tmp_path: Path) -> None:
+    path = tmp_path / "h.csv"
+    for i in range(1, 8):
+        stats = _append(path, i, window=2, max_rows=4)
+    rows = list(csv.reader(path.open(encoding="utf-8")))
+    assert [r[0] for r in rows[1:]] == ["t4", "t5", "t6", "t7"]
+    rollup = list(csv.reader(history.rollup_path(path).open(encoding="utf-8")))
+    assert rollup[0] == ["first_ts", "last_ts", "count", "sum_value"]
+    assert rollup[1][:3] == ["t1", "t3", "3"]
+    assert (stats.count, stats.mean("value")) == (7, 4.0)
+
+    # Totals survive a rebuild from the rollup plus the remaining rows.
+    rebuilt = history.rebuild_stats(path, ["value"], window=2)
+    assert (rebuilt.count, rebuilt.mean("value")) == (7, 4.0)
+    assert rebuilt.recent_values("value") == [6.0, 7.0]
@@ -0,0 +1,17 @@
+from pathlib import Path
+
+from goblean.html_report import HtmlReport
+
+
+def test_html_report_renders_sections_in_order(tmp_path: Path) -> None:
+    report = HtmlReport("Weekly <Report>")
+    report.add_section("", ["<p>intro</p>"])
+    report.add_section("Trends", ["<div>a</div>", "<div>b</div>"])
+    assert report.has_section("Trends") and not report.has_section("Other")
+    assert report.content() == "<p>intro</p>\n<h2>Trends</h2>\n<div>a</div>\n<div>b</div>\n"
+
+    path = tmp_path / "report.html"
+    html = report.write(path)
+    assert path.read_text(encoding="utf-8") == html == report.render()
+    assert html.startswith("<html><body>\n<h1>Weekly &lt;Report&gt;</h1>\n")
+    assert html.endswith("</body></html>\n")
@@ -1,12 +1,67 @@
 """Sanity tests for package imports."""
 
 from pathlib import Path
+import json
+import os
+import subprocess
 import sys
 
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 import goblean
 
+ROOT = Path(__file__).resolve().parents[1]
+
+# Seconds a fresh interpreter may spend importing the package and its CLI.
+IMPORT_BUDGET = float(os.environ.get("GOBLEAN_IMPORT_BUDGET", "0.5"))
+
+HEAVY_MODULES = [
+    "duckdb",
+    "polars",
+    "pydantic",
+    "sklearn",
+    "umap",
+    "hdbscan",
+    "tslearn",
+    "semver",
+    "fastapi",
+]
+
 
 def test_import() -> None:
     assert hasattr(goblean, "ingest")
+    assert "fingerprint" in dir(goblean)
+
+
+def test_subpackages_export_their_names_lazily() -> None:
+    from goblean import ingest, validator
+
+    assert {"ingest_folder", "HarStreamParser"} <= set(dir(ingest))
+    assert ingest.HarStreamParser.__module__ == "goblean.ingest.har_stream"
+    assert callable(validator.evaluate)
+    assert "evaluate" in vars(validator)  # resolved once, then cached
+    with pytest.raises(AttributeError, match="no attribute 'nope'"):
+        ingest.nope
+
+
+def test_startup_stays_within_budget() -> None:
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import goblean, goblean.cli\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'elapsed': elapsed, 'heavy': heavy}))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(out)
+    assert result["heavy"] == []
+    assert result["elapsed"] < IMPORT_BUDGET, result
@@ -0,0 +1,35 @@
+import json
+from pathlib import Path
+
+from goblean import instrument
+
+
+def test_hooks_are_noops_when_disabled() -> None:
+    assert instrument.active() is None
+    instrument.count("events")
+    with instrument.stage("normalize"):
+        pass
+    instrument.sample_memory("ingest")
+    assert instrument.active() is None
+
+
+def test_collect_counters_stages_and_outputs(tmp_path: Path) -> None:
+    with instrument.collect() as metrics:
+        instrument.count("events", 3)
+        instrument.count("events")
+        for _ in range(2):
+            with instrument.stage('nor"malize'):
+                pass
+        instrument.sample_memory("ingest")
+    assert instrument.active() is None
+
+    data = metrics.to_json()
+    assert data["counters"] == {"events": 4}
+    assert data["stages"]['nor"malize']["calls"] == 2
+    assert data["peak_rss_bytes"] >= data["memory"]["ingest"] > 0
+
+    metrics.write(tmp_path, prometheus=True)
+    assert json.loads((tmp_path / "run_metrics.json").read_text())["counters"]["events"] == 4
+    prom = (tmp_path / "run_metrics.prom").read_text()
+    assert "# TYPE goblean_events_total counter\ngoblean_events_total 4\n" in prom
+    assert 'goblean_stage_calls_total{stage="nor\\"malize"} 2' in prom
@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import pytest
+
+from goblean.lsh import MinHasher, ShapeIndex, similarity
+
+BASE = [f"/v1/beacon p{i}" for i in range(20)]
+
+
+def test_signature_similarity_estimates_jaccard() -> None:
+    hasher = MinHasher(num_perm=128)
+    a = hasher.signature(BASE)
+    assert similarity(a, hasher.signature(reversed(BASE))) == 1.0
+    near = similarity(a, hasher.signature(BASE[:18] + ["/v1/beacon x", "/v1/beacon y"]))
+    assert 0.6 < near < 0.95  # Jaccard 18/22
+    assert similarity(a, hasher.signature(["/other q"])) < 0.1
+
+
+def test_index_scores_batches_incrementally(tmp_path: Path) -> None:
+    path = tmp_path / "lsh.sqlite"
+    first = ShapeIndex(path).score_and_add({"s1": BASE, "s2": BASE})
+    assert first["s1"].novelty == first["s2"].novelty == 1.0
+    assert first["s1"].session_id is None
+
+    index = ShapeIndex(path)
+    assert len(index) == 1
+    matches = index.score_and_add(
+        {
+            "s3": BASE,
+            "s4": BASE + ["/v1/beacon debug"],
+            "s5": ["/v2/other a", "/v2/other b"],
+        }
+    )
+    assert matches["s3"].novelty == 0.0 and matches["s3"].session_id == "s1"
+    assert 0.0 < matches["s4"].novelty < 0.5 and matches["s4"].session_id == "s1"
+    assert matches["s5"].novelty == 1.0
+    assert len(index) == 3
+
+
+def test_rerunning_a_batch_keeps_its_scores(tmp_path: Path) -> None:
+    index = ShapeIndex(tmp_path / "lsh.sqlite")
+    index.score_and_add({"s1": BASE})
+    batch = {"s2": BASE + ["/v1/beacon debug"], "s3": ["/v2/other a"]}
+    first = index.score_and_add(batch)
+    again = index.score_and_add(batch)
+    assert {sid: vars(m) for sid, m in again.items()} == {
+        sid: vars(m) for sid, m in first.items()
+    }
+    assert again["s3"].novelty == 1.0
+    assert len(index) == 3
+    with index._transaction() as con:
+        counts = [n for (n,) in con.execute("SELECT n FROM shapes ORDER BY n")]
+    assert counts == [1, 1, 1]
+
+
+def test_reused_session_ids_are_rescored_and_old_scores_pruned(tmp_path: Path) -> None:
+    index = ShapeIndex(tmp_path / "lsh.sqlite", keep_batches=2)
+    index.score_and_add({"s1": BASE})
+    # The same id with another shape, e.g. from a later file, is scored again.
+    changed = index.score_and_add({"s1": ["/v2/other a"]})
+    assert changed["s1"].novelty == 1.0
+    assert len(index) == 2
+
+    index.score_and_add({"s2": BASE})
+    with index._transaction() as con:
+        kept = sorted(sid for (sid,) in con.execute("SELECT session_id FROM scores"))
+    assert kept == ["s1", "s2"]  # the first batch's score was dropped
+    again = index.score_and_add({"s1": BASE})
+    assert again["s1"].novelty == 0.0  # pruned, so matched against the index
+
+
+def test_index_rejects_other_settings(tmp_path: Path) -> None:
+    path = tmp_path / "lsh.sqlite"
+    ShapeIndex(path)
+    with pytest.raises(ValueError):
+        ShapeIndex(path, num_perm=32, bands=8)
@@ -0,0 +1,115 @@
+import json
+from pathlib import Path
+
+from goblean import cli, pipeline
+from goblean.report import write_baseline_csvs
+
+
+def _entry(query: dict, ua: str = "Roku/1") -> dict:
+    return {
+        "request": {
+            "url": "https://t.example/beacon",
+            "method": "GET",
+            "headers": [{"name": "User-Agent", "value": ua}],
+            "queryString": [{"name": k, "value": v} for k, v in query.items()],
+        }
+    }
+
+
+def _har(path: Path, entries) -> Path:
+    path.write_text(json.dumps({"log": {"entries": entries}}), encoding="utf-8")
+    return path
+
+
+def _spec(specs: Path) -> None:
+    specs.mkdir()
+    (specs / "A.yaml").write_text(
+        json.dumps(
+            {
+                "rule_id": "A",
+                "scope": {"platforms": ["roku"]},
+                "checks": [{"non_decreasing_playhead": True}],
+            }
+        ),
+        encoding="utf-8",
+    )
+
+
+def test_run_streams_hars_into_requested_outputs(tmp_path: Path, doc_store) -> None:
+    hars = tmp_path / "hars"
+    hars.mkdir()
+    _har(hars / "a.har", [_entry({"ts": "10", "playhead": "1"}), _entry({"ts": "20", "playhead": "2"})])
+    _har(hars / "b.har", [_entry({"ts": "30", "playhead": "5"}), _entry({"ts": "40", "playhead": "4"})])
+    _spec(tmp_path / "specs")
+    out = tmp_path / "out"
+
+    summary = pipeline.run([hars], out, specs_dir=tmp_path / "specs")
+
+    assert summary["har_files"] == 2
+    assert summary["entries"] == 4
+    assert summary["schema_errors"] == 0
+    assert summary["metrics"]["count"] == 4
+    assert json.loads((out / "run_summary.json").read_text())["entries"] == 4
+    # Each HAR file is its own session: a.har passes, b.har goes backwards.
+    shadow = json.loads((out / "shadow_eval.json").read_text())
+    assert shadow["A"]["roku"]["sessions"] == 2
+    assert shadow["A"]["roku"]["violations"] == 1
+    dictionary = json.loads((out / "dictionary.json").read_text())
+    assert dictionary["ts"]["seen"] == 4
+    assert (out / "metrics_daily.csv").exists()
+    assert not (out / "canonical.jsonl").exists()
+
+    # The streamed reports match the file-based path over the same envelopes.
+    only = tmp_path / "only"
+    pipeline.run([hars / "a.har"], only, outputs=["canonical", "reports"])
+    assert not (only / "shadow_eval.json").exists()
+    assert not (only / "run_summary.json").exists()
+    canonical = only / "canonical.jsonl"
+    assert len(canonical.read_text().splitlines()) == 2
+    ref = tmp_path / "ref"
+    write_baseline_csvs(canonical, ref)
+    assert (only / "metrics_daily.csv").read_text() == (ref / "metrics_daily.csv").read_text()
+
+
+def test_run_skips_invalid_envelopes(tmp_path: Path, monkeypatch) -> None:
+    har = _har(tmp_path / "a.har", [_entry({"ts": "1"}), _entry({"ts": "2"})])
+    envelopes = iter([{"params": {}, "headers": {}}, {"params": {}}])
+    monkeypatch.setattr(pipeline, "canonical_envelope", lambda entry: next(envelopes))
+
+    summary = pipeline.run([har], tmp_path / "out", outputs=["metrics"])
+
+    assert summary["entries"] == 1
+    assert summary["schema_errors"] == 1
+    assert summary["errors"][0][:2] == ["a.har", 2]
+
+
+def test_cli_keeps_folder_count_and_adds_run(tmp_path: Path, capsys, doc_store) -> None:
+    hars = tmp_path / "hars"
+    hars.mkdir()
+    _har(hars / "a.har", [_entry({"ts": "1", "playhead": "1"}), _entry({"ts": "2", "playhead": "0"})])
+    _spec(tmp_path / "specs")
+    cli.main([str(hars)])
+    assert capsys.readouterr().out.strip() == "Ingested 1 HAR files"
+
+    out = tmp_path / "out"
+    cli.main(["run", str(hars), "--out", str(out), "--specs", str(tmp_path / "specs")])
+    assert json.loads(capsys.readouterr().out)["entries"] == 2
+    for name in ["run_summary.json", "dictionary.json", "shadow_eval.json", "metrics_daily.csv"]:
+        assert (out / name).exists(), name
+    assert json.loads((out / "shadow_eval.json").read_text())["A"]["roku"]["violations"] == 1
+    assert not (out / "canonical.jsonl").exists()
+
+
+def test_run_cli_writes_stage_metrics(tmp_path: Path, capsys, doc_store) -> None:
+    _har(tmp_path / "a.har", [_entry({"ts": "1"}), _entry({"ts": "2"})])
+    out = tmp_path / "out"
+    cli.main(["run", str(tmp_path), "--out", str(out), "--specs", str(tmp_path), "--prometheus"])
+    capsys.readouterr()
+
+    metrics = json.loads((out / "run_metrics.json").read_text())
+    assert metrics["counters"]["events"] == 2
+    assert metrics["counters"]["har_files"] == 1
+    for stage in ["ingest", "normalize", "schema_check", "fingerprint", "dictionary", "report"]:
+        assert stage in metrics["stages"], stage
+    assert metrics["stages"]["normalize"]["calls"] == 2
+    assert "goblean_events_total 2" in (out / "run_metrics.prom").read_text()
@@ -0,0 +1,53 @@
+import json
+import pstats
+import threading
+import tracemalloc
+from pathlib import Path
+
+from goblean import cli, instrument, profiling
+
+
+def test_sampler_tags_stacks_with_open_stages() -> None:
+    sampler = profiling.StackSampler("run")
+    entered = threading.Event()
+    release = threading.Event()
+
+    def work() -> None:
+        with instrument.stage("normalize"):
+            entered.set()
+            release.wait()
+
+    with instrument.collect():
+        worker = threading.Thread(target=work)
+        worker.start()
+        entered.wait()
+        sampler.sample()
+        release.set()
+        worker.join()
+
+    assert any(
+        stack.startswith("run;stage:normalize;") and ":work;" in stack
+        for stack in sampler.counts
+    ), list(sampler.counts)
+
+
+def test_profile_option_writes_profiles(tmp_path: Path, capsys) -> None:
+    (tmp_path / "a.har").write_text(json.dumps({"log": {"entries": []}}))
+    profile_dir = tmp_path / "profile"
+
+    # The positional input may follow --profile, which takes no value.
+    cli.main(["--profile", str(tmp_path), "--profile-dir", str(profile_dir)])
+
+    assert capsys.readouterr().out.strip() == "Ingested 1 HAR files"
+    stats = pstats.Stats(str(profile_dir / "ingest.pstats"))
+    assert any(func[2] == "read_har" for func in stats.stats)
+    assert (profile_dir / "ingest.collapsed").exists()
+    assert not (profile_dir / "ingest.alloc.txt").exists()
+    assert not tracemalloc.is_tracing()
+    stages = json.loads((profile_dir / "ingest.stages.json").read_text())
+    assert stages["memory"]["ingest"] > 0
+    assert instrument.active() is None
+
+    cli.main([str(tmp_path), "--profile-allocations", "--profile-dir", str(profile_dir)])
+    assert (profile_dir / "ingest.alloc.txt").read_text().startswith("traced current=")
+    assert not tracemalloc.is_tracing()
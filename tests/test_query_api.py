@@ -0,0 +1,92 @@
+import csv
+import json
+import os
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from goblean.dag import STATE_FILE
+from goblean.query_api import ReportTables, create_app
+
+VIOLATIONS = [
+    "session_id",
+    "event_id",
+    "platform",
+    "sdk",
+    "version_guess",
+    "rule_id",
+    "fail_code",
+    "severity",
+    "ts",
+]
+
+
+def _write(path: Path, header, rows) -> None:
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def _finish_run(out_dir: Path, run: int) -> None:
+    state = out_dir / STATE_FILE
+    state.write_text(json.dumps({"run": run}), encoding="utf-8")
+    os.utime(state, ns=(run * 10**9, run * 10**9))
+
+
+def _violations(n: int):
+    return [
+        [f"s{i}", str(i), ["roku", "ios"][i % 2], "hb", "1.0", f"r{i % 3}", "F", "high", str(i)]
+        for i in range(n)
+    ]
+
+
+def test_filters_and_keyset_pages(tmp_path: Path) -> None:
+    _write(tmp_path / "violations.csv", VIOLATIONS, _violations(50))
+    _write(
+        tmp_path / "rules_index.csv",
+        ["rule_id", "scope_platforms", "scope_sdks"],
+        [["r0", "roku|ios", "hb"], ["r1", "android", ""]],
+    )
+    _finish_run(tmp_path, 1)
+    client = TestClient(create_app(ReportTables(tmp_path)))
+
+    seen = []
+    params = {"platform": "roku", "rule": "r0", "limit": 3}
+    while True:
+        page = client.get("/violations", params=params).json()
+        seen.extend(item["session_id"] for item in page["items"])
+        if page["next"] is None:
+            break
+        params["cursor"] = page["next"]
+    assert seen == [f"s{i}" for i in range(50) if i % 2 == 0 and i % 3 == 0]
+
+    rules = client.get("/rules_index", params={"platform": "ios"}).json()["items"]
+    assert [r["rule_id"] for r in rules] == ["r0"]
+    assert client.get("/violations", params={"color": "red"}).status_code == 400
+    assert client.get("/nope").status_code == 404
+    assert client.get("/dictionary").status_code == 404
+
+
+def test_cache_is_invalidated_when_reports_change(tmp_path: Path) -> None:
+    _write(tmp_path / "violations.csv", VIOLATIONS, _violations(4))
+    _finish_run(tmp_path, 1)
+    tables = ReportTables(tmp_path)
+    client = TestClient(create_app(tables))
+    first = client.get("/violations", params={"limit": 2}).json()
+    assert len(first["items"]) == 2
+    assert client.get("/violations", params={"limit": 2}).json() == first
+
+    # A CSV rewritten without a new pipeline state is still picked up.
+    _write(tmp_path / "violations.csv", VIOLATIONS, _violations(1))
+    os.utime(tmp_path / "violations.csv", ns=(5 * 10**9, 5 * 10**9))
+    assert client.get("/violations", params={"limit": 2}).json() == {
+        "items": [dict(zip(VIOLATIONS, _violations(1)[0]))],
+        "next": None,
+    }
+    stale = client.get("/violations", params={"limit": 2, "cursor": first["next"]})
+    assert stale.status_code == 410
+    assert client.get("/health").json()["generation"] == 2
+
+    _finish_run(tmp_path, 3)
+    assert client.get("/health").json()["generation"] == 3
@@ -5,6 +5,10 @@ import urllib.error
 from pathlib import Path
 
 import goblean.report as report
+from goblean import doc_cache
+from goblean.aggregate import Aggregator, feed
+from goblean.dag import dependencies
+from goblean.doc_cache import DocCacheStore
 from goblean.report import (
     metrics_from_canonical,
     schedule_doc_cache_verification,
@@ -28,31 +32,48 @@ def test_metrics_from_canonical(tmp_path: Path) -> None:
     assert metrics["non_decreasing_playhead"] is True
 
 
-def test_write_baseline_csvs(tmp_path: Path) -> None:
+def test_metrics_from_canonical_extra_aggregators(tmp_path: Path) -> None:
+    class MaxPlayhead(Aggregator):
+        def __init__(self) -> None:
+            self.value = None
+
+        def update(self, env):
+            ph = env.get("params", {}).get("playhead")
+            if ph is not None:
+                self.value = ph if self.value is None else max(self.value, ph)
+
+        def result(self):
+            return {"max_playhead": self.value}
+
+    path = tmp_path / "canonical.jsonl"
+    with path.open("w", encoding="utf-8") as f:
+        for env in [{"params": {"ts": 0, "playhead": 3}}, {"params": {"ts": 2, "playhead": 1}}]:
+            f.write(json.dumps(env) + "\n")
+    metrics = metrics_from_canonical(path, extra=[MaxPlayhead()])
+    assert metrics["count"] == 2
+    assert metrics["cadence"] == 2.0
+    assert metrics["non_decreasing_playhead"] is False
+    assert metrics["max_playhead"] == 3
+
+
+def test_write_baseline_csvs(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                }
-            },
-            f,
-        )
-    with doc_cache_path.open("r", encoding="utf-8") as f:
-        cache_before = json.load(f)
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+            }
+        },
+    )
+    cache_before = doc_store.items()
     prev_last_verified = cache_before["cached://docs/playhead-monotonicity"]["last_verified"]
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
-    with doc_cache_path.open("r", encoding="utf-8") as f:
-        cache_after = json.load(f)
+    cache_after = doc_store.items()
     new_last_verified = cache_after["cached://docs/playhead-monotonicity"]["last_verified"]
     assert new_last_verified != prev_last_verified
     metrics_path = out_dir / "metrics_daily.csv"
@@ -94,10 +115,39 @@ def test_write_baseline_csvs(tmp_path: Path) -> None:
     assert rules_rows[1][10] == "https://example.com/playhead-monotonicity"
     assert rules_rows[1][11] == "2024-01-01T00:00:00Z"
     assert rules_rows[1][12] == new_last_verified
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
+
+
+def test_write_baseline_csvs_single_scan(
+    tmp_path: Path, monkeypatch, doc_store: DocCacheStore
+) -> None:
+    class EventCount(Aggregator):
+        def __init__(self, source: str) -> None:
+            self.n = 0
+
+        def update(self, env):
+            self.n += 1
+
+        def result(self):
+            return {"rows": [[self.n]]}
+
+    canonical = tmp_path / "canonical.jsonl"
+    with canonical.open("w", encoding="utf-8") as f:
+        for i in range(3):
+            f.write(json.dumps({"params": {"ts": i, "playhead": i}}) + "\n")
+    opened: list[Path] = []
+    original_iter = report.iter_canonical
+
+    def counting_iter(path):
+        opened.append(path)
+        return original_iter(path)
+
+    monkeypatch.setattr(report, "iter_canonical", counting_iter)
+    monkeypatch.setitem(report.BASELINE_REPORTS, "event_count.csv", (["n"], EventCount))
+    metrics = write_baseline_csvs(canonical, tmp_path / "out")
+    assert opened == [canonical]
+    assert metrics["count"] == 3
+    rows = list(csv.reader((tmp_path / "out" / "event_count.csv").open("r", encoding="utf-8")))
+    assert rows == [["n"], ["3"]]
 
 
 def test_schedule_doc_cache_verification(monkeypatch) -> None:
@@ -114,33 +164,22 @@ def test_schedule_doc_cache_verification(monkeypatch) -> None:
     assert len(calls) >= 2
 
 
-def test_write_baseline_csvs_backfills_doc_cache(tmp_path: Path) -> None:
+def test_write_baseline_csvs_backfills_doc_cache(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    if doc_cache_path.exists():
-        doc_cache_path.unlink()
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
-    assert doc_cache_path.exists()
-    with doc_cache_path.open("r", encoding="utf-8") as f:
-        cache = json.load(f)
+    assert doc_store.path.exists()
+    cache = doc_store.items()
     entry = cache["cached://docs/playhead-monotonicity"]
     assert entry["first_seen"]
     assert entry["last_verified"]
     assert entry["reachable"] is True
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
 
 
 def test_verify_doc_cache_handles_unreachable(tmp_path: Path, monkeypatch) -> None:
-    cache_path = tmp_path / "cache.json"
-    cache_path.write_text(
+    (tmp_path / "cache.json").write_text(
         json.dumps(
             {
                 "cached://unreachable": {
@@ -152,14 +191,14 @@ def test_verify_doc_cache_handles_unreachable(tmp_path: Path, monkeypatch) -> No
         )
     )
 
-    def raise_error(req):  # pragma: no cover - network unreachable
+    def raise_error(req, timeout=None):
         raise urllib.error.URLError("unreachable")
 
-    monkeypatch.setattr(report.urllib.request, "urlopen", raise_error)
-    results = report.verify_doc_cache(cache_path)
+    monkeypatch.setattr(doc_cache, "urlopen", raise_error)
+    # The legacy JSON next to the store is imported on first use.
+    results = report.verify_doc_cache(tmp_path / "cache.sqlite", retries=0)
     assert results["cached://unreachable"] is False
-    with cache_path.open("r", encoding="utf-8") as f:
-        updated = json.load(f)
+    updated = DocCacheStore(tmp_path / "cache.sqlite").items()
     assert (
         updated["cached://unreachable"]["last_verified"]
         == "2024-01-01T00:00:00Z"
@@ -167,25 +206,20 @@ def test_verify_doc_cache_handles_unreachable(tmp_path: Path, monkeypatch) -> No
     assert updated["cached://unreachable"].get("reachable") is False
 
 
-def test_skip_unreachable_doc_cache_entries(tmp_path: Path) -> None:
+def test_skip_unreachable_doc_cache_entries(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                    "reachable": False,
-                }
-            },
-            f,
-        )
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+                "reachable": False,
+            }
+        },
+    )
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
     rows = list(csv.reader((out_dir / "rules_index.csv").open("r", encoding="utf-8")))
@@ -196,31 +230,22 @@ def test_skip_unreachable_doc_cache_entries(tmp_path: Path) -> None:
     assert rows[1][10] == ""
     assert rows[1][11] == ""
     assert rows[1][12] == ""
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
 
 
-def test_flag_unreachable_doc_cache_entries(tmp_path: Path) -> None:
+def test_flag_unreachable_doc_cache_entries(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                    "reachable": False,
-                }
-            },
-            f,
-        )
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+                "reachable": False,
+            }
+        },
+    )
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
     rows = list(csv.reader((out_dir / "unreachable_docs.csv").open("r", encoding="utf-8")))
@@ -231,31 +256,22 @@ def test_flag_unreachable_doc_cache_entries(tmp_path: Path) -> None:
         )
     )
     assert notes[1][0] == "cached://docs/playhead-monotonicity"
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
 
 
-def test_escalate_unreachable_doc_cache_entries(tmp_path: Path) -> None:
+def test_escalate_unreachable_doc_cache_entries(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                    "reachable": False,
-                }
-            },
-            f,
-        )
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+                "reachable": False,
+            }
+        },
+    )
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
     rows = list(
@@ -264,31 +280,22 @@ def test_escalate_unreachable_doc_cache_entries(tmp_path: Path) -> None:
         )
     )
     assert rows[1][0] == "cached://docs/playhead-monotonicity"
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
 
 
-def test_summarize_escalated_citations(tmp_path: Path) -> None:
+def test_summarize_escalated_citations(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                    "reachable": False,
-                }
-            },
-            f,
-        )
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+                "reachable": False,
+            }
+        },
+    )
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
     rows = list(
@@ -319,31 +326,22 @@ def test_summarize_escalated_citations(tmp_path: Path) -> None:
         "unreachable_citations_trend",
     ]
     assert history_rows[1][1:] == ["1", "1", "1", "1", "1", "1"]
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
 
 
-def test_analyze_trend_history_patterns(tmp_path: Path) -> None:
+def test_analyze_trend_history_patterns(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                    "reachable": False,
-                }
-            },
-            f,
-        )
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+                "reachable": False,
+            }
+        },
+    )
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
     write_baseline_csvs(canonical, out_dir)
@@ -356,31 +354,22 @@ def test_analyze_trend_history_patterns(tmp_path: Path) -> None:
     assert rows[3] == ["unreachable_citations_trend_avg", "0.50"]
     html = (out_dir / "weekly_report_analysis.html").read_text(encoding="utf-8")
     assert "escalated_citations_trend_avg: 0.50" in html
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
 
 
-def test_distribute_weekly_report(tmp_path: Path) -> None:
+def test_distribute_weekly_report(tmp_path: Path, doc_store: DocCacheStore) -> None:
     canonical = tmp_path / "canonical.jsonl"
     with canonical.open("w", encoding="utf-8") as f:
         f.write(json.dumps({"params": {"ts": 0, "playhead": 0}}) + "\n")
-    doc_cache_path = Path("docs/doc_cache.json")
-    doc_cache_path.parent.mkdir(exist_ok=True)
-    original = doc_cache_path.read_text(encoding="utf-8") if doc_cache_path.exists() else None
-    with doc_cache_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            {
-                "cached://docs/playhead-monotonicity": {
-                    "source_url": "https://example.com/playhead-monotonicity",
-                    "first_seen": "2024-01-01T00:00:00Z",
-                    "last_verified": "2024-01-01T00:00:00Z",
-                    "reachable": False,
-                }
-            },
-            f,
-        )
+    doc_store.upsert_many(
+        {
+            "cached://docs/playhead-monotonicity": {
+                "source_url": "https://example.com/playhead-monotonicity",
+                "first_seen": "2024-01-01T00:00:00Z",
+                "last_verified": "2024-01-01T00:00:00Z",
+                "reachable": False,
+            }
+        },
+    )
     out_dir = tmp_path / "out"
     write_baseline_csvs(canonical, out_dir)
     queue_path = out_dir / "distribution_queue.csv"
@@ -418,7 +407,118 @@ def test_distribute_weekly_report(tmp_path: Path) -> None:
     report_html = (out_dir / "weekly_report.html").read_text(encoding="utf-8")
     assert "<h2>Delivery Success Trends</h2>" in report_html
     assert "1.00" in report_html
-    if original is None:
-        doc_cache_path.unlink()
-    else:
-        doc_cache_path.write_text(original, encoding="utf-8")
+
+
+def test_weekly_report_is_rendered_once_after_delivery_analysis(
+    tmp_path: Path, doc_store: DocCacheStore, monkeypatch
+) -> None:
+    canonical = tmp_path / "canonical.jsonl"
+    canonical.write_text(json.dumps({"params": {"ts": 0}}) + "\n", encoding="utf-8")
+    out_dir = tmp_path / "out"
+    queued = []
+    writes = []
+    queue_weekly_report = report.queue_weekly_report
+    write = report.HtmlReport.write
+
+    def queue(out_dir: Path) -> None:
+        queued.append((out_dir / "weekly_report.html").exists())
+        queue_weekly_report(out_dir)
+
+    def counting_write(self, path: Path) -> str:
+        writes.append(path.name)
+        return write(self, path)
+
+    monkeypatch.setattr(report, "queue_weekly_report", queue)
+    monkeypatch.setattr(report.HtmlReport, "write", counting_write)
+    write_baseline_csvs(canonical, out_dir)
+    assert queued == [False]  # only the path is queued
+    assert writes.count("weekly_report.html") == 1
+    final = (out_dir / "weekly_report.html").read_text(encoding="utf-8")
+    assert report.WEEKLY_REPORT_TITLE in final
+    assert final.count("<h2>Delivery Success Trends</h2>") == 1
+
+
+def test_report_steps_skip_unchanged_reports(
+    tmp_path: Path, doc_store: DocCacheStore
+) -> None:
+    out_dir = tmp_path / "out"
+    for _ in range(3):
+        status = report.write_baseline_reports({}, out_dir)
+    for name in [
+        "notify_unreachable_docs",
+        "escalate_unreachable_docs",
+        "summarize_escalations",
+        "analyze_trend_history",
+    ]:
+        assert status[name] == "skipped"
+    # History and distribution stages record every run.
+    for name in ["record_weekly_history", "queue_weekly_report", "analyze_delivery_success"]:
+        assert status[name] == "ran"
+    history_rows = list(
+        csv.reader((out_dir / "weekly_report_history.csv").open("r", encoding="utf-8"))
+    )
+    assert len(history_rows) == 4
+
+    deps = dependencies(report.report_steps())
+    assert deps["queue_weekly_report"] == set()
+    assert deps["render_weekly_report"] >= {
+        "summarize_escalations",
+        "analyze_delivery_success",
+    }
+
+
+def test_metrics_daily_groups_by_date_and_fingerprint(tmp_path: Path) -> None:
+    roku = {"User-Agent": "Roku/9", "X-SDK-Name": "hb-api", "X-SDK-Version": "3.6.0"}
+    agg = report.MetricsDaily("canonical.jsonl")
+    feed(
+        [
+            {"headers": roku, "params": {"sid": "a", "ts": "0"}},
+            {"headers": roku, "params": {"sid": "b", "ts": "60"}},
+            {"headers": roku, "params": {"sid": "a", "ts": "86400"}},
+            {"headers": {}, "params": {"ts": "nan"}},
+        ],
+        [agg],
+    )
+    rows = agg.result()["rows"]
+    assert [row[:4] + row[-2:] for row in rows] == [
+        ["", "unknown", "unknown", "0.0.0-virtual", 1, ""],
+        ["1970-01-01", "roku", "hb-api", "3.6.0", 2, ""],
+        ["1970-01-02", "roku", "hb-api", "3.6.0", 1, ""],
+    ]
+
+    report.write_partitioned_csv(tmp_path / "metrics_daily", report.BASELINE_REPORTS["metrics_daily.csv"][0], rows)
+    part = tmp_path / "metrics_daily" / "date=1970-01-01" / "metrics_daily.csv"
+    part_rows = list(csv.reader(part.open("r", encoding="utf-8")))
+    assert part_rows[0][0] == "platform"
+    assert part_rows[1][:3] == ["roku", "hb-api", "3.6.0"]
+    assert (tmp_path / "metrics_daily" / "date=unknown" / "metrics_daily.csv").exists()
+
+    # A rerun without the unknown-date rows drops their stale partition.
+    report.write_partitioned_csv(
+        tmp_path / "metrics_daily", report.BASELINE_REPORTS["metrics_daily.csv"][0], rows[1:]
+    )
+    assert sorted(p.name for p in (tmp_path / "metrics_daily").iterdir()) == [
+        "date=1970-01-01",
+        "date=1970-01-02",
+    ]
+
+
+def test_distribution_stages_process_only_new_reports(
+    tmp_path: Path, doc_store: DocCacheStore
+) -> None:
+    canonical = tmp_path / "canonical.jsonl"
+    canonical.write_text(json.dumps({"params": {"ts": 0}}) + "\n", encoding="utf-8")
+    out_dir = tmp_path / "out"
+    write_baseline_csvs(canonical, out_dir)
+    write_baseline_csvs(canonical, out_dir)
+    for name in ["distribution_queue.csv", "distribution_receipts.csv"]:
+        rows = list(csv.reader((out_dir / name).open("r", encoding="utf-8")))
+        assert len(rows) == 3
+    rows = list(csv.reader((out_dir / "distribution_success.csv").open("r", encoding="utf-8")))
+    assert rows[1] == ["1", "1", "1.00"]
+    assert report.distribution_log(out_dir, "distribution_schedule.csv").lag("deliver") == 0
+
+    report.queue_weekly_report(out_dir)
+    assert report.schedule_distribution(out_dir) == 1
+    assert report.deliver_scheduled_reports(out_dir, workers=2) == 1
+    assert report.record_delivery_receipts(out_dir) == 1
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from goblean import rules
+
+
+def _age(path: Path, seconds: int = 10) -> None:
+    """Backdate *path* so the cache treats it as settled."""
+
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_fixture_counts_single_listing(tmp_path: Path) -> None:
+    rules.clear_cache()
+    for name in [
+        "R1__pass__a.har",
+        "R1__pass__b.har",
+        "R1__fail__a.har",
+        "R2__fail__x.har",
+        "R2__pass__notes.txt",
+        "README.md",
+    ]:
+        (tmp_path / name).write_text("{}")
+    _age(tmp_path)
+    assert rules.fixture_counts(tmp_path) == {
+        "R1": {"pass": 2, "fail": 1},
+        "R2": {"pass": 0, "fail": 1},
+    }
+
+    # A cached listing is reused while the directory is unchanged.
+    (tmp_path / "R2__pass__y.har").write_text("{}")
+    _age(tmp_path)
+    assert rules.fixture_counts(tmp_path)["R2"] == {"pass": 1, "fail": 1}
+    assert rules.fixture_counts(tmp_path) is rules.fixture_counts(tmp_path)
+
+
+def test_load_specs_hot_reloads_changed_files(tmp_path: Path) -> None:
+    rules.clear_cache()
+    spec_path = tmp_path / "R1.yaml"
+    spec_path.write_text(json.dumps({"rule_id": "R1"}))
+    (tmp_path / "R0.yaml").write_text(json.dumps({"rule_id": "R0"}))
+    _age(spec_path, 20)
+    _age(tmp_path / "R0.yaml", 20)
+
+    first = rules.load_specs(tmp_path)
+    assert [spec["rule_id"] for _, spec in first] == ["R0", "R1"]
+    assert rules.load_specs(tmp_path)[1][1] is first[1][1]
+
+    spec_path.write_text(json.dumps({"rule_id": "R1", "scope": {"platforms": ["roku"]}}))
+    _age(spec_path, 5)
+    reloaded = dict((p.name, s) for p, s in rules.load_specs(tmp_path))
+    assert reloaded["R1.yaml"]["scope"] == {"platforms": ["roku"]}
+
+    (tmp_path / "R0.yaml").unlink()
+    assert [p.name for p, _ in rules.load_specs(tmp_path)] == ["R1.yaml"]
@@ -3,6 +3,8 @@ import subprocess
 import sys
 from pathlib import Path
 
+import pytest
+
 
 def test_schema_check_accepts_valid_envelope(tmp_path: Path) -> None:
     env = {"url": "https://example.com", "method": "GET", "headers": {}, "params": {}}
@@ -27,3 +29,92 @@ def test_schema_check_rejects_invalid_envelope(tmp_path: Path) -> None:
         text=True,
     )
     assert result.returncode != 0
+
+
+def test_check_file_reports_line_numbers(tmp_path: Path) -> None:
+    from goblean.schema_check import check_file
+
+    valid = json.dumps({"headers": {}, "params": {}})
+    path = tmp_path / "env.jsonl"
+    path.write_text(
+        "\n".join([valid, "", json.dumps({"url": 1}), "{not json", valid]) + "\n"
+    )
+    result = check_file(path, batch_size=2)
+    assert result.count == 2
+    assert [line for line, _ in result.errors] == [3, 4]
+    assert "headers" in result.errors[0][1]
+
+
+def test_batch_rejects_lines_that_only_parse_when_joined() -> None:
+    from goblean.schema_check import validate_batch
+
+    env = '{"headers": {}, "params": {}}'
+    # Three lines, three envelopes, but only the last line is one envelope:
+    # the first holds two and the next two split one between them.
+    lines = [
+        f"{env}, {env}",
+        '{"headers": {}, "params": {"s": "',
+        '"}}',
+        env,
+    ]
+    result = validate_batch([(n, line.encode()) for n, line in enumerate(lines, start=1)])
+    assert result.count == 1
+    assert [line for line, _ in result.errors] == [1, 2, 3]
+
+
+def test_validate_file_raises_with_line_number(tmp_path: Path) -> None:
+    from goblean.schema_check import SchemaCheckError, validate_file
+
+    valid = json.dumps({"headers": {}, "params": {}})
+    path = tmp_path / "env.jsonl"
+    path.write_text("\n".join([valid, valid, json.dumps({"params": {}})]) + "\n")
+    with pytest.raises(SchemaCheckError, match="^line 3:") as exc_info:
+        validate_file(path)
+    assert exc_info.value.errors[0][0] == 3
+
+
+def test_split_ranges_are_newline_aligned(tmp_path: Path) -> None:
+    from goblean.schema_check import split_ranges
+
+    path = tmp_path / "env.jsonl"
+    path.write_bytes(b"".join(b"%d\n" % i * (i % 7 + 1) for i in range(100)))
+    data = path.read_bytes()
+    ranges = split_ranges(path, 8)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[end - 1 : end] == b"\n"
+
+
+def test_parallel_check_matches_sequential(tmp_path: Path, monkeypatch) -> None:
+    import goblean.schema_check as schema_check
+
+    valid = json.dumps({"headers": {}, "params": {}})
+    lines = [valid] * 60
+    for i in (3, 17, 18, 41):
+        lines[i] = json.dumps({"url": 1})
+    lines[25] = ""
+    path = tmp_path / "env.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+
+    monkeypatch.setattr(schema_check, "MIN_RANGE_BYTES", 64)
+    for max_errors in (None, 2, 1):
+        sequential = schema_check.check_file(path, 4, max_errors)
+        parallel = schema_check.check_file(path, 4, max_errors, workers=3)
+        assert parallel.count == sequential.count
+        assert parallel.errors == sequential.errors
+    assert [line for line, _ in sequential.errors] == [4]
+
+
+def test_schema_check_fail_fast(tmp_path: Path) -> None:
+    path = tmp_path / "env.jsonl"
+    path.write_text("\n".join([json.dumps({"url": 1})] * 3) + "\n")
+    result = subprocess.run(
+        [sys.executable, "-m", "goblean.schema_check", str(path), "--fail-fast"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert f"{path}:1:" in result.stderr
+    assert f"{path}:2:" not in result.stderr
@@ -0,0 +1,106 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from goblean.ingest.har_stream import HarStreamParser
+from goblean.service import IngestService, ShardedStore, create_app
+from goblean.synth import synthetic_har
+
+
+def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.mark.parametrize("size", [1, 13, 1 << 20])
+@pytest.mark.parametrize("compress", [False, True])
+def test_parser_yields_entries_across_chunk_boundaries(size: int, compress: bool) -> None:
+    har = synthetic_har(sessions=2, events_per_session=3, body_bytes=64)
+    # Decoys for a scanner that matched text rather than structure.
+    har["log"]["creator"]["comment"] = '"entries": [{"x": 1}]'
+    har["log"]["pages"] = [{"id": "entries", "title": "a]b\\"}]
+    data = json.dumps(har).encode("utf-8")
+    if compress:
+        data = gzip.compress(data)
+    parser = HarStreamParser()
+    entries = []
+    for chunk in _chunks(data, size):
+        entries.extend(parser.feed(chunk))
+    entries.extend(parser.close())
+    assert entries == har["log"]["entries"]
+
+
+def test_parser_rejects_truncated_documents() -> None:
+    data = json.dumps(synthetic_har(sessions=1, events_per_session=2)).encode("utf-8")
+    parser = HarStreamParser()
+    assert len(parser.feed(data[:-40])) == 1
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def _service(tmp_path: Path, **kwargs) -> IngestService:
+    return IngestService(ShardedStore(tmp_path / "store", shards=4), **kwargs)
+
+
+def test_upload_is_normalized_into_session_shards(tmp_path: Path) -> None:
+    service = _service(tmp_path, batch_size=7)
+    har = synthetic_har(sessions=5, events_per_session=6)
+    body = gzip.compress(json.dumps(har).encode("utf-8"))
+    with TestClient(create_app(service)) as client:
+        response = client.post(
+            "/ingest?source=cap.har",
+            content=_chunks(body, 512),
+            headers={"Content-Encoding": "gzip"},
+        )
+    assert response.status_code == 200
+    result = response.json()
+    assert len(result.pop("upload")) == 32
+    assert result == {
+        "source": "cap.har",
+        "entries": 30,
+        "stored": 30,
+        "schema_errors": 0,
+    }
+    shards = {}
+    for path in sorted((tmp_path / "store").glob("shard-*.jsonl")):
+        for line in path.read_text(encoding="utf-8").splitlines():
+            shards.setdefault(json.loads(line)["params"]["sid"], set()).add(path.name)
+    assert len(shards) == 5
+    assert all(len(names) == 1 for names in shards.values())
+
+
+def test_saturated_service_answers_429(tmp_path: Path) -> None:
+    service = _service(tmp_path, max_uploads=1)
+    body = json.dumps(synthetic_har(sessions=1, events_per_session=2)).encode("utf-8")
+    with TestClient(create_app(service)) as client:
+        assert service.try_admit()
+        response = client.post("/ingest", content=body)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"]
+        service.release()
+        assert client.post("/ingest", content=body).json()["stored"] == 2
+        assert client.post("/ingest", content=body[:-10]).status_code == 400
+        assert client.get("/health").json()["uploads"] == 0
+
+
+def test_failed_upload_stores_nothing(tmp_path: Path) -> None:
+    service = _service(tmp_path, batch_size=2)
+    body = json.dumps(synthetic_har(sessions=2, events_per_session=5)).encode("utf-8")
+    with TestClient(create_app(service)) as client:
+        response = client.post("/ingest", content=_chunks(body[:-10], 256))
+        assert response.status_code == 400
+        assert response.json()["stored"] == 0
+        assert response.json()["upload"]
+        assert not list((tmp_path / "store").rglob("*.jsonl"))
+
+        assert client.post("/ingest", content=body).json()["stored"] == 10
+    lines = [
+        line
+        for path in (tmp_path / "store").glob("shard-*.jsonl")
+        for line in path.read_text(encoding="utf-8").splitlines()
+    ]
+    assert len(lines) == 10
+    assert not list((tmp_path / "store" / ".staging").iterdir())
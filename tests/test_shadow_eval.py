@@ -0,0 +1,106 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from goblean.shadow_eval import Rule, shadow_eval, shadow_eval_rules, version_in_range
+
+
+def _write(path: Path, envs) -> Path:
+    path.write_text("".join(json.dumps(e) + "\n" for e in envs), encoding="utf-8")
+    return path
+
+
+def _env(sid: str, playhead: float, ua: str = "", version: str = "") -> dict:
+    headers = {"User-Agent": ua} if ua else {}
+    if version:
+        headers["X-SDK-Version"] = version
+    return {"params": {"sid": sid, "playhead": playhead}, "headers": headers}
+
+
+def test_version_in_range_and_scope() -> None:
+    assert version_in_range((), ">=1.0.0")
+    assert version_in_range((3, 6), "0.0.0-virtual")
+    assert version_in_range((3, 6), ">=3.0.0 <4.0.0")
+    assert not version_in_range((4,), ">=3.0.0, <4.0.0")
+    assert version_in_range((3, 0, 1), ">= 3.0.0")
+    assert version_in_range((1, 4), "^1.0.0") and not version_in_range((2, 0), "^1.0.0")
+    assert not version_in_range((0, 3), "^0.2.1")
+    assert version_in_range((1, 9, 9), "1.x") and not version_in_range((2,), "1.x")
+    assert version_in_range((2, 3, 9), "~2.3") and not version_in_range((2, 4), "~2.3")
+    assert version_in_range((3,), "> 2") and not version_in_range((2, 9), "> 2")
+
+    rule = Rule({"rule_id": "R", "scope": {"platforms": ["roku"], "sdks": ["unknown"]}})
+    assert rule.in_scope("roku", "any", ())
+    assert rule.in_scope("unknown", "any", ())
+    assert not rule.in_scope("android", "any", ())
+
+
+def test_shadow_eval_rules_per_rule_and_platform(tmp_path: Path) -> None:
+    specs = tmp_path / "specs"
+    specs.mkdir()
+    (specs / "A.yaml").write_text(
+        json.dumps(
+            {
+                "rule_id": "A",
+                "scope": {"platforms": ["roku", "android"], "version_range": "0.0.0-virtual"},
+                "checks": [{"non_decreasing_playhead": True}],
+            }
+        ),
+        encoding="utf-8",
+    )
+    (specs / "B.yaml").write_text(
+        json.dumps(
+            {
+                "rule_id": "B",
+                "scope": {"platforms": ["roku"], "version_range": ">=2.0.0"},
+                "checks": [{"non_decreasing_playhead": True}, {"not_implemented": True}],
+            }
+        ),
+        encoding="utf-8",
+    )
+    day1 = _write(
+        tmp_path / "day1.jsonl",
+        [
+            _env("s1", 0, "Roku/1", "2.1"),
+            _env("s1", 5),
+            _env("s2", 10, "Android 14", "1.0"),
+            _env("s2", 3),
+        ],
+    )
+    day2 = _write(
+        tmp_path / "day2.jsonl",
+        [_env("s1", 6), _env("s3", 1, "Roku/1", "1.0"), _env("s3", 2)],
+    )
+    result = shadow_eval_rules([day1, day2], specs)
+    assert result["A"]["roku"] == {
+        "sessions": 2,
+        "evaluated": 2,
+        "violations": 0,
+        "coverage": 1.0,
+        "fp_rate": 0.0,
+    }
+    assert result["A"]["android"]["fp_rate"] == 1.0
+    # Only s1 is in B's version range; B's unimplemented check is ignored.
+    assert result["B"] == {
+        "roku": {
+            "sessions": 1,
+            "evaluated": 1,
+            "violations": 0,
+            "coverage": 1.0,
+            "fp_rate": 0.0,
+        }
+    }
+
+
+def test_legacy_shadow_eval_unchanged(tmp_path: Path) -> None:
+    canonical = _write(tmp_path / "c.jsonl", [_env("s", 2), _env("s", 1)])
+    assert shadow_eval(canonical) == {"coverage": 1.0, "fp_rate": 1.0}
+    result = shadow_eval_rules([canonical], Path("rules/specs"))
+    assert result["HB_PLAYHEAD_MONOTONIC_WEB"]["unknown"]["fp_rate"] == 1.0
+
+
+@pytest.mark.parametrize("version_range", ["banana", ">=1.0.0 <", "1.x.3", "!=1", "=>1.0"])
+def test_invalid_version_range_is_rejected_when_the_rule_loads(version_range: str) -> None:
+    with pytest.raises(ValueError, match="rule 'BAD': invalid version_range"):
+        Rule({"rule_id": "BAD", "scope": {"version_range": version_range}})
@@ -0,0 +1,49 @@
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench import compare
+from goblean.aggregate import CadenceMetrics
+from goblean.fingerprint import fingerprint
+from goblean.ingest.har_ingest import read_har
+from goblean.normalize.envelope import canonical_envelope
+from goblean.schema_check import validate_envelope
+from goblean.synth import synthetic_har, write_har
+
+
+def test_synthetic_har_sessions_cadence_and_headers(tmp_path: Path) -> None:
+    path = tmp_path / "synth.har"
+    count = write_har(path, sessions=4, events_per_session=5, cadence=2.0, body_bytes=100)
+    assert count == 20
+    har = read_har(path)
+    assert har == synthetic_har(sessions=4, events_per_session=5, cadence=2.0, body_bytes=100)
+    assert len(har["log"]["entries"][0]["response"]["content"]["text"]) == 100
+
+    envelopes = [canonical_envelope(e) for e in har["log"]["entries"]]
+    for env in envelopes:
+        validate_envelope(env)
+    assert {fingerprint(env)[0] for env in envelopes} == {"roku", "android", "ios"}
+    first = [env for env in envelopes if env["params"]["sid"] == envelopes[0]["params"]["sid"]]
+    metrics = CadenceMetrics()
+    for env in first:
+        metrics.update(env)
+    result = metrics.result()
+    assert result["count"] == 5
+    assert abs(result["cadence"] - 2.0) < 1e-6
+    assert result["non_decreasing_playhead"]
+
+
+def test_benchmark_gate_flags_regressions() -> None:
+    baseline = {
+        "read_har": {"events_per_sec": 1000.0, "peak_rss_bytes": 100 << 20},
+        "fingerprint": {"events_per_sec": 1000.0, "peak_rss_bytes": 100 << 20},
+    }
+    results = {
+        "read_har": {"events_per_sec": 800.0, "peak_rss_bytes": 110 << 20},
+        "fingerprint": {"events_per_sec": 600.0, "peak_rss_bytes": 130 << 20},
+        "new_bench": {"events_per_sec": 1.0, "peak_rss_bytes": 1},
+    }
+    failures = compare(results, baseline, tolerance=0.3, rss_tolerance=0.25)
+    assert len(failures) == 2
+    assert all(f.startswith("fingerprint:") for f in failures)